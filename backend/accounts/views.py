@@ -7,6 +7,8 @@ from rest_framework.response import Response
 from .models import Account, CreditCardProfile
 from .serializers import AccountSerializer, CreditCardProfileSerializer
 from transactions.models import Transaction
+from alerts.services import EVENT_ACCOUNT, enqueue_alert_event
+from reports.services import invalidate_user_reports
 
 
 class AccountViewSet(viewsets.ModelViewSet):
@@ -20,6 +22,10 @@ class AccountViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        account = serializer.save()
+        enqueue_alert_event(EVENT_ACCOUNT, account.id)
+
     def perform_destroy(self, instance):
         # Plaid-linked accounts should be archived so sync does not recreate them.
         if instance.plaid_account_id:
@@ -27,6 +33,7 @@ class AccountViewSet(viewsets.ModelViewSet):
             instance.save(update_fields=["is_active", "updated_at"])
             return
         instance.delete()
+        invalidate_user_reports(instance.user_id)
 
     @action(detail=True, methods=["post"])
     def clear_transactions(self, request, pk=None):
@@ -41,6 +48,7 @@ class AccountViewSet(viewsets.ModelViewSet):
         # Reset balance
         account.balance = 0
         account.save()
+        invalidate_user_reports(account.user_id)
 
         return Response(
             {"status": "cleared", "deleted_count": count}, status=status.HTTP_200_OK
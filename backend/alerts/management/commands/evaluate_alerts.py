@@ -0,0 +1,36 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from alerts.services import AlertService
+
+
+class Command(BaseCommand):
+    help = "Evaluate every active alert for all users and create notifications (run nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            default="",
+            help="Comma-separated usernames to limit evaluation to. Defaults to all users.",
+        )
+
+    def handle(self, *args, **options):
+        users = None
+        usernames = [name.strip() for name in options["users"].split(",") if name.strip()]
+        if usernames:
+            users = list(get_user_model().objects.filter(username__in=usernames))
+            missing = set(usernames) - {user.username for user in users}
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+
+        started = time.monotonic()
+        counts = AlertService().evaluate_all(users=users)
+        result = {
+            "notifications_created": counts,
+            "total": sum(counts.values()),
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        self.stdout.write(self.style.SUCCESS(json.dumps(result, indent=2, sort_keys=True)))
@@ -1,9 +1,78 @@
+import queue
+import threading
 from datetime import timedelta
+from django.db import close_old_connections, transaction as db_transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.functions import Abs
 from django.utils.timezone import now
 from .models import Alert, Notification
 from accounts.models import Account
 from budgets.models import Budget
-from transactions.models import Transaction
+from budgets.services import with_spent
+from transactions.models import RecurringTransaction, Transaction
+
+ALERT_COOLDOWN = timedelta(hours=24)  # Don't alert same rule twice in 24h
+BILL_DUE_WINDOW = timedelta(days=3)  # Warn about bills due within this window
+
+EVENT_TRANSACTION = "transaction"
+# Edited without changing amount or date: large-transaction alerts already saw it
+EVENT_TRANSACTION_EDITED = "transaction_edited"
+# Transactions removed: the rows are gone, so the event carries the owner's user id
+EVENT_TRANSACTION_DELETED = "transaction_deleted"
+EVENT_ACCOUNT = "account"
+LARGE_TRANSACTION_WINDOW = timedelta(days=1)  # Only recent transactions count as "large"
+
+_event_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _low_balance_notification(alert, account):
+    return Notification(
+        user_id=alert.user_id,
+        alert_rule=alert,
+        title="Low Balance Alert",
+        message=alert.alert_message
+        or f"Balance for {account.account_name} is below ${alert.threshold_value}",
+        related_object_id=account.id,
+        related_object_type="Account",
+    )
+
+
+def _large_transaction_notification(alert, txn):
+    return Notification(
+        user_id=alert.user_id,
+        alert_rule=alert,
+        title="Large Transaction Alert",
+        message=alert.alert_message
+        or f"Large transaction detected: {txn.name} for ${abs(txn.amount)}",
+        related_object_id=txn.id,
+        related_object_type="Transaction",
+    )
+
+
+def _budget_notification(alert, budget):
+    return Notification(
+        user_id=alert.user_id,
+        alert_rule=alert,
+        title="Budget Alert",
+        message=alert.alert_message
+        or f"Budget '{budget.category_group.name}' exceeded! Spent: ${budget.spent}, Limit: ${budget.amount}",
+        related_object_id=budget.id,
+        related_object_type="Budget",
+    )
+
+
+def _bill_due_notification(alert, bill):
+    return Notification(
+        user_id=alert.user_id,
+        alert_rule=alert,
+        title="Bill Due Alert",
+        message=alert.alert_message
+        or f"{bill.name} (${abs(bill.amount)}) is due on {bill.next_due_date}",
+        related_object_id=bill.id,
+        related_object_type="RecurringTransaction",
+    )
 
 
 class AlertService:
@@ -12,133 +81,237 @@ class AlertService:
         Check all alert conditions for the user and generate notifications.
         Can be called manually or by automated triggers.
         """
-        notifications_created = 0
-        cooldown_period = timedelta(hours=24)  # Don't alert same rule twice in 24h
+        counts = self.evaluate_all(users=[user])
+        return {
+            "status": "Alert check completed",
+            "notifications_created": sum(counts.values()),
+        }
+
+    def evaluate_all(self, users=None, today=None, alert_types=None):
+        """
+        Evaluate every active alert (optionally only for some users or alert
+        types) with a fixed number of set-based queries. Cooldowns are applied
+        in SQL and notifications are bulk-inserted. Returns counts per alert type.
+        """
+        current = now()
+        today = today or current.date()
+        alerts = Alert.objects.filter(
+            Q(last_triggered_at__isnull=True)
+            | Q(last_triggered_at__lt=current - ALERT_COOLDOWN),
+            is_active=True,
+        )
+        if users is not None:
+            alerts = alerts.filter(user__in=users)
+        if alert_types is not None:
+            alerts = alerts.filter(alert_type__in=alert_types)
 
-        # 1. Check Low Balance
-        low_balance_alerts = Alert.objects.filter(
-            user=user, alert_type="low_balance", is_active=True
+        pending = []
+
+        # 1. Low balance: compare against account balances in the join
+        for alert in alerts.filter(
+            alert_type="low_balance", account__balance__lt=F("threshold_value")
+        ).select_related("account"):
+            pending.append((alert, _low_balance_notification(alert, alert.account)))
+
+        # 2. Large transactions in the past day: largest qualifying txn per alert
+        large_txns = (
+            Transaction.objects.filter(
+                account__user=OuterRef("user"),
+                date__gte=(current - LARGE_TRANSACTION_WINDOW).date(),
+            )
+            .annotate(abs_amount=Abs("amount"))
+            .filter(abs_amount__gte=OuterRef("threshold_value"))
+            .order_by("-abs_amount", "-id")
         )
-        for alert in low_balance_alerts:
-            # Check cooldown
-            if (
-                alert.last_triggered_at
-                and (now() - alert.last_triggered_at) < cooldown_period
-            ):
-                continue
-
-            if alert.account and alert.account.balance < alert.threshold_value:
-                message = (
-                    alert.alert_message
-                    or f"Balance for {alert.account.account_name} is below ${alert.threshold_value}"
-                )
-                Notification.objects.create(
-                    user=user,
-                    alert_rule=alert,
-                    title="Low Balance Alert",
-                    message=message,
-                    related_object_id=alert.account.id,
-                    related_object_type="Account",
-                )
-                alert.last_triggered_at = now()
-                alert.save()
-                notifications_created += 1
-
-        # 2. Check Large Transactions (past 24h)
-        large_txn_alerts = Alert.objects.filter(
-            user=user, alert_type="large_transaction", is_active=True
+        large_alerts = list(
+            alerts.filter(alert_type="large_transaction")
+            .annotate(txn_id=Subquery(large_txns.values("id")[:1]))
+            .filter(txn_id__isnull=False)
         )
-        if large_txn_alerts.exists():
-            one_day_ago = now() - timedelta(days=1)
-            # Fetch recent transactions
-            txns = Transaction.objects.filter(
-                account__user=user, date__gte=one_day_ago.date()
+        txns = Transaction.objects.in_bulk({alert.txn_id for alert in large_alerts})
+        for alert in large_alerts:
+            pending.append((alert, _large_transaction_notification(alert, txns[alert.txn_id])))
+
+        # 3. Budgets exceeded: month-to-date spend for every active budget at once
+        budget_alerts = list(alerts.filter(alert_type="budget_exceeded"))
+        if budget_alerts:
+            exceeded = with_spent(
+                Budget.objects.filter(
+                    user_id__in={alert.user_id for alert in budget_alerts},
+                    category_group__isnull=False,
+                    start_date__lte=today,
+                    end_date__gte=today,
+                ).select_related("category_group")
+            ).filter(spent__gt=F("amount")).order_by("user_id", "id")
+            first_exceeded = {}
+            for budget in exceeded:
+                first_exceeded.setdefault(budget.user_id, budget)
+            for alert in budget_alerts:
+                budget = first_exceeded.get(alert.user_id)
+                if budget:
+                    pending.append((alert, _budget_notification(alert, budget)))
+
+        # 4. Bills due soon: next upcoming recurring charge over the threshold
+        due_bills = (
+            RecurringTransaction.objects.filter(
+                user=OuterRef("user"),
+                is_active=True,
+                status__in=["active", "overdue"],
+                next_due_date__gte=today,
+                next_due_date__lte=today + BILL_DUE_WINDOW,
             )
+            .annotate(abs_amount=Abs("amount"))
+            .filter(abs_amount__gte=OuterRef("threshold_value"))
+            .order_by("next_due_date", "id")
+        )
+        bill_alerts = list(
+            alerts.filter(alert_type="bill_due")
+            .annotate(bill_id=Subquery(due_bills.values("id")[:1]))
+            .filter(bill_id__isnull=False)
+        )
+        bills = RecurringTransaction.objects.in_bulk({alert.bill_id for alert in bill_alerts})
+        for alert in bill_alerts:
+            pending.append((alert, _bill_due_notification(alert, bills[alert.bill_id])))
+
+        self._fire(pending)
+        counts = {alert_type: 0 for alert_type, _ in Alert.ALERT_TYPES}
+        for alert, _ in pending:
+            counts[alert.alert_type] += 1
+        return counts
 
-            for alert in large_txn_alerts:
-                # Check cooldown
-                if (
-                    alert.last_triggered_at
-                    and (now() - alert.last_triggered_at) < cooldown_period
-                ):
-                    continue
-
-                # Find any transaction > threshold
-                max_txn = None
-                for t in txns:
-                    if abs(t.amount) >= alert.threshold_value:
-                        max_txn = t
-                        break
-
-                if max_txn:
-                    message = (
-                        alert.alert_message
-                        or f"Large transaction detected: {max_txn.name} for ${abs(max_txn.amount)}"
-                    )
-                    Notification.objects.create(
-                        user=user,
-                        alert_rule=alert,
-                        title="Large Transaction Alert",
-                        message=message,
-                        related_object_id=max_txn.id,
-                        related_object_type="Transaction",
-                    )
-                    alert.last_triggered_at = now()
-                    alert.save()
-                    notifications_created += 1
-
-        # 3. Check Budgets (Budget Exceeded)
-        budget_alerts = Alert.objects.filter(
-            user=user, alert_type="budget_exceeded", is_active=True
+    def _eligible_alerts(self, user, alert_types, **filters):
+        """Active alerts of the given types whose cooldown has elapsed."""
+        return Alert.objects.filter(
+            Q(last_triggered_at__isnull=True)
+            | Q(last_triggered_at__lt=now() - ALERT_COOLDOWN),
+            user=user,
+            alert_type__in=alert_types,
+            is_active=True,
+            **filters,
+        ).select_related("account")
+
+    def _fire(self, pending):
+        """
+        Bulk-insert the pending (alert, Notification) pairs and stamp
+        last_triggered_at on their alerts in a single update.
+        """
+        if not pending:
+            return 0
+        Notification.objects.bulk_create(
+            [notification for _, notification in pending], batch_size=1000
         )
-        if budget_alerts.exists():
-            budgets = Budget.objects.filter(user=user)
-            today = now().date()
-            start_of_month = today.replace(day=1)
-
-            # Helper to get spent amount for a budget category
-            transactions = Transaction.objects.filter(
-                account__user=user,
-                date__gte=start_of_month,
-                date__lte=today,
-                is_transfer=False,  # Exclude internal transfers
-            )
+        Alert.objects.filter(id__in={alert.id for alert, _ in pending}).update(
+            last_triggered_at=now()
+        )
+        return len(pending)
 
-            for alert in budget_alerts:
-                if (
-                    alert.last_triggered_at
-                    and (now() - alert.last_triggered_at) < cooldown_period
-                ):
-                    continue
-
-                # Check all budgets
-                for budget in budgets:
-                    spent = 0
-                    if budget.category_group:
-                        cats = budget.category_group.subcategories.all()
-                        cat_names = [c.name for c in cats]
-                        budget_txns = transactions.filter(category__in=cat_names)
-                        spent = sum(abs(t.amount) for t in budget_txns if t.amount < 0)
-
-                    if spent > budget.amount:
-                        message = (
-                            alert.alert_message
-                            or f"Budget '{budget.name}' exceeded! Spent: ${spent}, Limit: ${budget.amount}"
-                        )
-                        Notification.objects.create(
-                            user=user,
-                            alert_rule=alert,
-                            title="Budget Alert",
-                            message=message,
-                            related_object_id=budget.id,
-                            related_object_type="Budget",
-                        )
-                        alert.last_triggered_at = now()
-                        alert.save()
-                        notifications_created += 1
-                        break  # Prevent spamming multiple budget alerts
+    def evaluate_transaction(self, txn, check_large=True):
+        """
+        Evaluate only the alerts a single transaction can affect: its amount,
+        its account's balance and the budgets covering its category and date.
+        Like the nightly scan, only transactions from the past day can trigger
+        large-transaction alerts; pass check_large=False to skip them entirely.
+        """
+        account = txn.account
+        user = account.user
+        alert_types = ["low_balance", "budget_exceeded"]
+        if check_large and txn.date >= (now() - LARGE_TRANSACTION_WINDOW).date():
+            alert_types.append("large_transaction")
+        alerts = list(self._eligible_alerts(user, alert_types))
+        pending = []
 
-        return {
-            "status": "Alert check completed",
-            "notifications_created": notifications_created,
-        }
+        for alert in alerts:
+            if alert.alert_type == "large_transaction" and abs(txn.amount) >= alert.threshold_value:
+                pending.append((alert, _large_transaction_notification(alert, txn)))
+
+        pending.extend(self._low_balance_notifications(
+            account, [a for a in alerts if a.alert_type == "low_balance"]
+        ))
+
+        budget_alerts = [a for a in alerts if a.alert_type == "budget_exceeded"]
+        if budget_alerts and txn.amount < 0 and txn.category_ref_id and not txn.is_transfer:
+            # Only budgets whose category subtree contains this transaction
+            budgets = with_spent(
+                Budget.objects.filter(
+                    user=user,
+                    category_group__descendant_links__descendant_id=txn.category_ref_id,
+                    start_date__lte=txn.date,
+                    end_date__gte=txn.date,
+                ).select_related("category_group"),
+                user,
+            ).filter(spent__gt=F("amount"))
+            exceeded = next(iter(budgets), None)
+            if exceeded:
+                for alert in budget_alerts:
+                    pending.append((alert, _budget_notification(alert, exceeded)))
+
+        return self._fire(pending)
+
+    def evaluate_account(self, account):
+        """Evaluate low-balance alerts after an account balance change."""
+        alerts = self._eligible_alerts(account.user, ["low_balance"], account=account)
+        return self._fire(self._low_balance_notifications(account, alerts))
+
+    def _low_balance_notifications(self, account, alerts):
+        return [
+            (alert, _low_balance_notification(alert, account))
+            for alert in alerts
+            if alert.account_id == account.id and account.balance < alert.threshold_value
+        ]
+
+
+def process_alert_event(kind, object_id):
+    """Load the changed object and run the matching incremental evaluation."""
+    service = AlertService()
+    if kind in (EVENT_TRANSACTION, EVENT_TRANSACTION_EDITED):
+        txn = (
+            Transaction.objects.select_related("account__user")
+            .filter(id=object_id)
+            .first()
+        )
+        if not txn:
+            return 0
+        return service.evaluate_transaction(txn, check_large=kind == EVENT_TRANSACTION)
+    if kind == EVENT_ACCOUNT:
+        account = Account.objects.select_related("user").filter(id=object_id).first()
+        return service.evaluate_account(account) if account else 0
+    if kind == EVENT_TRANSACTION_DELETED:
+        # A removal moves balances and budget spend, never adds a large transaction
+        counts = service.evaluate_all(users=[object_id], alert_types=["low_balance", "budget_exceeded"])
+        return sum(counts.values())
+    raise ValueError(f"Unknown alert event: {kind}")
+
+
+def _run_worker():
+    while True:
+        kind, object_id = _event_queue.get()
+        try:
+            close_old_connections()
+            process_alert_event(kind, object_id)
+        except Exception as e:
+            print(f"Alert check failed for {kind} {object_id}: {e}")
+        finally:
+            close_old_connections()
+            _event_queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="alert-events", daemon=True)
+            _worker.start()
+
+
+def enqueue_alert_event(kind, object_id):
+    """
+    Queue an alert evaluation for a changed transaction or account. The event
+    is only published once the surrounding DB transaction commits, and is
+    processed by a background worker off the request path.
+    """
+
+    def _publish():
+        _ensure_worker()
+        _event_queue.put((kind, object_id))
+
+    db_transaction.on_commit(_publish)
@@ -1,3 +1,224 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from accounts.models import Account
+from budgets.models import Budget
+from categories.models import Category
+from transactions.models import RecurringTransaction, Transaction
+
+from .models import Alert, Notification
+from .services import (
+    EVENT_TRANSACTION,
+    EVENT_TRANSACTION_DELETED,
+    EVENT_TRANSACTION_EDITED,
+    AlertService,
+    process_alert_event,
+)
+
+
+class AlertEventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alerts", password="secret")
+        self.account = Account.objects.create(
+            user=self.user,
+            account_name="Checking",
+            account_type="bank",
+            balance=Decimal("50.00"),
+            currency="USD",
+        )
+        self.food = Category.objects.create(name="Food & Dining", is_system=True)
+        self.coffee = Category.objects.create(
+            name="Coffee Shops", is_system=True, parent=self.food
+        )
+        today = date.today()
+        Budget.objects.create(
+            user=self.user,
+            category_group=self.food,
+            amount=Decimal("100.00"),
+            start_date=today.replace(day=1),
+            end_date=today + timedelta(days=1),
+        )
+
+    def _alert(self, alert_type, threshold, **kwargs):
+        return Alert.objects.create(
+            user=self.user, alert_type=alert_type, threshold_value=Decimal(threshold), **kwargs
+        )
+
+    def _txn(self, amount, category=None, txn_date=None):
+        return Transaction.objects.create(
+            account=self.account,
+            amount=Decimal(amount),
+            name="Espresso Bar",
+            date=txn_date or date.today(),
+            category_ref=category,
+        )
+
+    def test_transaction_event_fires_matching_alerts_in_bulk(self):
+        large = self._alert("large_transaction", "100.00")
+        low = self._alert("low_balance", "75.00", account=self.account)
+        budget = self._alert("budget_exceeded", "0")
+        txn = self._txn("-120.00", self.coffee)
+
+        created = process_alert_event(EVENT_TRANSACTION, txn.id)
+
+        self.assertEqual(created, 3)
+        titles = set(Notification.objects.values_list("title", flat=True))
+        self.assertEqual(titles, {"Large Transaction Alert", "Low Balance Alert", "Budget Alert"})
+        for alert in (large, low, budget):
+            alert.refresh_from_db()
+            self.assertIsNotNone(alert.last_triggered_at)
+
+    def test_cooldown_and_thresholds_suppress_notifications(self):
+        self._alert("large_transaction", "100.00", last_triggered_at=now())
+        self._alert("low_balance", "10.00", account=self.account)
+        txn = self._txn("-150.00")
+
+        self.assertEqual(AlertService().evaluate_transaction(txn), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_backdated_transactions_do_not_fire_large_transaction_alerts(self):
+        self._alert("large_transaction", "100.00")
+        txn = self._txn("-500.00", txn_date=date.today() - timedelta(days=10))
+
+        self.assertEqual(process_alert_event(EVENT_TRANSACTION, txn.id), 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_edit_without_amount_or_date_change_does_not_refire(self):
+        self._alert("large_transaction", "100.00")
+        txn = self._txn("-500.00")
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with patch("alerts.services._event_queue") as event_queue, patch("alerts.services._ensure_worker"):
+            with self.captureOnCommitCallbacks(execute=True):
+                client.patch(f"/transactions/{txn.id}/", {"name": "Renamed"}, format="json")
+            with self.captureOnCommitCallbacks(execute=True):
+                client.patch(f"/transactions/{txn.id}/", {"amount": "-600.00"}, format="json")
+
+        self.assertEqual(
+            [call.args[0] for call in event_queue.put.call_args_list],
+            [(EVENT_TRANSACTION_EDITED, txn.id), (EVENT_TRANSACTION, txn.id)],
+        )
+        self.assertEqual(process_alert_event(EVENT_TRANSACTION_EDITED, txn.id), 0)
+        self.assertEqual(process_alert_event(EVENT_TRANSACTION, txn.id), 1)
+
+    def test_delete_queues_event_for_the_owner(self):
+        self._alert("low_balance", "20.00", account=self.account)
+        self._alert("large_transaction", "10.00")
+        txn = self._txn("40.00")
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with patch("alerts.services._event_queue") as event_queue, patch("alerts.services._ensure_worker"):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.delete(f"/transactions/{txn.id}/")
+
+        self.assertEqual(response.status_code, 204)
+        event_queue.put.assert_called_once_with((EVENT_TRANSACTION_DELETED, self.user.id))
+        # Removing the deposit leaves 10.00, below the low-balance threshold
+        self.assertEqual(process_alert_event(EVENT_TRANSACTION_DELETED, self.user.id), 1)
+        self.assertEqual(
+            list(Notification.objects.values_list("title", flat=True)), ["Low Balance Alert"]
+        )
+
+    def test_create_queues_event_instead_of_scanning(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with patch("alerts.services._event_queue") as event_queue, patch(
+            "alerts.services._ensure_worker"
+        ), patch.object(AlertService, "check_all_conditions") as full_scan:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.post(
+                    "/transactions/",
+                    {
+                        "account": self.account.id,
+                        "amount": "-5.00",
+                        "name": "Coffee",
+                        "date": date.today().isoformat(),
+                    },
+                    format="json",
+                )
+
+        self.assertEqual(response.status_code, 201)
+        full_scan.assert_not_called()
+        event_queue.put.assert_called_once_with((EVENT_TRANSACTION, response.json()["id"]))
+
+
+class BatchAlertEvaluationTests(TestCase):
+    def setUp(self):
+        self.food = Category.objects.create(name="Food & Dining", is_system=True)
+        self.users = []
+        for index in range(3):
+            user = User.objects.create_user(username=f"batch{index}", password="secret")
+            account = Account.objects.create(
+                user=user,
+                account_name="Checking",
+                account_type="bank",
+                balance=Decimal("20.00"),
+                currency="USD",
+            )
+            Budget.objects.create(
+                user=user,
+                category_group=self.food,
+                amount=Decimal("10.00"),
+                start_date=date.today().replace(day=1),
+                end_date=date.today() + timedelta(days=1),
+            )
+            Transaction.objects.create(
+                account=account,
+                amount=Decimal("-30.00"),
+                name="Groceries",
+                date=date.today(),
+                category_ref=self.food,
+            )
+            RecurringTransaction.objects.create(
+                user=user,
+                name="Rent",
+                amount=Decimal("1500.00"),
+                next_due_date=date.today() + timedelta(days=2),
+            )
+            for alert_type, threshold in (
+                ("low_balance", "50.00"),
+                ("large_transaction", "25.00"),
+                ("budget_exceeded", "0"),
+                ("bill_due", "100.00"),
+            ):
+                Alert.objects.create(
+                    user=user,
+                    account=account if alert_type == "low_balance" else None,
+                    alert_type=alert_type,
+                    threshold_value=Decimal(threshold),
+                )
+            self.users.append(user)
+
+    def test_evaluates_all_users_in_constant_queries(self):
+        with self.assertNumQueries(9):
+            counts = AlertService().evaluate_all()
+
+        self.assertEqual(counts["low_balance"], 3)
+        self.assertEqual(counts["large_transaction"], 3)
+        self.assertEqual(counts["budget_exceeded"], 3)
+        self.assertEqual(counts["bill_due"], 3)
+        self.assertEqual(Notification.objects.count(), 12)
+        self.assertIn(
+            "Budget 'Food & Dining' exceeded",
+            Notification.objects.filter(title="Budget Alert").first().message,
+        )
+
+        # Cooldown is enforced in SQL on the next run
+        self.assertEqual(sum(AlertService().evaluate_all().values()), 0)
+
+    def test_command_can_scope_to_users(self):
+        call_command("evaluate_alerts", users=self.users[0].username, stdout=StringIO())
 
-# Create your tests here.
+        self.assertEqual(Notification.objects.filter(user=self.users[0]).count(), 4)
+        self.assertFalse(Notification.objects.exclude(user=self.users[0]).exists())
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Abs, Coalesce
+
+from transactions.models import Transaction
+
+
+def with_spent(queryset, user=None):
+    """
+    Annotate budgets with `spent` (positive), rolling up every subcategory of
+    each budget's category_group through the category closure table. The
+    whole result is one query regardless of how many budgets there are.
+    Without a user, each budget is matched against its own owner's accounts.
+    """
+    spent = (
+        Transaction.objects.filter(
+            account__user=user if user is not None else OuterRef("user"),
+            category_ref__ancestor_links__ancestor=OuterRef("category_group"),
+            date__gte=OuterRef("start_date"),
+            date__lte=OuterRef("end_date"),
+            amount__lt=0,  # Expenses are negative amounts
+            is_transfer=False,  # Exclude internal transfers
+        )
+        .order_by()
+        .annotate(total=Func(F("amount"), function="SUM"))
+        .values("total")
+    )
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return queryset.annotate(
+        spent=Abs(Coalesce(Subquery(spent, output_field=money), Value(Decimal("0")), output_field=money))
+    )
+
+
+def budget_spent_totals(user, budgets):
+    """Return {budget_id: spent} for the given budgets."""
+    from .models import Budget
+
+    ids = [b.id for b in budgets if b.category_group_id]
+    if not ids:
+        return {}
+    return dict(
+        with_spent(Budget.objects.filter(id__in=ids), user).values_list("id", "spent")
+    )
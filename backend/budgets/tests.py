@@ -1,3 +1,97 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from accounts.models import Account
+from categories.models import Category
+from transactions.models import Transaction
+
+from .models import Budget
+from .services import budget_spent_totals
+
+
+class BudgetProgressTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="budgeter", password="secret")
+        self.account = Account.objects.create(
+            user=self.user,
+            account_name="Checking",
+            account_type="bank",
+            balance=Decimal("0.00"),
+            currency="USD",
+        )
+        self.food = Category.objects.create(name="Food & Dining", is_system=True)
+        self.restaurants = Category.objects.create(
+            name="Restaurants", is_system=True, parent=self.food
+        )
+        self.coffee = Category.objects.create(
+            name="Coffee Shops", is_system=True, parent=self.restaurants
+        )
+        self.travel = Category.objects.create(name="Travel", is_system=True)
+        self.start = date(2026, 3, 1)
+        self.end = date(2026, 3, 31)
+
+    def _txn(self, amount, category, txn_date=None, **kwargs):
+        return Transaction.objects.create(
+            account=self.account,
+            amount=Decimal(amount),
+            name="Txn",
+            date=txn_date or date(2026, 3, 10),
+            category_ref=category,
+            **kwargs,
+        )
+
+    def _budget(self, category, amount="100.00"):
+        return Budget.objects.create(
+            user=self.user,
+            category_group=category,
+            amount=Decimal(amount),
+            start_date=self.start,
+            end_date=self.end,
+        )
+
+    def test_spent_rolls_up_subcategories(self):
+        food_budget = self._budget(self.food, "200.00")
+        restaurant_budget = self._budget(self.restaurants)
+        travel_budget = self._budget(self.travel)
+        self._txn("-10.00", self.food)
+        self._txn("-20.00", self.restaurants)
+        self._txn("-5.50", self.coffee)
+        self._txn("-99.00", self.coffee, txn_date=date(2026, 4, 2))
+        self._txn("-40.00", self.restaurants, is_transfer=True)
+        self._txn("15.00", self.restaurants)
+
+        totals = budget_spent_totals(
+            self.user, [food_budget, restaurant_budget, travel_budget]
+        )
+
+        self.assertEqual(totals[food_budget.id], Decimal("35.50"))
+        self.assertEqual(totals[restaurant_budget.id], Decimal("25.50"))
+        self.assertEqual(totals[travel_budget.id], Decimal("0"))
+
+    def test_progress_uses_constant_queries(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self._budget(self.food)
+        self._txn("-12.00", self.coffee)
+
+        with CaptureQueriesContext(connection) as single:
+            client.get("/budgets/progress/", {"start": "2026-03-01", "end": "2026-03-31"})
+
+        for category in (self.restaurants, self.coffee, self.travel):
+            self._budget(category)
+
+        with CaptureQueriesContext(connection) as many:
+            response = client.get(
+                "/budgets/progress/", {"start": "2026-03-01", "end": "2026-03-31"}
+            )
 
-# Create your tests here.
+        self.assertEqual(len(single.captured_queries), len(many.captured_queries))
+        progress = {row["category"]: row for row in response.json()}
+        self.assertEqual(Decimal(str(progress["Food & Dining"]["spent"])), Decimal("12.00"))
+        self.assertEqual(Decimal(str(progress["Travel"]["spent"])), Decimal("0"))
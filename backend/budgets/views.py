@@ -1,5 +1,6 @@
 from .models import Budget
 from .serializers import BudgetSerializer
+from .services import with_spent
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
@@ -40,27 +41,13 @@ class BudgetViewSet(viewsets.ModelViewSet):
             # Default to active budgets (active today)
             qs = qs.filter(start_date__lte=today, end_date__gte=today)
 
-        data = []
-        from transactions.models import Transaction
-        from django.db.models import Sum
-
-        for budget in qs:
-            # Find all transactions in this category (and ideally subcategories)
-            # For MVP: Direct match on category_ref
-            # TODO: Add hierarchical roll-up
+        # One query for every budget, rolled up over subcategories
+        budgets = with_spent(qs.select_related('category_group'), request.user)
 
-            spent = Transaction.objects.filter(
-                account__user=request.user,
-                category_ref=budget.category_group,
-                date__gte=budget.start_date,
-                date__lte=budget.end_date,
-                amount__lt=0,  # Expenses are negative amounts
-                is_transfer=False  # Exclude internal transfers
-            ).aggregate(total=Sum('amount'))['total'] or 0
+        data = []
+        for budget in budgets:
+            spent = budget.spent
 
-            # Amount is negative for expenses, so convert to positive for display
-            spent = abs(spent)
-            
             data.append({
                 'id': budget.id,
                 'category': budget.category_group.name,
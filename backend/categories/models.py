@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 class Category(models.Model):
@@ -8,12 +8,58 @@ class Category(models.Model):
     icon = models.CharField(max_length=50, null=True, blank=True) # Emoji or Lucide icon name
     color = models.CharField(max_length=20, null=True, blank=True) # Hex code
     is_system = models.BooleanField(default=False)
-    
+
     class Meta:
         verbose_name_plural = "Categories"
         unique_together = ('name', 'parent', 'user')
 
+    def save(self, *args, **kwargs):
+        from .services import insert_closure, invalidate_category_tree, move_closure
+
+        is_new = self._state.adding
+        old_parent_id = None
+        if not is_new:
+            old_parent_id = (
+                Category.objects.filter(pk=self.pk).values_list("parent_id", flat=True).first()
+            )
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                insert_closure(self)
+            elif old_parent_id != self.parent_id:
+                move_closure(self)
+
+        invalidate_category_tree(self)
+
+    def delete(self, *args, **kwargs):
+        from .services import invalidate_category_tree
+
+        # Closure rows for this node and its subtree go away via CASCADE
+        result = super().delete(*args, **kwargs)
+        invalidate_category_tree(self)
+        return result
+
     def __str__(self):
         if self.parent:
             return f"{self.parent.name} > {self.name}"
         return self.name
+
+
+class CategoryClosure(models.Model):
+    """
+    Transitive closure of the Category tree: one row per (ancestor, descendant)
+    pair, including a depth-0 row linking each category to itself.
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="descendant_links")
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="ancestor_links")
+    depth = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'ancestor']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
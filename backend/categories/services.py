@@ -0,0 +1,137 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Q
+
+from .models import Category, CategoryClosure
+
+CATEGORY_TREE_CACHE_TIMEOUT = 60 * 60
+CATEGORY_TREE_VERSION_KEY = "categories:tree:version"
+
+
+def insert_closure(category):
+    """Add closure rows for a newly created (leaf) category."""
+    rows = [CategoryClosure(ancestor_id=category.id, descendant_id=category.id, depth=0)]
+    if category.parent_id:
+        rows.extend(
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=category.id, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(
+                descendant_id=category.parent_id
+            ).values_list("ancestor_id", "depth")
+        )
+    CategoryClosure.objects.bulk_create(rows)
+
+
+def move_closure(category):
+    """Re-link a category's whole subtree under its current parent."""
+    subtree = list(
+        CategoryClosure.objects.filter(ancestor_id=category.id).values_list(
+            "descendant_id", "depth"
+        )
+    )
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    if category.parent_id in subtree_ids:
+        raise ValueError("A category cannot be moved under one of its own subcategories.")
+
+    # Drop links from the old ancestors into the subtree, keep links inside it
+    CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+        ancestor_id__in=subtree_ids
+    ).delete()
+
+    if not category.parent_id:
+        return
+
+    new_ancestors = CategoryClosure.objects.filter(
+        descendant_id=category.parent_id
+    ).values_list("ancestor_id", "depth")
+    CategoryClosure.objects.bulk_create(
+        CategoryClosure(
+            ancestor_id=ancestor_id,
+            descendant_id=descendant_id,
+            depth=ancestor_depth + descendant_depth + 1,
+        )
+        for ancestor_id, ancestor_depth in new_ancestors
+        for descendant_id, descendant_depth in subtree
+    )
+
+
+def rebuild_closure():
+    """Recompute the whole closure table from Category.parent."""
+    parents = dict(Category.objects.values_list("id", "parent_id"))
+    rows = []
+    for category_id in parents:
+        node, depth, seen = category_id, 0, set()
+        while node is not None and node not in seen:
+            seen.add(node)
+            rows.append(CategoryClosure(ancestor_id=node, descendant_id=category_id, depth=depth))
+            node, depth = parents.get(node), depth + 1
+    CategoryClosure.objects.all().delete()
+    CategoryClosure.objects.bulk_create(rows, batch_size=1000)
+    invalidate_category_tree()
+    return len(rows)
+
+
+def _tree_cache_key(user_id):
+    version = cache.get_or_set(CATEGORY_TREE_VERSION_KEY, 1, timeout=None)
+    return f"categories:tree:{version}:{user_id or 'system'}"
+
+
+def invalidate_category_tree(category=None):
+    """
+    Drop cached subtrees once the surrounding transaction commits, so a
+    concurrent reader cannot re-cache the tree as it was before the change.
+    User categories only affect their owner; system categories are visible
+    to everyone, so they bump the global version.
+    """
+    user_id = None
+    if category is not None and category.user_id and not category.is_system:
+        user_id = category.user_id
+    db_transaction.on_commit(lambda: _drop_category_tree(user_id))
+
+
+def _drop_category_tree(user_id=None):
+    if user_id:
+        cache.delete(_tree_cache_key(user_id))
+        return
+    try:
+        cache.incr(CATEGORY_TREE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATEGORY_TREE_VERSION_KEY, 1, timeout=None)
+
+
+def category_tree(user=None):
+    """
+    Return {ancestor_id: [descendant_id, ...]} (self included) for every
+    category visible to the user, cached per user.
+    """
+    user_id = getattr(user, "id", user)
+    key = _tree_cache_key(user_id)
+    tree = cache.get(key)
+    if tree is not None:
+        return tree
+
+    visible = Q(is_system=True) | Q(user__isnull=True)
+    if user_id:
+        visible |= Q(user_id=user_id)
+    visible_ids = Category.objects.filter(visible).values("id")
+
+    tree = defaultdict(list)
+    for ancestor_id, descendant_id in CategoryClosure.objects.filter(
+        ancestor_id__in=visible_ids, descendant_id__in=visible_ids
+    ).values_list("ancestor_id", "descendant_id"):
+        tree[ancestor_id].append(descendant_id)
+    tree = dict(tree)
+    cache.set(key, tree, CATEGORY_TREE_CACHE_TIMEOUT)
+    return tree
+
+
+def descendant_ids(category, user=None, include_self=True):
+    """Return the ids of every category in the subtree rooted at `category`."""
+    category_id = getattr(category, "id", category)
+    if user is None:
+        user = getattr(category, "user_id", None)
+    ids = category_tree(user).get(category_id, [])
+    if include_self:
+        return list(ids)
+    return [descendant_id for descendant_id in ids if descendant_id != category_id]
@@ -1,3 +1,79 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Category, CategoryClosure
+from .services import descendant_ids, rebuild_closure
+
+
+class CategoryClosureTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="closure", password="secret")
+        self.food = Category.objects.create(name="Food & Dining", is_system=True)
+        self.restaurants = Category.objects.create(
+            name="Restaurants", is_system=True, parent=self.food
+        )
+        self.coffee = Category.objects.create(
+            name="Coffee Shops", is_system=True, parent=self.restaurants
+        )
+        self.travel = Category.objects.create(name="Travel", is_system=True)
+
+    def _links(self):
+        return set(
+            CategoryClosure.objects.values_list("ancestor_id", "descendant_id", "depth")
+        )
+
+    def test_create_links_every_ancestor(self):
+        self.assertEqual(
+            sorted(descendant_ids(self.food)),
+            sorted([self.food.id, self.restaurants.id, self.coffee.id]),
+        )
+        self.assertEqual(
+            CategoryClosure.objects.get(ancestor=self.food, descendant=self.coffee).depth, 2
+        )
+        self.assertEqual(descendant_ids(self.restaurants, include_self=False), [self.coffee.id])
+
+    def test_move_relinks_subtree(self):
+        self.restaurants.parent = self.travel
+        self.restaurants.save()
+
+        self.assertEqual(descendant_ids(self.food), [self.food.id])
+        self.assertEqual(
+            sorted(descendant_ids(self.travel)),
+            sorted([self.travel.id, self.restaurants.id, self.coffee.id]),
+        )
+
+        expected = self._links()
+        rebuild_closure()
+        self.assertEqual(self._links(), expected)
+
+    def test_move_under_own_subtree_is_rejected(self):
+        self.food.parent = self.coffee
+        with self.assertRaises(ValueError):
+            self.food.save()
+        self.food.refresh_from_db()
+        self.assertIsNone(self.food.parent_id)
+
+    def test_delete_removes_subtree_and_user_categories_stay_private(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            own = Category.objects.create(name="Espresso", user=self.user, parent=self.coffee)
+        self.assertIn(own.id, descendant_ids(self.food, user=self.user))
+        self.assertNotIn(own.id, descendant_ids(self.food))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurants.delete()
+
+        self.assertEqual(descendant_ids(self.food, user=self.user), [self.food.id])
+        self.assertFalse(CategoryClosure.objects.filter(descendant_id=own.id).exists())
+
+    def test_cached_tree_is_dropped_only_after_commit(self):
+        self.assertIn(self.coffee.id, descendant_ids(self.food))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.restaurants.parent = self.travel
+            self.restaurants.save()
+        # Until the move commits, readers keep the tree they had cached
+        self.assertIn(self.coffee.id, descendant_ids(self.food))
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(descendant_ids(self.food), [self.food.id])
@@ -24,9 +24,26 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
 # OpenAI API Key (used by predictions agent)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+
+# OCR backends: "textract" (AWS) or "tesseract" (local, no network)
+RECEIPT_OCR_BACKEND = os.getenv("RECEIPT_OCR_BACKEND", "textract")
+EVIDENCE_OCR_BACKEND = os.getenv("EVIDENCE_OCR_BACKEND", "tesseract")
+# Receipt processing worker pool size, and calls per second allowed per
+# provider; both apply per gunicorn worker process
+RECEIPT_PROCESSING_WORKERS = int(os.getenv("RECEIPT_PROCESSING_WORKERS", "4"))
+RECEIPT_RATE_LIMITS = {
+    "textract": float(os.getenv("TEXTRACT_RATE_LIMIT", "5")),
+    "openai": float(os.getenv("OPENAI_RATE_LIMIT", "5")),
+}
+
 KRAKEN_BASE_URL = os.getenv("KRAKEN_BASE_URL", "https://api.kraken.com")
 KRAKEN_API_KEY = os.getenv("KRAKEN_API_KEY", "")
 KRAKEN_API_SECRET = os.getenv("KRAKEN_API_SECRET", "")
+# Lot matching for Kraken cost basis: fifo, lifo or average
+KRAKEN_COST_BASIS_METHOD = os.getenv("KRAKEN_COST_BASIS_METHOD", "fifo")
+
+# Columnar (.npy) daily bar store for market data; set empty to disable
+MARKET_DATA_DIR = os.getenv("MARKET_DATA_DIR", os.path.join(BASE_DIR, "market_data_store"))
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
@@ -126,6 +143,26 @@ DATABASES = {
     }
 }
 
+# Cache
+# Shared by every gunicorn worker and management command, so an invalidation
+# in one process is seen by all of them. Uses Redis when REDIS_URL is set,
+# otherwise a database table (create it with `manage.py createcachetable`).
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -265,3 +302,4 @@ TASTYTRADE_ACCESS_TOKEN = os.getenv("TASTYTRADE_ACCESS_TOKEN", "")
 TASTYTRADE_OAUTH_SCOPES = os.getenv("TASTYTRADE_OAUTH_SCOPES", "read")
 TASTYTRADE_ACCOUNT_NUMBER = os.getenv("TASTYTRADE_ACCOUNT_NUMBER", "")
 TASTYTRADE_ENABLE_LIVE_ORDERS = os.getenv("TASTYTRADE_ENABLE_LIVE_ORDERS", "false").lower() == "true"
+TASTYTRADE_OPTION_CHAIN_TTL = int(os.getenv("TASTYTRADE_OPTION_CHAIN_TTL", "300"))
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable
+
+
+METHOD_FIFO = "fifo"
+METHOD_LIFO = "lifo"
+METHOD_AVERAGE = "average"
+METHODS = (METHOD_FIFO, METHOD_LIFO, METHOD_AVERAGE)
+
+ZERO = Decimal("0")
+
+
+@dataclass(frozen=True)
+class LotEvent:
+    """
+    One acquisition (positive quantity) or disposal (negative quantity) of an
+    asset. `amount` is the USD cost paid for acquisitions, fees included, and
+    the net USD proceeds for disposals. Disposals with `realize=False` are
+    transfers out: lots are consumed but no P&L is booked.
+    """
+
+    key: str
+    timestamp: datetime
+    asset: str
+    quantity: Decimal
+    amount: Decimal = ZERO
+    realize: bool = True
+
+
+@dataclass
+class Lot:
+    acquired_at: str
+    quantity: Decimal
+    cost: Decimal
+    realized: Decimal = ZERO
+
+    def to_state(self) -> dict[str, str]:
+        return {
+            "acquired_at": self.acquired_at,
+            "quantity": str(self.quantity),
+            "cost": str(self.cost),
+            "realized": str(self.realized),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, str]) -> Lot:
+        return cls(
+            acquired_at=state["acquired_at"],
+            quantity=Decimal(state["quantity"]),
+            cost=Decimal(state["cost"]),
+            realized=Decimal(state.get("realized", "0")),
+        )
+
+
+class LotBook:
+    """
+    Open lots and realized P&L per asset under one matching method. FIFO and
+    LIFO consume lots from the oldest or newest end; the average method keeps a
+    single pooled lot per asset.
+    """
+
+    def __init__(self, method: str = METHOD_FIFO):
+        if method not in METHODS:
+            raise ValueError(f"Unknown cost basis method: {method}")
+        self.method = method
+        self.lots: dict[str, list[Lot]] = {}
+        self.realized: dict[str, Decimal] = {}
+
+    def apply(self, event: LotEvent) -> None:
+        if event.quantity > 0:
+            self._acquire(event)
+        elif event.quantity < 0:
+            self._dispose(event)
+
+    def apply_all(self, events: Iterable[LotEvent]) -> None:
+        for event in events:
+            self.apply(event)
+
+    def _acquire(self, event: LotEvent) -> None:
+        lots = self.lots.setdefault(event.asset, [])
+        if self.method == METHOD_AVERAGE and lots:
+            lots[0].quantity += event.quantity
+            lots[0].cost += event.amount
+            return
+        lots.append(Lot(event.timestamp.isoformat(), event.quantity, event.amount))
+
+    def _dispose(self, event: LotEvent) -> None:
+        lots = self.lots.setdefault(event.asset, [])
+        total = -event.quantity
+        remaining = total
+        realized = ZERO
+        while remaining > 0 and lots:
+            lot = lots[0] if self.method != METHOD_LIFO else lots[-1]
+            taken = min(lot.quantity, remaining)
+            cost = lot.cost * taken / lot.quantity
+            gain = (event.amount * taken / total - cost) if event.realize else ZERO
+            lot.realized += gain
+            lot.quantity -= taken
+            lot.cost -= cost
+            realized += gain
+            remaining -= taken
+            if lot.quantity <= 0:
+                lots.remove(lot)
+        if remaining > 0 and event.realize:
+            # Sold more than the recorded lots hold: the excess has no known basis
+            realized += event.amount * remaining / total
+        self.realized[event.asset] = self.realized.get(event.asset, ZERO) + realized
+
+    def position(self, asset: str) -> tuple[Decimal, Decimal]:
+        """(open quantity, remaining cost) across the asset's lots."""
+        lots = self.lots.get(asset, [])
+        return sum((lot.quantity for lot in lots), ZERO), sum((lot.cost for lot in lots), ZERO)
+
+    def lot_report(self, asset: str, price: Decimal) -> list[dict[str, str]]:
+        return [
+            {
+                **lot.to_state(),
+                "unrealized": str(lot.quantity * price - lot.cost),
+            }
+            for lot in self.lots.get(asset, [])
+        ]
+
+    def to_state(self) -> dict[str, Any]:
+        return {
+            "method": self.method,
+            "lots": {asset: [lot.to_state() for lot in lots] for asset, lots in self.lots.items()},
+            "realized": {asset: str(value) for asset, value in self.realized.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any], method: str) -> LotBook:
+        book = cls(method)
+        if state.get("method") != method:
+            return book
+        book.lots = {
+            asset: [Lot.from_state(lot) for lot in lots]
+            for asset, lots in (state.get("lots") or {}).items()
+        }
+        book.realized = {asset: Decimal(value) for asset, value in (state.get("realized") or {}).items()}
+        return book
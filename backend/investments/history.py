@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Iterable
+
+from django.db.models import F, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from market_data.models import MarketDailyBar
+
+from .models import HoldingSnapshot, InvestmentAccount, OrderSnapshot, PortfolioValuePoint, Security
+
+
+# Sync points younger than this keep every sync; older days keep their last point.
+INTRADAY_HISTORY_DAYS = 7
+
+HISTORY_RANGES = {"1W": 7, "1M": 30, "1Y": 365, "ALL": None}
+
+CENT = Decimal("0.01")
+
+
+def holding_value_points(
+    account: InvestmentAccount,
+    holdings: Iterable[tuple[int, Decimal, Decimal]],
+    total_value: Decimal,
+    recorded_at: datetime,
+) -> list[PortfolioValuePoint]:
+    """Points for one sync: (security_id, quantity, market_value) rows plus the account total."""
+    day = timezone.localdate(recorded_at)
+    points = [
+        PortfolioValuePoint(
+            account=account,
+            security_id=security_id,
+            date=day,
+            recorded_at=recorded_at,
+            quantity=quantity,
+            market_value=market_value,
+        )
+        for security_id, quantity, market_value in holdings
+    ]
+    points.append(PortfolioValuePoint(account=account, date=day, recorded_at=recorded_at, market_value=total_value))
+    return points
+
+
+def record_value_points(points: list[PortfolioValuePoint], account_ids: list[int], today: date | None = None) -> None:
+    if points:
+        PortfolioValuePoint.objects.bulk_create(points)
+    compact_value_points(account_ids, today)
+
+
+def compact_value_points(account_ids: list[int], today: date | None = None) -> int:
+    """
+    Reduce days that left the intraday window to their last point per
+    (account, security). Returns the number of points removed.
+    """
+    cutoff = (today or timezone.localdate()) - timedelta(days=INTRADAY_HISTORY_DAYS)
+    ranked = PortfolioValuePoint.objects.filter(
+        account_id__in=account_ids,
+        is_daily=False,
+        date__lt=cutoff,
+    ).annotate(
+        rank=Window(
+            expression=RowNumber(),
+            partition_by=[F("account_id"), F("security_id"), F("date")],
+            order_by=[F("recorded_at").desc(), F("id").desc()],
+        )
+    ).values_list("id", "rank")
+
+    keep, drop = [], []
+    for point_id, rank in ranked:
+        (keep if rank == 1 else drop).append(point_id)
+    if drop:
+        PortfolioValuePoint.objects.filter(id__in=drop).delete()
+    if keep:
+        PortfolioValuePoint.objects.filter(id__in=keep).update(is_daily=True)
+    return len(drop)
+
+
+def portfolio_value_series(
+    accounts,
+    range_key: str = "1M",
+    security: Security | None = None,
+    today: date | None = None,
+) -> list[dict[str, float | str]]:
+    """
+    Daily value series summed across accounts, using each account's last point
+    of the day. Accounts without a point on a given day carry their previous
+    value forward so gaps between syncs don't show up as drops.
+    """
+    days = HISTORY_RANGES[range_key]
+    points = PortfolioValuePoint.objects.filter(account__in=accounts)
+    points = points.filter(security=security) if security else points.filter(security__isnull=True)
+    if days is not None:
+        points = points.filter(date__gte=(today or timezone.localdate()) - timedelta(days=days))
+    latest = points.annotate(
+        rank=Window(
+            expression=RowNumber(),
+            partition_by=[F("account_id"), F("date")],
+            order_by=[F("recorded_at").desc(), F("id").desc()],
+        )
+    ).filter(rank=1).values_list("account_id", "date", "market_value")
+
+    by_account: dict[int, dict[date, Decimal]] = defaultdict(dict)
+    for account_id, day, value in latest:
+        by_account[account_id][day] = value
+
+    series = []
+    carried: dict[int, Decimal] = {}
+    for day in sorted({day for values in by_account.values() for day in values}):
+        for account_id, values in by_account.items():
+            if day in values:
+                carried[account_id] = values[day]
+        series.append({"date": day.isoformat(), "value": float(sum(carried.values(), Decimal("0")))})
+    return series
+
+
+def _signed_order_quantity(order: OrderSnapshot) -> Decimal:
+    quantity = order.filled_quantity or order.quantity or Decimal("0")
+    return -quantity if order.side.upper().startswith("SELL") else quantity
+
+
+def backfill_account_history(
+    account: InvestmentAccount,
+    days: int = 365,
+    provider: str = "yfinance",
+    today: date | None = None,
+) -> int:
+    """
+    Rebuild daily points before the account's first sync point. Quantities are
+    unwound from current holdings through executed orders, and valued at the
+    stored MarketDailyBar close (carried over non-trading days). Symbols
+    without stored bars are skipped. Returns the number of points written.
+
+    Account totals are on the synced basis, i.e. holdings plus cash. Past cash
+    can't be rebuilt from orders, so the cash at the first sync (its total
+    less its holdings) is carried back over the whole backfill, or the
+    account's current cash balance when it has never synced.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days)
+    first_sync = (
+        PortfolioValuePoint.objects.filter(
+            account=account, source=PortfolioValuePoint.SOURCE_SYNC, security__isnull=True
+        )
+        .order_by("recorded_at", "id")
+        .values_list("date", "recorded_at", "market_value")
+        .first()
+    )
+    if first_sync:
+        first_day, first_recorded_at, first_total = first_sync
+        held = PortfolioValuePoint.objects.filter(
+            account=account, recorded_at=first_recorded_at, security__isnull=False
+        ).aggregate(total=Sum("market_value"))["total"]
+        cash = first_total - (held or Decimal("0"))
+        end = first_day - timedelta(days=1)
+    else:
+        cash = account.cash_balance or Decimal("0")
+        end = today
+    PortfolioValuePoint.objects.filter(account=account, source=PortfolioValuePoint.SOURCE_BACKFILL).delete()
+    if end < start:
+        return 0
+
+    quantities: dict[str, Decimal] = {}
+    for symbol, quantity in HoldingSnapshot.objects.filter(account=account).values_list("security__symbol", "quantity"):
+        quantities[symbol] = quantity
+
+    deltas: dict[date, dict[str, Decimal]] = defaultdict(lambda: defaultdict(Decimal))
+    orders = OrderSnapshot.objects.filter(
+        account=account,
+        status__iexact="EXECUTED",
+        executed_at__gte=timezone.make_aware(datetime.combine(start, time.min)),
+    )
+    for order in orders:
+        if not order.symbol:
+            continue
+        deltas[timezone.localdate(order.executed_at)][order.symbol] += _signed_order_quantity(order)
+        quantities.setdefault(order.symbol, Decimal("0"))
+
+    security_ids = dict(Security.objects.filter(symbol__in=list(quantities)).values_list("symbol", "id"))
+    closes: dict[str, tuple[list[date], list[Decimal]]] = {}
+    bars = MarketDailyBar.objects.filter(
+        symbol__in=list(security_ids),
+        provider=provider,
+        date__lte=end,
+        close__isnull=False,
+    ).order_by("symbol", "date").values_list("symbol", "date", "close")
+    for symbol, day, close in bars:
+        bar_dates, bar_closes = closes.setdefault(symbol, ([], []))
+        bar_dates.append(day)
+        bar_closes.append(close)
+
+    def close_on(symbol: str, day: date) -> Decimal | None:
+        if symbol not in closes:
+            return None
+        bar_dates, bar_closes = closes[symbol]
+        index = bisect_right(bar_dates, day)
+        return bar_closes[index - 1] if index else None
+
+    points = []
+    day = today
+    while day >= start:
+        if day <= end:
+            recorded_at = timezone.make_aware(datetime.combine(day, time(23, 59, 59)))
+            total = cash
+            for symbol, quantity in quantities.items():
+                close = close_on(symbol, day)
+                if not quantity or close is None or symbol not in security_ids:
+                    continue
+                value = (quantity * close).quantize(CENT)
+                total += value
+                points.append(PortfolioValuePoint(
+                    account=account,
+                    security_id=security_ids[symbol],
+                    date=day,
+                    recorded_at=recorded_at,
+                    quantity=quantity,
+                    market_value=value,
+                    is_daily=True,
+                    source=PortfolioValuePoint.SOURCE_BACKFILL,
+                ))
+            points.append(PortfolioValuePoint(
+                account=account,
+                date=day,
+                recorded_at=recorded_at,
+                market_value=total,
+                is_daily=True,
+                source=PortfolioValuePoint.SOURCE_BACKFILL,
+            ))
+        # Step to the previous day by undoing that day's fills
+        for symbol, delta in deltas.get(day, {}).items():
+            quantities[symbol] -= delta
+        day -= timedelta(days=1)
+
+    PortfolioValuePoint.objects.bulk_create(points, batch_size=1000)
+    return len(points)
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class IntegrationError(Exception):
+    """A provider could not be reached, even after retries."""
+
+
+class CircuitOpenError(IntegrationError):
+    pass
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Upper bound on a provider-supplied Retry-After, in seconds
+MAX_RETRY_AFTER = 30.0
+# Latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# (connect, read) timeouts and pool sizes per provider. INTEGRATION_HTTP in
+# settings can override any of these per provider.
+PROVIDER_DEFAULTS: dict[str, dict[str, Any]] = {
+    "snaptrade": {"timeout": (5.0, 30.0), "pool_maxsize": 8},
+    "kraken": {"timeout": (5.0, 20.0), "pool_maxsize": 4},
+    "tastytrade": {"timeout": (5.0, 20.0), "pool_maxsize": 4},
+}
+DEFAULT_OPTIONS: dict[str, Any] = {
+    "timeout": (5.0, 30.0),
+    "pool_maxsize": 4,
+    "max_retries": 3,
+    "backoff_factor": 0.5,
+    "failure_threshold": 5,
+    "reset_timeout": 30.0,
+}
+
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[^/]+$")
+
+
+def endpoint_label(url: str) -> str:
+    """Metric label for a URL or path: segments containing digits (ids, account numbers) become {id}."""
+    path = urlsplit(url).path or "/"
+    return "/".join("{id}" if _ID_SEGMENT.match(segment) else segment for segment in path.split("/"))
+
+
+class MonotonicNonce:
+    """
+    Strictly increasing millisecond nonces. Two calls in the same millisecond,
+    or a clock step backwards, still get distinct increasing values.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> str:
+        with self._lock:
+            self._last = max(self._last + 1, int(self._clock() * 1000))
+            return str(self._last)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. Then a single probe is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+                self._probing = False
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.statuses: dict[str, int] = {}
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+
+    def observe(self, elapsed_ms: float, status: str, error: bool, retries: int) -> None:
+        self.count += 1
+        self.errors += int(error)
+        self.retries += retries
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.total_ms += elapsed_ms
+
+    def percentile(self, fraction: float) -> float | None:
+        """Upper bound of the bucket holding the given fraction of calls."""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for bound, hits in zip((*LATENCY_BUCKETS_MS, None), self.buckets):
+            seen += hits
+            if seen >= target:
+                # None past the last bucket: slower than LATENCY_BUCKETS_MS tracks
+                return bound
+        return None
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "statuses": dict(self.statuses),
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            # Per-bucket (not cumulative) counts; le=None is everything slower
+            "histogram_ms": [
+                {"le": bound, "count": hits}
+                for bound, hits in zip((*LATENCY_BUCKETS_MS, None), self.buckets)
+            ],
+        }
+
+
+class IntegrationClient:
+    """
+    Pooled HTTP client for one provider. Idempotent requests, and any request
+    marked `idempotent=True`, are retried on connection errors and retryable
+    statuses with jittered exponential backoff that honours Retry-After.
+    Every call is recorded in per-endpoint latency and status metrics.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        *,
+        timeout: tuple[float, float] = DEFAULT_OPTIONS["timeout"],
+        pool_maxsize: int = DEFAULT_OPTIONS["pool_maxsize"],
+        max_retries: int = DEFAULT_OPTIONS["max_retries"],
+        backoff_factor: float = DEFAULT_OPTIONS["backoff_factor"],
+        failure_threshold: int = DEFAULT_OPTIONS["failure_threshold"],
+        reset_timeout: float = DEFAULT_OPTIONS["reset_timeout"],
+    ):
+        self.provider = provider
+        self.timeout = tuple(timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.sleep = time.sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._metrics: dict[str, EndpointMetrics] = {}
+        self._metrics_lock = threading.Lock()
+
+    def _backoff(self, attempt: int, response: requests.Response | None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_RETRY_AFTER)
+            except ValueError:
+                pass
+        return self.backoff_factor * (2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        endpoint: str | None = None,
+        idempotent: bool | None = None,
+        prepare: Callable[[], dict[str, Any]] | None = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request and return the final response, whatever its status.
+        `prepare` is called before every attempt and its result merged into
+        the request kwargs, for requests that must be re-signed on retry.
+        """
+        method = method.upper()
+        label = f"{method} {endpoint or endpoint_label(url)}"
+        retryable = method in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        kwargs.setdefault("timeout", self.timeout)
+
+        if not self.breaker.allow():
+            self._observe(label, 0.0, "circuit_open", True, 0)
+            raise CircuitOpenError(f"{self.provider} is unavailable; circuit open after repeated failures.")
+
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.request(method, url, **{**kwargs, **(prepare() if prepare else {})})
+            except requests.RequestException as exc:
+                transient = isinstance(exc, (requests.ConnectionError, requests.Timeout))
+                if transient and retryable and attempt < self.max_retries:
+                    self.sleep(self._backoff(attempt, None))
+                    attempt += 1
+                    continue
+                self.breaker.record_failure()
+                self._observe(label, (time.perf_counter() - started) * 1000, type(exc).__name__, True, attempt)
+                raise IntegrationError(f"{self.provider} request failed: {exc}") from exc
+            except BaseException as exc:
+                # Anything else, e.g. from signing or a token fetch in
+                # `prepare`, still settles a half-open probe so the circuit
+                # cannot stay stuck open
+                self.breaker.record_failure()
+                self._observe(label, (time.perf_counter() - started) * 1000, type(exc).__name__, True, attempt)
+                raise
+
+            if response.status_code in RETRY_STATUSES and retryable and attempt < self.max_retries:
+                self.sleep(self._backoff(attempt, response))
+                attempt += 1
+                continue
+            break
+
+        failed = response.status_code in RETRY_STATUSES
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self._observe(label, (time.perf_counter() - started) * 1000, str(response.status_code), response.status_code >= 400, attempt)
+        return response
+
+    def _observe(self, label: str, elapsed_ms: float, status: str, error: bool, retries: int) -> None:
+        with self._metrics_lock:
+            self._metrics.setdefault(label, EndpointMetrics()).observe(elapsed_ms, status, error, retries)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._metrics_lock:
+            return {
+                "breaker": self.breaker.state,
+                "endpoints": {label: metrics.snapshot() for label, metrics in sorted(self._metrics.items())},
+            }
+
+    def reset_metrics(self) -> None:
+        with self._metrics_lock:
+            self._metrics.clear()
+
+
+_clients: dict[str, IntegrationClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider: str) -> IntegrationClient:
+    """Process-wide client for a provider, so every service instance shares its pool and breaker."""
+    with _clients_lock:
+        client = _clients.get(provider)
+        if client is None:
+            overrides = (getattr(settings, "INTEGRATION_HTTP", None) or {}).get(provider, {})
+            client = IntegrationClient(provider, **{**PROVIDER_DEFAULTS.get(provider, {}), **overrides})
+            _clients[provider] = client
+        return client
+
+
+def reset_clients() -> None:
+    """Drop all clients (and their pools, breakers and metrics)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.session.close()
+        _clients.clear()
+
+
+def integration_metrics() -> dict[str, Any]:
+    with _clients_lock:
+        clients = dict(_clients)
+    return {provider: client.metrics() for provider, client in sorted(clients.items())}
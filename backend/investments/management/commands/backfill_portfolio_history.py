@@ -0,0 +1,43 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from investments.history import backfill_account_history
+from investments.models import InvestmentAccount
+
+
+class Command(BaseCommand):
+    help = "Reconstruct daily portfolio value history from executed orders and stored daily closes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            default="",
+            help="Comma-separated usernames to limit the backfill to. Defaults to all users.",
+        )
+        parser.add_argument("--days", type=int, default=365, help="How many days of history to rebuild.")
+        parser.add_argument("--provider", default="yfinance", help="Market data provider for daily closes.")
+
+    def handle(self, *args, **options):
+        if options["days"] <= 0:
+            raise CommandError("--days must be positive.")
+
+        accounts = InvestmentAccount.objects.filter(is_active=True).select_related("connection__user")
+        usernames = [name.strip() for name in options["users"].split(",") if name.strip()]
+        if usernames:
+            known = set(get_user_model().objects.filter(username__in=usernames).values_list("username", flat=True))
+            missing = set(usernames) - known
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+            accounts = accounts.filter(connection__user__username__in=usernames)
+
+        result = {
+            account.provider_account_id: backfill_account_history(
+                account,
+                days=options["days"],
+                provider=options["provider"],
+            )
+            for account in accounts
+        }
+        self.stdout.write(self.style.SUCCESS(json.dumps({"points": result}, indent=2, sort_keys=True)))
@@ -0,0 +1,60 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from investments.http_client import IntegrationClient, IntegrationError
+from investments.stub_server import StubBrokerServer, StubResponse
+
+
+class Command(BaseCommand):
+    help = "Benchmark the pooled integration HTTP client against a local stub server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Total requests to send.")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent callers.")
+        parser.add_argument("--latency-ms", type=float, default=5.0, help="Simulated server latency per request.")
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests that first get a 503, to exercise retries.",
+        )
+
+    def handle(self, *args, **options):
+        total = options["requests"]
+        workers = options["workers"]
+        if total <= 0 or workers <= 0:
+            raise CommandError("--requests and --workers must be positive.")
+        if not 0 <= options["error_rate"] < 1:
+            raise CommandError("--error-rate must be in [0, 1).")
+
+        delay = options["latency_ms"] / 1000
+        path = "/accounts/bench-1/positions"
+        client = IntegrationClient("benchmark", pool_maxsize=workers, backoff_factor=0.001, failure_threshold=total + 1)
+        with StubBrokerServer() as server:
+            server.set_default(path, StubResponse(200, {"positions": []}, delay=delay))
+            failures = int(total * options["error_rate"])
+            server.script(path, *[StubResponse(503, {"error": "busy"}, delay=delay) for _ in range(failures)])
+
+            def call(_):
+                try:
+                    return client.request("GET", server.url(path)).status_code
+                except IntegrationError:
+                    return None
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                statuses = list(executor.map(call, range(total)))
+            elapsed = time.perf_counter() - started
+
+        result = {
+            "requests": total,
+            "workers": workers,
+            "ok": sum(1 for status in statuses if status == 200),
+            "elapsed_seconds": round(elapsed, 3),
+            "requests_per_second": round(total / elapsed, 1) if elapsed else None,
+            "metrics": client.metrics(),
+        }
+        self.stdout.write(self.style.SUCCESS(json.dumps(result, indent=2, sort_keys=True)))
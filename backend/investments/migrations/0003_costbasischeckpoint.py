@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-19 01:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0002_krakenledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CostBasisCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=16)),
+                ('source', models.CharField(blank=True, default='', max_length=16)),
+                ('last_event_at', models.DateTimeField(blank=True, null=True)),
+                ('last_event_key', models.CharField(blank=True, default='', max_length=255)),
+                ('rows_through', models.PositiveIntegerField(default=0)),
+                ('state', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_basis_checkpoints', to='investments.investmentaccount')),
+            ],
+            options={
+                'unique_together': {('account', 'method')},
+            },
+        ),
+    ]
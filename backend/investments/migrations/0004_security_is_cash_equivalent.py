@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-19 01:07
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+CASH_EQUIVALENT_SYMBOLS = ["SPAXX", "FDRXX", "FZFXX", "FDLXX", "SPRXX", "FCASH", "CASH"]
+
+
+def flag_cash_equivalents(apps, schema_editor):
+    Security = apps.get_model("investments", "Security")
+    Security.objects.filter(
+        Q(symbol__in=CASH_EQUIVALENT_SYMBOLS)
+        | Q(asset_type__icontains="money market")
+        | Q(name__icontains="money market")
+    ).update(is_cash_equivalent=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0003_costbasischeckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='security',
+            name='is_cash_equivalent',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(flag_cash_equivalents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-19 01:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0004_security_is_cash_equivalent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioValuePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('recorded_at', models.DateTimeField()),
+                ('quantity', models.DecimalField(blank=True, decimal_places=8, max_digits=24, null=True)),
+                ('market_value', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('is_daily', models.BooleanField(default=False)),
+                ('source', models.CharField(choices=[('sync', 'Sync'), ('backfill', 'Backfill')], default='sync', max_length=16)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='value_points', to='investments.investmentaccount')),
+                ('security', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='value_points', to='investments.security')),
+            ],
+            options={
+                'ordering': ['date', 'recorded_at'],
+                'indexes': [models.Index(fields=['account', 'date'], name='investments_account_bb3e3f_idx'), models.Index(fields=['security', 'date'], name='investments_securit_941b2f_idx'), models.Index(fields=['is_daily', 'date'], name='investments_is_dail_a1cc6f_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-19 01:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0005_portfoliovaluepoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapTradeWebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snaptrade_user_id', models.CharField(blank=True, default='', max_length=255)),
+                ('event_type', models.CharField(blank=True, default='', max_length=64)),
+                ('provider_account_id', models.CharField(blank=True, default='', max_length=255)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('connection', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='webhook_events', to='investments.snaptradeconnection')),
+            ],
+            options={
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['connection', 'processed_at'], name='investments_connect_ff8e5c_idx'), models.Index(fields=['event_type', '-received_at'], name='investments_event_t_d6e33b_idx')],
+            },
+        ),
+    ]
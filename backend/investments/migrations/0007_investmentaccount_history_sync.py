@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0006_snaptradewebhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='investmentaccount',
+            name='history_sync',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
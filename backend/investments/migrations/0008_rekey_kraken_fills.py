@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def drop_order_keyed_kraken_fills(apps, schema_editor):
+    """
+    Kraken fills used to be stored under their order id, so all but the first
+    fill of a multi-fill order were dropped. The stored rows do not carry the
+    trade id, so remove them and let the next sync re-fetch the full trade
+    history under trade ids.
+    """
+    InvestmentAccount = apps.get_model("investments", "InvestmentAccount")
+    OrderSnapshot = apps.get_model("investments", "OrderSnapshot")
+    CostBasisCheckpoint = apps.get_model("investments", "CostBasisCheckpoint")
+
+    accounts = InvestmentAccount.objects.filter(provider_account_id__startswith="kraken-spot-")
+    OrderSnapshot.objects.filter(account__in=accounts).delete()
+    CostBasisCheckpoint.objects.filter(account__in=accounts, source="orders").delete()
+    for account in accounts:
+        history_sync = dict(account.history_sync or {})
+        history_sync.pop("trades", None)
+        account.history_sync = history_sync
+        account.save(update_fields=["history_sync"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investments", "0007_investmentaccount_history_sync"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_order_keyed_kraken_fills, migrations.RunPython.noop),
+    ]
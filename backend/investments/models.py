@@ -2,6 +2,9 @@ from django.contrib.auth.models import User
 from django.db import models
 
 
+CASH_EQUIVALENT_SYMBOLS = {"SPAXX", "FDRXX", "FZFXX", "FDLXX", "SPRXX", "FCASH", "CASH"}
+
+
 class SnapTradeConnection(models.Model):
     STATUS_PENDING = "pending"
     STATUS_ACTIVE = "active"
@@ -46,6 +49,8 @@ class InvestmentAccount(models.Model):
     is_active = models.BooleanField(default=True)
     last_synced_at = models.DateTimeField(null=True, blank=True)
     raw = models.JSONField(default=dict, blank=True)
+    # Per-stream history paging progress, e.g. {"trades": {"complete": false, "before": 1700000000}}
+    history_sync = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -62,6 +67,7 @@ class Security(models.Model):
     asset_type = models.CharField(max_length=100, blank=True, default="")
     currency = models.CharField(max_length=8, default="USD")
     exchange = models.CharField(max_length=100, blank=True, default="")
+    is_cash_equivalent = models.BooleanField(default=False)
     raw = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -72,6 +78,29 @@ class Security(models.Model):
     def __str__(self):
         return self.symbol
 
+    def detect_cash_equivalent(self) -> bool:
+        """Money market sweeps and core cash positions count toward available cash."""
+        if (self.symbol or "").upper() in CASH_EQUIVALENT_SYMBOLS:
+            return True
+        raw = self.raw if isinstance(self.raw, dict) else {}
+        labels = [
+            self.asset_type,
+            self.name,
+            raw.get("type"),
+            raw.get("security_type"),
+            raw.get("description"),
+            raw.get("name"),
+            raw.get("security_name"),
+        ]
+        return any(isinstance(label, str) and "money market" in label.lower() for label in labels)
+
+    def save(self, *args, **kwargs):
+        self.is_cash_equivalent = self.detect_cash_equivalent()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "is_cash_equivalent" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "is_cash_equivalent"]
+        super().save(*args, **kwargs)
+
 
 class HoldingSnapshot(models.Model):
     account = models.ForeignKey(InvestmentAccount, on_delete=models.CASCADE, related_name="holdings")
@@ -139,3 +168,84 @@ class KrakenLedgerEntry(models.Model):
 
     def __str__(self):
         return f"{self.asset} {self.entry_type} {self.amount}"
+
+
+class CostBasisCheckpoint(models.Model):
+    """Replayed lot state for an account, so each sync only applies new events."""
+
+    account = models.ForeignKey(InvestmentAccount, on_delete=models.CASCADE, related_name="cost_basis_checkpoints")
+    method = models.CharField(max_length=16)
+    source = models.CharField(max_length=16, blank=True, default="")
+    last_event_at = models.DateTimeField(null=True, blank=True)
+    last_event_key = models.CharField(max_length=255, blank=True, default="")
+    rows_through = models.PositiveIntegerField(default=0)
+    state = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [("account", "method")]
+
+    def __str__(self):
+        return f"{self.account} {self.method} @ {self.last_event_at}"
+
+
+class PortfolioValuePoint(models.Model):
+    """
+    Append-only value history. One row per holding plus one account total
+    (security is null) is written on every sync; rows older than the
+    intraday window are compacted to the last point of each day.
+    """
+
+    SOURCE_SYNC = "sync"
+    SOURCE_BACKFILL = "backfill"
+    SOURCE_CHOICES = [
+        (SOURCE_SYNC, "Sync"),
+        (SOURCE_BACKFILL, "Backfill"),
+    ]
+
+    account = models.ForeignKey(InvestmentAccount, on_delete=models.CASCADE, related_name="value_points")
+    security = models.ForeignKey(Security, on_delete=models.CASCADE, null=True, blank=True, related_name="value_points")
+    date = models.DateField()
+    recorded_at = models.DateTimeField()
+    quantity = models.DecimalField(max_digits=24, decimal_places=8, null=True, blank=True)
+    market_value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    is_daily = models.BooleanField(default=False)
+    source = models.CharField(max_length=16, choices=SOURCE_CHOICES, default=SOURCE_SYNC)
+
+    class Meta:
+        ordering = ["date", "recorded_at"]
+        indexes = [
+            models.Index(fields=["account", "date"]),
+            models.Index(fields=["security", "date"]),
+            models.Index(fields=["is_daily", "date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.security_id or 'total'} {self.date} {self.market_value}"
+
+
+class SnapTradeWebhookEvent(models.Model):
+    connection = models.ForeignKey(
+        SnapTradeConnection,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="webhook_events",
+    )
+    snaptrade_user_id = models.CharField(max_length=255, blank=True, default="")
+    event_type = models.CharField(max_length=64, blank=True, default="")
+    provider_account_id = models.CharField(max_length=255, blank=True, default="")
+    payload = models.JSONField(default=dict, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        ordering = ["-received_at"]
+        indexes = [
+            models.Index(fields=["connection", "processed_at"]),
+            models.Index(fields=["event_type", "-received_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.provider_account_id or self.snaptrade_user_id}"
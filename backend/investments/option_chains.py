@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Iterable
+
+import numpy as np
+
+
+@dataclass
+class OptionChain:
+    """
+    A normalized option chain for one underlying. Expirations are stored once;
+    strikes are a flat table, sorted by (expiration, strike), that points back
+    into them by index.
+    """
+
+    underlying: str
+    expirations: np.ndarray  # datetime64[D]
+    days_to_expiration: np.ndarray  # int32, -1 when the provider omitted it
+    expiration_index: np.ndarray  # int32, one per strike row
+    strikes: np.ndarray  # float64
+    calls: np.ndarray  # object, OCC symbols ("" when missing)
+    puts: np.ndarray  # object
+
+    def __len__(self) -> int:
+        return len(self.strikes)
+
+    @classmethod
+    def from_payload(cls, underlying: str, items: Iterable[dict[str, Any]]) -> OptionChain:
+        """Build from the expirations of Tastytrade's nested chain items."""
+        by_date: dict[str, int] = {}
+        rows: list[tuple[str, float, str, str]] = []
+        seen: set[tuple[str, float]] = set()
+        for item in items:
+            expiration = item.get("expiration-date") or item.get("expiration_date")
+            if not expiration:
+                continue
+            dte = item.get("days-to-expiration", item.get("days_to_expiration"))
+            by_date[expiration] = max(by_date.get(expiration, -1), int(dte) if dte is not None else -1)
+            for strike in item.get("strikes") or []:
+                try:
+                    price = float(strike.get("strike-price") or strike.get("strike_price"))
+                except (TypeError, ValueError):
+                    # Kept so strike counts match the payload; range filters drop NaN
+                    price = float("nan")
+                else:
+                    # Weekly and monthly roots can list the same strike; the first wins
+                    if (expiration, price) in seen:
+                        continue
+                    seen.add((expiration, price))
+                rows.append((expiration, price, strike.get("call") or "", strike.get("put") or ""))
+
+        dates = sorted(by_date)
+        position = {expiration: index for index, expiration in enumerate(dates)}
+        rows.sort(key=lambda row: (position[row[0]], np.isnan(row[1]), 0.0 if np.isnan(row[1]) else row[1]))
+        return cls(
+            underlying=underlying.upper(),
+            expirations=np.array(dates, dtype="datetime64[D]"),
+            days_to_expiration=np.array([by_date[expiration] for expiration in dates], dtype=np.int32),
+            expiration_index=np.array([position[row[0]] for row in rows], dtype=np.int32),
+            strikes=np.array([row[1] for row in rows], dtype=np.float64),
+            calls=np.array([row[2] for row in rows], dtype=object),
+            puts=np.array([row[3] for row in rows], dtype=object),
+        )
+
+    def filter(
+        self,
+        min_strike: float | None = None,
+        max_strike: float | None = None,
+        expirations: Iterable[date | str] | None = None,
+        max_days: int | None = None,
+    ) -> OptionChain:
+        """A sub-chain; expirations left without strikes are dropped."""
+        keep_expiration = np.ones(len(self.expirations), dtype=bool)
+        if expirations is not None:
+            wanted = np.array([str(value) for value in expirations], dtype="datetime64[D]")
+            keep_expiration &= np.isin(self.expirations, wanted)
+        if max_days is not None:
+            keep_expiration &= (self.days_to_expiration >= 0) & (self.days_to_expiration <= max_days)
+
+        mask = keep_expiration[self.expiration_index]
+        if min_strike is not None:
+            mask &= self.strikes >= min_strike
+        if max_strike is not None:
+            mask &= self.strikes <= max_strike
+
+        used = np.unique(self.expiration_index[mask])
+        remap = np.full(len(self.expirations), -1, dtype=np.int32)
+        remap[used] = np.arange(len(used), dtype=np.int32)
+        return OptionChain(
+            underlying=self.underlying,
+            expirations=self.expirations[used],
+            days_to_expiration=self.days_to_expiration[used],
+            expiration_index=remap[self.expiration_index[mask]],
+            strikes=self.strikes[mask],
+            calls=self.calls[mask],
+            puts=self.puts[mask],
+        )
+
+    def strike_counts(self) -> np.ndarray:
+        return np.bincount(self.expiration_index, minlength=len(self.expirations))
+
+    def summary(self, max_expirations: int = 6) -> dict[str, Any]:
+        counts = self.strike_counts()
+        return {
+            "raw_expiration_count": len(self.expirations),
+            "expirations": [
+                {
+                    "expiration_date": str(self.expirations[index]),
+                    "days_to_expiration": int(self.days_to_expiration[index]) if self.days_to_expiration[index] >= 0 else None,
+                    "strike_count": int(counts[index]),
+                }
+                for index in range(min(max_expirations, len(self.expirations)))
+            ],
+        }
+
+    def rows(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "expiration_date": str(self.expirations[self.expiration_index[index]]),
+                "strike": None if np.isnan(self.strikes[index]) else float(self.strikes[index]),
+                "call": self.calls[index] or None,
+                "put": self.puts[index] or None,
+            }
+            for index in range(len(self))
+        ]
@@ -3,18 +3,36 @@ import hashlib
 import hmac
 import json
 import time
-from datetime import UTC, datetime
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, date, datetime
 from decimal import Decimal
-from typing import Any
+from typing import Any, Callable, Iterable
 from urllib.parse import urlencode, urlparse
 
-import requests
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import models
+from django.db.models import Max, Min
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 
-from .models import HoldingSnapshot, InvestmentAccount, KrakenLedgerEntry, OrderSnapshot, Security, SnapTradeConnection
+from market_data.models import MarketDailyBar
+
+from .cost_basis import METHOD_FIFO, LotBook, LotEvent
+from .history import holding_value_points, record_value_points
+from .http_client import IntegrationError, MonotonicNonce, endpoint_label, get_client
+from .models import (
+    CostBasisCheckpoint,
+    HoldingSnapshot,
+    InvestmentAccount,
+    KrakenLedgerEntry,
+    OrderSnapshot,
+    Security,
+    SnapTradeConnection,
+)
+from .option_chains import OptionChain
 
 
 class SnapTradeError(Exception):
@@ -38,6 +56,8 @@ KRAKEN_ASSET_ALIASES = {
     "SOL": "SOL",
 }
 KRAKEN_USD_ASSETS = {"ZUSD", "USD"}
+# Safety valve for ofs paging; Kraken returns 50 results per page.
+KRAKEN_MAX_PAGES = 400
 KRAKEN_CRYPTO_ASSETS = {
     "BTC": {"symbol": "BTC-USD", "name": "Bitcoin", "pair": "XXBTZUSD"},
     "ETH": {"symbol": "ETH-USD", "name": "Ethereum", "pair": "XETHZUSD"},
@@ -54,8 +74,29 @@ def _kraken_asset_symbol(asset: str) -> str:
     return normalized
 
 
+PORTFOLIO_SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def portfolio_summary_cache_key(user_id: int) -> str:
+    return f"investments:portfolio_summary:{user_id}"
+
+
+def invalidate_portfolio_summary(user_id: int) -> None:
+    """Drop the cached summary after a sync, webhook or connection change."""
+    cache.delete(portfolio_summary_cache_key(user_id))
+
+
+# Tastytrade access tokens last 15 minutes; refresh a little before expiry.
+TASTYTRADE_TOKEN_LIFETIME = 15 * 60
+TASTYTRADE_TOKEN_EXPIRY_MARGIN = 60
+
+
+# Upper bound on concurrent SnapTrade requests during a connection sync.
+SNAPTRADE_MAX_WORKERS = 8
+
 class SnapTradeService:
     def __init__(self):
+        self.client = get_client("snaptrade")
         self.base_url = getattr(settings, "SNAPTRADE_BASE_URL", "https://api.snaptrade.com/api/v1")
         self.client_id = getattr(settings, "SNAPTRADE_CLIENT_ID", None)
         self.consumer_key = getattr(settings, "SNAPTRADE_CONSUMER_KEY", None)
@@ -94,14 +135,17 @@ class SnapTradeService:
             "timestamp": str(int(time.time())),
         }
         query = urlencode(signed_params)
-        response = requests.request(
-            method,
-            url,
-            headers=self._headers({"Signature": self._signature(path, query, json_body)}),
-            params=signed_params,
-            json=json_body,
-            timeout=45,
-        )
+        try:
+            response = self.client.request(
+                method,
+                url,
+                endpoint=endpoint_label(path),
+                headers=self._headers({"Signature": self._signature(path, query, json_body)}),
+                params=signed_params,
+                json=json_body,
+            )
+        except IntegrationError as exc:
+            raise SnapTradeError(str(exc)) from exc
         if response.status_code >= 400:
             try:
                 payload = response.json()
@@ -193,6 +237,10 @@ class SnapTradeService:
         return hmac.compare_digest(expected, signature)
 
 
+# Shared by every KrakenService so concurrent syncs never reuse a nonce
+_kraken_nonce = MonotonicNonce()
+
+
 class KrakenService:
     def __init__(self):
         self.base_url = getattr(settings, "KRAKEN_BASE_URL", "https://api.kraken.com")
@@ -200,6 +248,7 @@ class KrakenService:
         self.api_secret = getattr(settings, "KRAKEN_API_SECRET", None)
         if not self.api_key or not self.api_secret:
             raise KrakenError("Kraken is not configured. Set KRAKEN_API_KEY and KRAKEN_API_SECRET.")
+        self.client = get_client("kraken")
 
     def _sign(self, path: str, data: dict[str, Any]) -> str:
         post_data = urlencode(data)
@@ -209,17 +258,19 @@ class KrakenService:
         return base64.b64encode(digest).decode("utf-8")
 
     def _private_request(self, path: str, data: dict[str, Any] | None = None) -> dict[str, Any]:
-        payload = {"nonce": str(int(time.time() * 1000)), **(data or {})}
-        url = f"{self.base_url.rstrip('/')}{path}"
-        response = requests.post(
-            url,
-            headers={
-                "API-Key": self.api_key,
-                "API-Sign": self._sign(path, payload),
-            },
-            data=payload,
-            timeout=45,
-        )
+        def signed() -> dict[str, Any]:
+            # Every attempt needs a fresh nonce; Kraken rejects a reused one
+            payload = {"nonce": _kraken_nonce.next(), **(data or {})}
+            return {
+                "headers": {"API-Key": self.api_key, "API-Sign": self._sign(path, payload)},
+                "data": payload,
+            }
+
+        try:
+            # The private endpoints used here only read, so they are safe to retry
+            response = self.client.request("POST", f"{self.base_url.rstrip('/')}{path}", idempotent=True, prepare=signed)
+        except IntegrationError as exc:
+            raise KrakenError(str(exc)) from exc
         if response.status_code >= 400:
             raise KrakenError(f"Kraken request failed ({response.status_code}): {response.text}")
         body = response.json()
@@ -229,7 +280,10 @@ class KrakenService:
         return body.get("result") or {}
 
     def _public_request(self, path: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
-        response = requests.get(f"{self.base_url.rstrip('/')}{path}", params=params or {}, timeout=45)
+        try:
+            response = self.client.request("GET", f"{self.base_url.rstrip('/')}{path}", params=params or {})
+        except IntegrationError as exc:
+            raise KrakenError(str(exc)) from exc
         if response.status_code >= 400:
             raise KrakenError(f"Kraken public request failed ({response.status_code}): {response.text}")
         body = response.json()
@@ -241,11 +295,41 @@ class KrakenService:
     def balances(self) -> dict[str, Any]:
         return self._private_request("/0/private/Balance")
 
-    def ledger(self, limit: int = 200) -> dict[str, Any]:
-        return self._private_request("/0/private/Ledgers", {"ofs": 0, "type": "all"}) or {}
-
-    def trades(self) -> dict[str, Any]:
-        return self._private_request("/0/private/TradesHistory", {"type": "all"}) or {}
+    def _paged(self, path: str, key: str, start: int | None = None, end: int | None = None) -> dict[str, Any]:
+        """
+        Follow Kraken's ofs paging (50 results per page, newest first) until
+        `count` results are collected. `start` and `end` are exclusive unix
+        timestamps. `complete` is False when KRAKEN_MAX_PAGES cut the walk
+        short, leaving older entries unfetched.
+        """
+        results: dict[str, Any] = {}
+        offset = 0
+        complete = False
+        for _ in range(KRAKEN_MAX_PAGES):
+            data: dict[str, Any] = {"type": "all", "ofs": offset}
+            if start is not None:
+                data["start"] = start
+            if end is not None:
+                data["end"] = end
+            page = self._private_request(path, data) or {}
+            entries = page.get(key) or {}
+            if not isinstance(entries, dict) or not entries:
+                complete = True
+                break
+            results.update(entries)
+            offset += len(entries)
+            if offset >= int(page.get("count") or 0):
+                complete = True
+                break
+        if not complete:
+            print(f"[Kraken] {path} history truncated after {KRAKEN_MAX_PAGES} pages ({len(results)} entries)")
+        return {key: results, "count": len(results), "complete": complete}
+
+    def ledger(self, start: int | None = None, end: int | None = None) -> dict[str, Any]:
+        return self._paged("/0/private/Ledgers", "ledger", start, end)
+
+    def trades(self, start: int | None = None, end: int | None = None) -> dict[str, Any]:
+        return self._paged("/0/private/TradesHistory", "trades", start, end)
 
     def usd_prices(self) -> dict[str, Decimal]:
         payload = self._public_request(
@@ -280,12 +364,10 @@ class TastytradeService:
         self.access_token = getattr(settings, "TASTYTRADE_ACCESS_TOKEN", "")
         self.account_number = getattr(settings, "TASTYTRADE_ACCOUNT_NUMBER", "")
         self.live_orders_enabled = bool(getattr(settings, "TASTYTRADE_ENABLE_LIVE_ORDERS", False))
-        self.session = requests.Session()
-        self.session.headers.update({
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-            "User-Agent": self.user_agent,
-        })
+        self.option_chain_ttl = int(getattr(settings, "TASTYTRADE_OPTION_CHAIN_TTL", 300))
+        # Set once a token comes from the refresh flow (or its cache), so a 401 can refresh it
+        self._token_from_refresh = False
+        self.client = get_client("tastytrade")
 
     def configured(self) -> dict[str, Any]:
         return {
@@ -300,14 +382,25 @@ class TastytradeService:
             "live_orders_enabled": self.live_orders_enabled,
         }
 
+    def _token_cache_key(self) -> str:
+        fingerprint = hashlib.sha256(f"{self.base_url}|{self.client_id}|{self.refresh_token}".encode("utf-8")).hexdigest()
+        return f"investments:tastytrade:access_token:{fingerprint[:16]}"
+
     def ensure_access_token(self) -> str:
         if self.access_token:
             return self.access_token
         if not self.client_secret or not self.refresh_token:
             raise TastytradeError("Tastytrade is not configured. Set TASTYTRADE_CLIENT_SECRET and TASTYTRADE_REFRESH_TOKEN.")
 
-        response = self.session.post(
-            f"{self.base_url}/oauth/token",
+        cached = cache.get(self._token_cache_key())
+        if cached:
+            self.access_token = cached
+            self._token_from_refresh = True
+            return self.access_token
+
+        response = self._send(
+            "POST",
+            "/oauth/token",
             data={
                 "grant_type": "refresh_token",
                 "refresh_token": self.refresh_token,
@@ -319,7 +412,6 @@ class TastytradeService:
                 "Content-Type": "application/x-www-form-urlencoded",
                 "User-Agent": self.user_agent,
             },
-            timeout=30,
         )
         if response.status_code >= 400:
             raise TastytradeError(f"Tastytrade OAuth failed ({response.status_code}).")
@@ -328,17 +420,42 @@ class TastytradeService:
         if not token:
             raise TastytradeError("Tastytrade OAuth response did not include an access token.")
         self.access_token = str(token)
+        try:
+            expires_in = int(payload.get("expires_in") or payload.get("expires-in") or TASTYTRADE_TOKEN_LIFETIME)
+        except (TypeError, ValueError):
+            expires_in = TASTYTRADE_TOKEN_LIFETIME
+        timeout = expires_in - TASTYTRADE_TOKEN_EXPIRY_MARGIN
+        if timeout > 0:
+            cache.set(self._token_cache_key(), self.access_token, timeout)
+        self._token_from_refresh = True
         return self.access_token
 
+    def _send(self, method: str, path: str, **kwargs):
+        try:
+            return self.client.request(
+                method,
+                f"{self.base_url}/{path.lstrip('/')}",
+                endpoint=endpoint_label(path),
+                **kwargs,
+            )
+        except IntegrationError as exc:
+            raise TastytradeError(str(exc)) from exc
+
+    def _authorized(self, method: str, path: str, **kwargs):
+        headers = {
+            "Accept": "application/json",
+            "Authorization": f"Bearer {self.ensure_access_token()}",
+            "User-Agent": self.user_agent,
+        }
+        return self._send(method, path, headers=headers, **kwargs)
+
     def _request(self, method: str, path: str, **kwargs):
-        token = self.ensure_access_token()
-        response = self.session.request(
-            method,
-            f"{self.base_url}/{path.lstrip('/')}",
-            headers={"Authorization": f"Bearer {token}", "User-Agent": self.user_agent},
-            timeout=kwargs.pop("timeout", 30),
-            **kwargs,
-        )
+        response = self._authorized(method, path, **kwargs)
+        if response.status_code == 401 and self._token_from_refresh:
+            # A cached token can be revoked before it expires; refresh once and retry
+            cache.delete(self._token_cache_key())
+            self.access_token = ""
+            response = self._authorized(method, path, **kwargs)
         if response.status_code >= 400:
             try:
                 payload = response.json()
@@ -381,6 +498,19 @@ class TastytradeService:
     def option_chain(self, symbol: str = "SPY"):
         return self._request("GET", f"/option-chains/{symbol.upper()}/nested")
 
+    def cached_option_chain(self, symbol: str = "SPY", refresh: bool = False) -> OptionChain:
+        """
+        The normalized chain for an underlying, shared through the cache for
+        TASTYTRADE_OPTION_CHAIN_TTL seconds so callers can filter it without
+        downloading the nested chain again.
+        """
+        cache_key = option_chain_cache_key(symbol)
+        chain = None if refresh else cache.get(cache_key)
+        if chain is None:
+            chain = OptionChain.from_payload(symbol, tastytrade_chain_expirations(self.option_chain(symbol)))
+            cache.set(cache_key, chain, self.option_chain_ttl)
+        return chain
+
     def quote_token(self):
         return self._request("GET", "/api-quote-tokens")
 
@@ -483,21 +613,27 @@ def summarize_tastytrade_orders(payload: Any) -> dict[str, Any]:
     }
 
 
-def summarize_tastytrade_option_chain(payload: Any, max_expirations: int = 6) -> dict[str, Any]:
+def option_chain_cache_key(symbol: str) -> str:
+    return f"investments:tastytrade:option_chain:{symbol.upper()}"
+
+
+def tastytrade_chain_expirations(payload: Any) -> list[dict[str, Any]]:
+    """Expiration entries of a nested chain, across every root it lists."""
     items = _unwrap_tastytrade_items(payload)
-    if len(items) == 1 and isinstance(items[0].get("expirations"), list):
-        items = [item for item in items[0]["expirations"] if isinstance(item, dict)]
-    return {
-        "raw_expiration_count": len(items),
-        "expirations": [
-            {
-                "expiration_date": item.get("expiration-date") or item.get("expiration_date"),
-                "days_to_expiration": item.get("days-to-expiration") or item.get("days_to_expiration"),
-                "strike_count": len(item.get("strikes") or []),
-            }
-            for item in items[:max_expirations]
-        ],
-    }
+    if not any(isinstance(item.get("expirations"), list) for item in items):
+        return items
+    return [
+        expiration
+        for item in items
+        for expiration in item.get("expirations") or []
+        if isinstance(expiration, dict)
+    ]
+
+
+def summarize_tastytrade_option_chain(payload: Any, max_expirations: int = 6) -> dict[str, Any]:
+    if not isinstance(payload, OptionChain):
+        payload = OptionChain.from_payload("", tastytrade_chain_expirations(payload))
+    return payload.summary(max_expirations)
 
 
 def summarize_tastytrade_quote_token(payload: Any) -> dict[str, Any]:
@@ -546,42 +682,6 @@ def _parse_kraken_ts(value):
         return _parse_ts(value)
 
 
-def _derive_kraken_buy_costs_from_ledger(ledger_entries: dict[str, Any]) -> tuple[dict[str, Decimal], dict[str, Decimal]]:
-    grouped: dict[str, dict[str, Any]] = {}
-    for entry in ledger_entries.values():
-        if not isinstance(entry, dict):
-            continue
-        ref_id = str(entry.get("refid") or "")
-        if not ref_id:
-            continue
-
-        asset = _kraken_asset_symbol(str(entry.get("asset") or ""))
-        amount = _to_decimal(entry.get("amount"))
-        fee = abs(_to_decimal(entry.get("fee")))
-        entry_type = str(entry.get("type") or "").lower()
-        group = grouped.setdefault(ref_id, {"crypto": {}, "usd_spend": Decimal("0")})
-
-        if asset in KRAKEN_CRYPTO_ASSETS and amount > 0 and entry_type in {"receive", "trade"}:
-            group["crypto"][asset] = group["crypto"].get(asset, Decimal("0")) + amount
-        elif asset == "USD" and amount < 0 and entry_type in {"spend", "trade"}:
-            group["usd_spend"] += abs(amount) + fee
-
-    buy_costs = {asset: Decimal("0") for asset in KRAKEN_CRYPTO_ASSETS}
-    buy_quantities = {asset: Decimal("0") for asset in KRAKEN_CRYPTO_ASSETS}
-    for group in grouped.values():
-        crypto = group["crypto"]
-        usd_spend = group["usd_spend"]
-        if usd_spend <= 0 or len(crypto) != 1:
-            continue
-        asset, quantity = next(iter(crypto.items()))
-        if quantity <= 0:
-            continue
-        buy_costs[asset] += usd_spend
-        buy_quantities[asset] += quantity
-
-    return buy_costs, buy_quantities
-
-
 def _pick_first(mapping: dict[str, Any], keys: list[str], default=None):
     for key in keys:
         if key in mapping and mapping[key] not in (None, ""):
@@ -674,7 +774,245 @@ def _order_symbol(raw_order: dict[str, Any]) -> str:
     return _stringify_scalar(_pick_first(raw_order, ["ticker", "symbol"]), "")
 
 
-def sync_connection_investments(connection: SnapTradeConnection) -> dict[str, Any]:
+HOLDING_SYNC_FIELDS = [
+    "quantity",
+    "average_purchase_price",
+    "current_price",
+    "market_value",
+    "cost_basis",
+    "weight_percent",
+    "raw",
+]
+ORDER_SYNC_FIELDS = [
+    "account",
+    "symbol",
+    "side",
+    "status",
+    "order_type",
+    "quantity",
+    "filled_quantity",
+    "limit_price",
+    "stop_price",
+    "average_filled_price",
+    "placed_at",
+    "executed_at",
+    "raw",
+]
+SECURITY_SYNC_FIELDS = ["name", "asset_type", "currency", "exchange", "is_cash_equivalent", "raw"]
+
+
+def _assign_changed(instance, values: dict[str, Any]) -> bool:
+    """Copy values onto a loaded row, returning True if any of them differ."""
+    changed = False
+    for field, value in values.items():
+        model_field = instance._meta.get_field(field)
+        if isinstance(model_field, models.DecimalField) and value is not None:
+            # Compare at stored precision so recomputed values don't look dirty
+            value = value.quantize(Decimal(1).scaleb(-model_field.decimal_places))
+        if getattr(instance, field) != value:
+            setattr(instance, field, value)
+            changed = True
+    return changed
+
+
+def _upsert_securities(securities: dict[str, dict[str, Any]]) -> dict[str, int]:
+    """
+    Insert or update securities keyed by symbol, skipping unchanged rows.
+    Returns symbol -> security id.
+    """
+    existing = {security.symbol: security for security in Security.objects.filter(symbol__in=list(securities))}
+    pending = []
+    for symbol, values in securities.items():
+        security = existing.get(symbol)
+        if security is None:
+            pending.append(Security(symbol=symbol, **values))
+        elif _assign_changed(security, values):
+            pending.append(security)
+    if pending:
+        Security.objects.bulk_create(
+            pending,
+            update_conflicts=True,
+            unique_fields=["symbol"],
+            update_fields=[*SECURITY_SYNC_FIELDS, "updated_at"],
+        )
+    ids = {symbol: security.id for symbol, security in existing.items()}
+    ids.update({security.symbol: security.id for security in pending})
+    return ids
+
+
+def _sync_account_holdings(
+    account: InvestmentAccount,
+    positions: list[dict[str, Any]],
+    total_equity: Decimal,
+    now: datetime,
+) -> tuple[Decimal, list[tuple[int, Decimal, Decimal]]]:
+    """
+    Diff the provider positions against the account's stored holdings and
+    apply the result with bulk writes. Weights are computed in memory once
+    the account total is known. Returns the total equity and the synced
+    (security_id, quantity, market_value) rows.
+    """
+    securities: dict[str, dict[str, Any]] = {}
+    desired: dict[str, dict[str, Any]] = {}
+    for position in positions:
+        symbol = _stringify_scalar(
+            _pick_first(position, ["symbol", "ticker", "security_ticker"]),
+            "CASH",
+        )[:50] or "CASH"
+        securities[symbol] = {
+            "name": _stringify_scalar(
+                _pick_first(position, ["description", "name", "security_name"]),
+                symbol,
+            ),
+            "asset_type": _stringify_scalar(
+                _pick_first(position, ["type", "asset_type", "security_type"]),
+                "equity",
+            ),
+            "currency": _stringify_scalar(
+                _pick_first(position, ["currency", "currencyCode"]),
+                account.currency,
+            )[:8] or account.currency,
+            "exchange": _stringify_scalar(_pick_first(position, ["exchange", "market"]), ""),
+            "raw": position,
+        }
+        securities[symbol]["is_cash_equivalent"] = Security(symbol=symbol, **securities[symbol]).detect_cash_equivalent()
+        quantity = _to_decimal(_pick_first(position, ["quantity", "units", "shares"]))
+        avg_price = _to_decimal(_pick_first(position, ["average_purchase_price", "averagePrice", "average_cost"]), "0")
+        current_price = _to_decimal(_pick_first(position, ["price", "last_price", "currentPrice"]), "0")
+        market_value = _to_decimal(_pick_first(position, ["market_value", "marketValue", "value"]), "0")
+        if market_value == 0 and quantity and current_price:
+            market_value = quantity * current_price
+        desired[symbol] = {
+            "quantity": quantity,
+            "average_purchase_price": avg_price,
+            "current_price": current_price,
+            "market_value": market_value,
+            "cost_basis": _to_decimal(_pick_first(position, ["cost_basis", "costBasis"]), str(quantity * avg_price)),
+            "raw": position,
+        }
+
+    holdings_market_value = sum((values["market_value"] for values in desired.values()), Decimal("0"))
+    if total_equity == 0 and holdings_market_value > 0:
+        total_equity = holdings_market_value
+    for values in desired.values():
+        values["weight_percent"] = (
+            Decimal("0") if total_equity == 0 else (values["market_value"] / total_equity) * Decimal("100")
+        )
+
+    security_ids = _upsert_securities(securities) if securities else {}
+    existing = {holding.security_id: holding for holding in HoldingSnapshot.objects.filter(account=account)}
+    to_create = []
+    to_update = []
+    unchanged_ids = []
+    for symbol, values in desired.items():
+        security_id = security_ids[symbol]
+        holding = existing.pop(security_id, None)
+        if holding is None:
+            to_create.append(HoldingSnapshot(account=account, security_id=security_id, as_of=now, **values))
+        elif _assign_changed(holding, values):
+            holding.as_of = now
+            holding.updated_at = now
+            to_update.append(holding)
+        else:
+            unchanged_ids.append(holding.pk)
+
+    if to_create:
+        HoldingSnapshot.objects.bulk_create(to_create)
+    if to_update:
+        HoldingSnapshot.objects.bulk_update(to_update, [*HOLDING_SYNC_FIELDS, "as_of", "updated_at"])
+    if unchanged_ids:
+        HoldingSnapshot.objects.filter(pk__in=unchanged_ids).update(as_of=now)
+    if existing:
+        HoldingSnapshot.objects.filter(pk__in=[holding.pk for holding in existing.values()]).delete()
+    return total_equity, [
+        (security_ids[symbol], values["quantity"], values["market_value"])
+        for symbol, values in desired.items()
+    ]
+
+
+def _sync_account_orders(account: InvestmentAccount, raw_orders: list[dict[str, Any]]) -> int:
+    """Diff executed provider orders against stored ones and bulk-apply the changes."""
+    desired: dict[str, dict[str, Any]] = {}
+    for raw_order in raw_orders:
+        status = _stringify_scalar(_pick_first(raw_order, ["status"]), "")[:64]
+        if status.upper() != "EXECUTED":
+            continue
+
+        order_id = _stringify_scalar(_pick_first(raw_order, ["brokerage_order_id", "id", "order_id", "orderId"]), "")
+        if not order_id:
+            continue
+        desired[order_id] = {
+            "account_id": account.pk,
+            "symbol": _order_symbol(raw_order)[:50],
+            "side": _stringify_scalar(_pick_first(raw_order, ["action", "side"]), "")[:32],
+            "status": status,
+            "order_type": _stringify_scalar(_pick_first(raw_order, ["order_type", "type"]), "")[:64],
+            "quantity": _to_decimal(_pick_first(raw_order, ["total_quantity", "quantity", "units"])),
+            "filled_quantity": _to_decimal(_pick_first(raw_order, ["filled_quantity", "filledQuantity"])),
+            "limit_price": _to_decimal(_pick_first(raw_order, ["limit_price", "limitPrice"])),
+            "stop_price": _to_decimal(_pick_first(raw_order, ["stop_price", "stopPrice"])),
+            "average_filled_price": _to_decimal(_pick_first(raw_order, ["execution_price", "average_filled_price", "averageFilledPrice"])),
+            "placed_at": _parse_ts(_pick_first(raw_order, ["time_placed", "placed_at", "createdAt"])),
+            "executed_at": _parse_ts(_pick_first(raw_order, ["time_executed", "executed_at", "executedAt"])),
+            "raw": raw_order,
+        }
+
+    # provider_order_id is globally unique, so an order may move between accounts
+    existing = {
+        order.provider_order_id: order
+        for order in OrderSnapshot.objects.filter(provider_order_id__in=list(desired))
+    }
+    to_create = []
+    to_update = []
+    now = timezone.now()
+    for order_id, values in desired.items():
+        order = existing.get(order_id)
+        if order is None:
+            to_create.append(OrderSnapshot(provider_order_id=order_id, **values))
+        elif _assign_changed(order, values):
+            order.updated_at = now
+            to_update.append(order)
+
+    if to_create:
+        OrderSnapshot.objects.bulk_create(to_create)
+    if to_update:
+        OrderSnapshot.objects.bulk_update(to_update, [*ORDER_SYNC_FIELDS, "updated_at"])
+    OrderSnapshot.objects.filter(account=account).exclude(provider_order_id__in=list(desired)).delete()
+    return len(desired)
+
+
+def _fetch_account_payloads(service, connection: SnapTradeConnection, account_ids: list[str]) -> dict[str, dict[str, Any]]:
+    """
+    Fetch balances, holdings and orders for every account concurrently.
+    Returns account id -> {"balances", "holdings", "orders"}; the first
+    provider error is re-raised.
+    """
+    calls = {
+        "balances": service.get_account_balances,
+        "holdings": service.get_account_holdings,
+        "orders": service.get_account_orders,
+    }
+    payloads: dict[str, dict[str, Any]] = {account_id: {} for account_id in account_ids}
+    if not account_ids:
+        return payloads
+    workers = max(1, min(SNAPTRADE_MAX_WORKERS, len(account_ids) * len(calls)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            (account_id, kind): pool.submit(call, connection, account_id)
+            for account_id in account_ids
+            for kind, call in calls.items()
+        }
+        for (account_id, kind), future in futures.items():
+            payloads[account_id][kind] = future.result()
+    return payloads
+
+
+def sync_connection_investments(connection: SnapTradeConnection, account_ids: list[str] | None = None) -> dict[str, Any]:
+    """
+    Sync accounts, holdings and orders for a connection. With `account_ids`
+    only those provider accounts are refreshed and other accounts are left
+    untouched.
+    """
     service = SnapTradeService()
     service.ensure_user(connection)
 
@@ -682,6 +1020,7 @@ def sync_connection_investments(connection: SnapTradeConnection) -> dict[str, An
     if not authorizations:
         connection.status = SnapTradeConnection.STATUS_PENDING
         connection.save(update_fields=["status", "updated_at"])
+        invalidate_portfolio_summary(connection.user_id)
         return {"accounts": 0, "holdings": 0, "orders": 0, "connected": False}
 
     authorization = authorizations[0]
@@ -705,13 +1044,24 @@ def sync_connection_investments(connection: SnapTradeConnection) -> dict[str, An
     total_value = Decimal("0")
 
     seen_account_ids = set()
-
+    raw_accounts: dict[str, dict[str, Any]] = {}
     for raw_account in accounts:
         provider_account_id = str(_pick_first(raw_account, ["id", "account_id", "accountId"]))
         if not provider_account_id or provider_account_id == "None":
             continue
+        if account_ids is not None and provider_account_id not in account_ids:
+            continue
+        raw_accounts[provider_account_id] = raw_account
+
+    # Network calls for all accounts run in parallel; DB writes stay on this thread
+    payloads = _fetch_account_payloads(service, connection, list(raw_accounts))
+    value_points = []
+    synced_account_ids = []
+
+    for provider_account_id, raw_account in raw_accounts.items():
         seen_account_ids.add(provider_account_id)
         account_count += 1
+        payload = payloads[provider_account_id]
 
         investment_account, _ = InvestmentAccount.objects.update_or_create(
             provider_account_id=provider_account_id,
@@ -739,7 +1089,7 @@ def sync_connection_investments(connection: SnapTradeConnection) -> dict[str, An
             },
         )
 
-        balances = service.get_account_balances(connection, provider_account_id)
+        balances = payload["balances"]
         total_equity = Decimal("0")
         cash_balance = Decimal("0")
         buying_power = Decimal("0")
@@ -757,7 +1107,7 @@ def sync_connection_investments(connection: SnapTradeConnection) -> dict[str, An
             cash_balance = _to_decimal(_pick_first(balances, ["cash", "cashBalance"]))
             buying_power = _to_decimal(_pick_first(balances, ["buyingPower", "buying_power"]))
 
-        holdings = service.get_account_holdings(connection, provider_account_id)
+        total_equity, holding_rows = _sync_account_holdings(investment_account, payload["holdings"], total_equity, now)
         InvestmentAccount.objects.filter(pk=investment_account.pk).update(
             total_value=total_equity,
             cash_balance=cash_balance,
@@ -765,102 +1115,15 @@ def sync_connection_investments(connection: SnapTradeConnection) -> dict[str, An
             last_synced_at=now,
         )
         total_value += total_equity
+        holdings_count += len(holding_rows)
+        value_points.extend(holding_value_points(investment_account, holding_rows, total_equity, now))
+        synced_account_ids.append(investment_account.pk)
 
-        current_holdings = set()
-        holdings_market_value = Decimal("0")
-        for position in holdings:
-            symbol = _stringify_scalar(
-                _pick_first(position, ["symbol", "ticker", "security_ticker"]),
-                "CASH",
-            )[:50] or "CASH"
-            security, _ = Security.objects.update_or_create(
-                symbol=symbol,
-                defaults={
-                    "name": _stringify_scalar(
-                        _pick_first(position, ["description", "name", "security_name"]),
-                        symbol,
-                    ),
-                    "asset_type": _stringify_scalar(
-                        _pick_first(position, ["type", "asset_type", "security_type"]),
-                        "equity",
-                    ),
-                    "currency": _stringify_scalar(
-                        _pick_first(position, ["currency", "currencyCode"]),
-                        investment_account.currency,
-                    )[:8] or investment_account.currency,
-                    "exchange": _stringify_scalar(_pick_first(position, ["exchange", "market"]), ""),
-                    "raw": position,
-                },
-            )
-            current_holdings.add(security.id)
-            quantity = _to_decimal(_pick_first(position, ["quantity", "units", "shares"]))
-            avg_price = _to_decimal(_pick_first(position, ["average_purchase_price", "averagePrice", "average_cost"]), "0")
-            current_price = _to_decimal(_pick_first(position, ["price", "last_price", "currentPrice"]), "0")
-            market_value = _to_decimal(_pick_first(position, ["market_value", "marketValue", "value"]), "0")
-            if market_value == 0 and quantity and current_price:
-                market_value = quantity * current_price
-            holdings_market_value += market_value
-            cost_basis = _to_decimal(_pick_first(position, ["cost_basis", "costBasis"]), str(quantity * avg_price))
-            weight = Decimal("0") if total_equity == 0 else (market_value / total_equity) * Decimal("100")
-            HoldingSnapshot.objects.update_or_create(
-                account=investment_account,
-                security=security,
-                defaults={
-                    "quantity": quantity,
-                    "average_purchase_price": avg_price,
-                    "current_price": current_price,
-                    "market_value": market_value,
-                    "cost_basis": cost_basis,
-                    "weight_percent": weight,
-                    "as_of": now,
-                    "raw": position,
-                },
-            )
-            holdings_count += 1
-
-        if total_equity == 0 and holdings_market_value > 0:
-            total_equity = holdings_market_value
-            total_value += holdings_market_value
-            InvestmentAccount.objects.filter(pk=investment_account.pk).update(total_value=total_equity)
-            for holding in HoldingSnapshot.objects.filter(account=investment_account, security_id__in=current_holdings):
-                holding.weight_percent = (holding.market_value / total_equity) * Decimal("100")
-                holding.save(update_fields=["weight_percent", "updated_at"])
-
-        HoldingSnapshot.objects.filter(account=investment_account).exclude(security_id__in=current_holdings).delete()
-
-        orders = service.get_account_orders(connection, provider_account_id)
-        current_orders = set()
-        for raw_order in orders:
-            status = _stringify_scalar(_pick_first(raw_order, ["status"]), "")[:64]
-            if status.upper() != "EXECUTED":
-                continue
-
-            order_id = _stringify_scalar(_pick_first(raw_order, ["brokerage_order_id", "id", "order_id", "orderId"]), "")
-            if not order_id:
-                continue
-            current_orders.add(order_id)
-            OrderSnapshot.objects.update_or_create(
-                provider_order_id=order_id,
-                defaults={
-                    "account": investment_account,
-                    "symbol": _order_symbol(raw_order)[:50],
-                    "side": _stringify_scalar(_pick_first(raw_order, ["action", "side"]), "")[:32],
-                    "status": status,
-                    "order_type": _stringify_scalar(_pick_first(raw_order, ["order_type", "type"]), "")[:64],
-                    "quantity": _to_decimal(_pick_first(raw_order, ["total_quantity", "quantity", "units"])),
-                    "filled_quantity": _to_decimal(_pick_first(raw_order, ["filled_quantity", "filledQuantity"])),
-                    "limit_price": _to_decimal(_pick_first(raw_order, ["limit_price", "limitPrice"])),
-                    "stop_price": _to_decimal(_pick_first(raw_order, ["stop_price", "stopPrice"])),
-                    "average_filled_price": _to_decimal(_pick_first(raw_order, ["execution_price", "average_filled_price", "averageFilledPrice"])),
-                    "placed_at": _parse_ts(_pick_first(raw_order, ["time_placed", "placed_at", "createdAt"])),
-                    "executed_at": _parse_ts(_pick_first(raw_order, ["time_executed", "executed_at", "executedAt"])),
-                    "raw": raw_order,
-                },
-            )
-            orders_count += 1
-        OrderSnapshot.objects.filter(account=investment_account).exclude(provider_order_id__in=current_orders).delete()
+        orders_count += _sync_account_orders(investment_account, payload["orders"])
 
-    InvestmentAccount.objects.filter(connection=connection).exclude(provider_account_id__in=seen_account_ids).update(is_active=False)
+    if account_ids is None:
+        InvestmentAccount.objects.filter(connection=connection).exclude(provider_account_id__in=seen_account_ids).update(is_active=False)
+    record_value_points(value_points, synced_account_ids)
 
     connection.last_synced_at = now
     connection.last_holdings_sync_at = now
@@ -875,6 +1138,7 @@ def sync_connection_investments(connection: SnapTradeConnection) -> dict[str, An
         "last_orders_sync_at",
         "updated_at",
     ])
+    invalidate_portfolio_summary(connection.user_id)
 
     return {
         "accounts": account_count,
@@ -885,13 +1149,241 @@ def sync_connection_investments(connection: SnapTradeConnection) -> dict[str, An
     }
 
 
+def _kraken_account_id(user: User) -> str:
+    return f"kraken-spot-{user.id}"
+
+
+def _kraken_trade_asset(trade: dict[str, Any]) -> str:
+    pair = str(trade.get("pair") or "").upper()
+    return next((candidate for candidate in KRAKEN_CRYPTO_ASSETS if candidate in pair or (candidate == "BTC" and "XBT" in pair)), "")
+
+
+def _kraken_watermark(value: datetime | None) -> int | None:
+    # Kraken's start bound is exclusive; step back a second so entries sharing
+    # the watermark second are re-read and dropped by the unique constraints.
+    return int(value.timestamp()) - 1 if value else None
+
+
+def _kraken_entries(payload: Any, key: str) -> dict[str, Any]:
+    entries = payload.get(key) if isinstance(payload, dict) else {}
+    return entries if isinstance(entries, dict) else {}
+
+
+def _kraken_oldest(entries: dict[str, Any]) -> float | None:
+    times = [_to_decimal(entry.get("time")) for entry in entries.values() if isinstance(entry, dict)]
+    times = [value for value in times if value > 0]
+    return float(min(times)) if times else None
+
+
+def _fetch_kraken_history(fetch, key: str, latest: datetime | None, earliest: datetime | None, state: dict[str, Any]):
+    """
+    Fetch entries newer than the stored watermark and, until the account's
+    full history has been read once, walk backwards from the oldest entry
+    seen so far. Installs that only stored the newest page, or a walk cut
+    short by KRAKEN_MAX_PAGES, resume that backfill on each sync until done.
+
+    Returns (entries, new paging state).
+    """
+    payload = fetch(start=_kraken_watermark(latest))
+    entries = _kraken_entries(payload, key)
+    if not payload.get("complete", True):
+        # A gap may now sit below the oldest entry fetched; backfill from there
+        return entries, {"complete": False, "before": _kraken_oldest(entries)}
+    if latest is None:
+        return entries, {"complete": True}
+    if state.get("complete"):
+        return entries, state
+
+    before = state.get("before") or (earliest.timestamp() if earliest else None)
+    if before is None:
+        return entries, {"complete": True}
+    # end is exclusive; entries sharing that second are dropped as duplicates
+    backfill = fetch(end=int(before) + 1)
+    older = _kraken_entries(backfill, key)
+    entries = {**older, **entries}
+    if backfill.get("complete", True):
+        return entries, {"complete": True}
+    return entries, {"complete": False, "before": _kraken_oldest(older) or before}
+
+
+KRAKEN_TRADE_ENTRY_TYPES = ("trade", "spend", "receive")
+
+
+def _crypto_usd_closes(provider: str = "yfinance") -> Callable[[str, datetime], Decimal | None]:
+    """USD close of a Kraken asset on or before a given time, from stored daily bars."""
+    closes: dict[str, tuple[list[date], list[Decimal]]] = {}
+
+    def usd_price(asset: str, when: datetime) -> Decimal | None:
+        if asset not in closes:
+            bars = list(
+                MarketDailyBar.objects.filter(
+                    symbol=KRAKEN_CRYPTO_ASSETS[asset]["symbol"], provider=provider, close__isnull=False
+                ).order_by("date").values_list("date", "close")
+            )
+            closes[asset] = ([day for day, _ in bars], [close for _, close in bars])
+        bar_dates, bar_closes = closes[asset]
+        index = bisect_right(bar_dates, when.astimezone(UTC).date())
+        return bar_closes[index - 1] if index else None
+
+    return usd_price
+
+
+def _kraken_ledger_events(
+    rows: Iterable[dict[str, Any]],
+    usd_price: Callable[[str, datetime], Decimal | None] | None = None,
+    unpriced: list[str] | None = None,
+) -> list[LotEvent]:
+    """
+    Turn ledger rows into lot events by grouping legs on refid. A crypto leg
+    paired with a USD leg is a buy or sell; a lone crypto credit (deposit,
+    reward) is a zero-cost acquisition and a lone debit is a transfer out.
+
+    A crypto-for-crypto trade disposes of one asset and acquires the other,
+    both valued at `usd_price` of the received asset (or the spent one).
+    Groups that can't be valued are left out and their refids added to
+    `unpriced`.
+    """
+    groups: dict[str, dict[str, Any]] = {}
+    for row in rows:
+        key = row["ref_id"] or row["ledger_id"]
+        group = groups.setdefault(key, {"timestamp": row["timestamp"], "crypto": {}, "usd": None})
+        group["timestamp"] = min(group["timestamp"], row["timestamp"])
+        net = row["amount"] - abs(row["fee"])
+        if row["asset"] in KRAKEN_CRYPTO_ASSETS:
+            group["crypto"][row["asset"]] = group["crypto"].get(row["asset"], Decimal("0")) + net
+        elif row["asset"] == "USD":
+            group["usd"] = (group["usd"] or Decimal("0")) + net
+
+    events = []
+    for key, group in groups.items():
+        legs = [(asset, quantity) for asset, quantity in group["crypto"].items() if quantity != 0]
+        if len(legs) == 2 and group["usd"] is None:
+            (spent, spent_quantity), (received, received_quantity) = sorted(legs, key=lambda leg: leg[1])
+            value = None
+            if usd_price and spent_quantity < 0 < received_quantity:
+                for asset, quantity in ((received, received_quantity), (spent, -spent_quantity)):
+                    price = usd_price(asset, group["timestamp"])
+                    if price:
+                        value = quantity * price
+                        break
+            if value is not None:
+                events.append(LotEvent(key, group["timestamp"], spent, spent_quantity, value))
+                events.append(LotEvent(key, group["timestamp"], received, received_quantity, value))
+                continue
+        if len(legs) != 1:
+            if legs and unpriced is not None:
+                unpriced.append(key)
+            continue
+        asset, quantity = legs[0]
+        usd = group["usd"]
+        if usd is None:
+            events.append(LotEvent(key, group["timestamp"], asset, quantity, realize=quantity > 0))
+        elif (quantity > 0) == (usd < 0):
+            events.append(LotEvent(key, group["timestamp"], asset, quantity, abs(usd)))
+    return sorted(events, key=lambda event: (event.timestamp, event.key))
+
+
+def _kraken_order_events(rows: Iterable[tuple[str, datetime, dict[str, Any]]]) -> list[LotEvent]:
+    events = []
+    for key, executed_at, trade in rows:
+        if not isinstance(trade, dict):
+            continue
+        asset = _kraken_trade_asset(trade)
+        side = str(trade.get("type") or "").lower()
+        if not asset or side not in {"buy", "sell"}:
+            continue
+        volume = _to_decimal(trade.get("vol"))
+        cost = _to_decimal(trade.get("cost"))
+        fee = _to_decimal(trade.get("fee"))
+        if side == "buy":
+            events.append(LotEvent(key, executed_at, asset, volume, cost + fee))
+        else:
+            events.append(LotEvent(key, executed_at, asset, -volume, cost - fee))
+    return sorted(events, key=lambda event: (event.timestamp, event.key))
+
+
+def replay_kraken_cost_basis(user: User, account: InvestmentAccount, method: str | None = None) -> LotBook:
+    """
+    Replay Kraken history into lots, resuming from the stored checkpoint.
+
+    The ledger is the event source once it holds USD-paired trades; before
+    that the stored trade orders are used. Changing source, or history
+    appearing before the checkpoint, triggers a full replay.
+    """
+    method = method or getattr(settings, "KRAKEN_COST_BASIS_METHOD", METHOD_FIFO)
+    checkpoint, _ = CostBasisCheckpoint.objects.get_or_create(account=account, method=method)
+
+    ledger = KrakenLedgerEntry.objects.filter(user=user, timestamp__isnull=False)
+    if ledger.filter(asset="USD", entry_type__in=KRAKEN_TRADE_ENTRY_TYPES).exists():
+        source, history, time_field = "ledger", ledger, "timestamp"
+    else:
+        source = "orders"
+        history = OrderSnapshot.objects.filter(account=account, executed_at__isnull=False)
+        time_field = "executed_at"
+
+    last_at, last_key = checkpoint.last_event_at, checkpoint.last_event_key
+    resume = (
+        checkpoint.source == source
+        and last_at is not None
+        and history.filter(**{f"{time_field}__lte": last_at}).count() == checkpoint.rows_through
+    )
+    if resume:
+        book = LotBook.from_state(checkpoint.state, method)
+        unpriced = list(checkpoint.state.get("unpriced_trades") or [])
+        pending = history.filter(**{f"{time_field}__gte": last_at})
+    else:
+        book = LotBook(method)
+        unpriced = []
+        last_at, last_key = None, ""
+        pending = history
+
+    if source == "ledger":
+        events = _kraken_ledger_events(
+            pending.values("ledger_id", "ref_id", "asset", "amount", "fee", "timestamp"),
+            usd_price=_crypto_usd_closes(),
+            unpriced=unpriced,
+        )
+    else:
+        events = _kraken_order_events(pending.values_list("provider_order_id", "executed_at", "raw"))
+    if last_at is not None:
+        events = [event for event in events if (event.timestamp, event.key) > (last_at, last_key)]
+    book.apply_all(events)
+
+    if events:
+        last_at, last_key = events[-1].timestamp, events[-1].key
+    checkpoint.source = source
+    checkpoint.last_event_at = last_at
+    checkpoint.last_event_key = last_key
+    checkpoint.rows_through = history.filter(**{f"{time_field}__lte": last_at}).count() if last_at else 0
+    checkpoint.state = {**book.to_state(), "unpriced_trades": sorted(set(unpriced))}
+    checkpoint.save()
+    return book
+
+
 def sync_kraken_investments(user: User) -> dict[str, Any]:
     service = KrakenService()
     now = timezone.now()
 
+    ledger_bounds = KrakenLedgerEntry.objects.filter(user=user).aggregate(
+        latest=Max("timestamp"), earliest=Min("timestamp")
+    )
+    trades_bounds = OrderSnapshot.objects.filter(
+        account__provider_account_id=_kraken_account_id(user),
+    ).aggregate(latest=Max("executed_at"), earliest=Min("executed_at"))
+    history_sync = (
+        InvestmentAccount.objects.filter(provider_account_id=_kraken_account_id(user))
+        .values_list("history_sync", flat=True)
+        .first()
+        or {}
+    )
+
     balances = service.balances()
-    trades_payload = service.trades()
-    ledger_payload = service.ledger()
+    new_trades, trades_state = _fetch_kraken_history(
+        service.trades, "trades", trades_bounds["latest"], trades_bounds["earliest"], history_sync.get("trades") or {}
+    )
+    new_ledger_entries, ledger_state = _fetch_kraken_history(
+        service.ledger, "ledger", ledger_bounds["latest"], ledger_bounds["earliest"], history_sync.get("ledger") or {}
+    )
     prices = service.usd_prices()
 
     crypto_quantities = {asset: Decimal("0") for asset in KRAKEN_CRYPTO_ASSETS}
@@ -906,38 +1398,6 @@ def sync_kraken_investments(user: User) -> dict[str, Any]:
         elif symbol == "USD":
             usd_cash += amount
 
-    trades = trades_payload.get("trades") if isinstance(trades_payload, dict) else {}
-    if not isinstance(trades, dict):
-        trades = {}
-
-    ledger_entries = ledger_payload.get("ledger") if isinstance(ledger_payload, dict) else {}
-    if not isinstance(ledger_entries, dict):
-        ledger_entries = {}
-
-    buy_costs = {asset: Decimal("0") for asset in KRAKEN_CRYPTO_ASSETS}
-    buy_quantities = {asset: Decimal("0") for asset in KRAKEN_CRYPTO_ASSETS}
-    for trade in trades.values():
-        if not isinstance(trade, dict):
-            continue
-        pair = str(trade.get("pair") or "").upper()
-        trade_type = str(trade.get("type") or "").lower()
-        asset = next((candidate for candidate in KRAKEN_CRYPTO_ASSETS if candidate in pair or (candidate == "BTC" and "XBT" in pair)), "")
-        if not asset:
-            continue
-        if trade_type != "buy":
-            continue
-        volume = _to_decimal(trade.get("vol"))
-        cost = _to_decimal(trade.get("cost"))
-        fee = _to_decimal(trade.get("fee"))
-        buy_quantities[asset] += volume
-        buy_costs[asset] += cost + fee
-
-    ledger_buy_costs, ledger_buy_quantities = _derive_kraken_buy_costs_from_ledger(ledger_entries)
-    for asset in KRAKEN_CRYPTO_ASSETS:
-        if buy_quantities[asset] <= 0 and ledger_buy_quantities[asset] > 0:
-            buy_quantities[asset] = ledger_buy_quantities[asset]
-            buy_costs[asset] = ledger_buy_costs[asset]
-
     market_values = {
         asset: crypto_quantities[asset] * prices.get(asset, Decimal("0"))
         for asset in KRAKEN_CRYPTO_ASSETS
@@ -972,7 +1432,7 @@ def sync_kraken_investments(user: User) -> dict[str, Any]:
     ])
 
     account, _ = InvestmentAccount.objects.update_or_create(
-        provider_account_id=f"kraken-spot-{user.id}",
+        provider_account_id=_kraken_account_id(user),
         defaults={
             "connection": connection,
             "account_name": "Kraken Spot",
@@ -986,15 +1446,82 @@ def sync_kraken_investments(user: User) -> dict[str, Any]:
             "is_active": True,
             "last_synced_at": now,
             "raw": {"balances": normalized_balances},
+            "history_sync": {"trades": trades_state, "ledger": ledger_state},
         },
     )
 
+    # Only entries past the watermarks were fetched; history already stored is kept.
+    # Rows are fills keyed by trade id (an order can fill several times); the
+    # order id stays in raw["ordertxid"].
+    new_orders = []
+    for trade_id, trade in new_trades.items():
+        if not isinstance(trade, dict):
+            continue
+        asset = _kraken_trade_asset(trade)
+        if not asset:
+            continue
+        new_orders.append(OrderSnapshot(
+            account=account,
+            provider_order_id=str(trade_id),
+            symbol=KRAKEN_CRYPTO_ASSETS[asset]["symbol"],
+            side=str(trade.get("type") or "").upper(),
+            status="EXECUTED",
+            order_type=str(trade.get("ordertype") or "")[:64],
+            quantity=_to_decimal(trade.get("vol")),
+            filled_quantity=_to_decimal(trade.get("vol")),
+            limit_price=_to_decimal(trade.get("price")),
+            stop_price=Decimal("0"),
+            average_filled_price=_to_decimal(trade.get("price")),
+            placed_at=_parse_kraken_ts(trade.get("time")),
+            executed_at=_parse_kraken_ts(trade.get("time")),
+            raw=trade,
+        ))
+    if new_orders:
+        OrderSnapshot.objects.bulk_create(new_orders, ignore_conflicts=True)
+
+    new_ledger_rows = [
+        KrakenLedgerEntry(
+            user=user,
+            ledger_id=str(ledger_id),
+            ref_id=str(entry.get("refid") or ""),
+            entry_type=str(entry.get("type") or "")[:64],
+            subtype=str(entry.get("subtype") or "")[:64],
+            asset=_kraken_asset_symbol(str(entry.get("asset") or ""))[:32],
+            amount=_to_decimal(entry.get("amount")),
+            fee=_to_decimal(entry.get("fee")),
+            balance=_to_decimal(entry.get("balance")),
+            timestamp=_parse_kraken_ts(entry.get("time")),
+            raw=entry,
+        )
+        for ledger_id, entry in new_ledger_entries.items()
+        if isinstance(entry, dict)
+    ]
+    if new_ledger_rows:
+        KrakenLedgerEntry.objects.bulk_create(new_ledger_rows, ignore_conflicts=True)
+
+    # Lots are replayed from stored history, resuming at the last checkpoint
+    book = replay_kraken_cost_basis(user, account)
+    # Trades left out of the lots are listed beside the paging state, so an
+    # incomplete cost basis shows up the same way truncated history does
+    unpriced = (
+        CostBasisCheckpoint.objects.filter(account=account, method=book.method)
+        .values_list("state", flat=True)
+        .first()
+        or {}
+    ).get("unpriced_trades") or []
+    if unpriced:
+        print(f"[Kraken] {len(unpriced)} crypto-for-crypto trades have no USD price; cost basis leaves them out")
+        InvestmentAccount.objects.filter(pk=account.pk).update(
+            history_sync={**account.history_sync, "unpriced_trades": unpriced}
+        )
+
     active_security_ids = set()
+    holding_rows = []
     for asset, config in KRAKEN_CRYPTO_ASSETS.items():
         quantity = crypto_quantities[asset]
-        buy_quantity = buy_quantities[asset]
-        buy_cost = buy_costs[asset]
-        avg_cost = (buy_cost / buy_quantity) if buy_quantity > 0 else Decimal("0")
+        price = prices.get(asset, Decimal("0"))
+        lot_quantity, lot_cost = book.position(asset)
+        avg_cost = (lot_cost / lot_quantity) if lot_quantity > 0 else Decimal("0")
         market_value = market_values[asset]
         security, _ = Security.objects.update_or_create(
             symbol=config["symbol"],
@@ -1007,86 +1534,46 @@ def sync_kraken_investments(user: User) -> dict[str, Any]:
             },
         )
         active_security_ids.add(security.id)
+        holding_rows.append((security.id, quantity, market_value))
         HoldingSnapshot.objects.update_or_create(
             account=account,
             security=security,
             defaults={
                 "quantity": quantity,
                 "average_purchase_price": avg_cost,
-                "current_price": prices.get(asset, Decimal("0")),
+                "current_price": price,
                 "market_value": market_value,
-                "cost_basis": min(buy_cost, quantity * avg_cost) if quantity > 0 else Decimal("0"),
+                "cost_basis": min(lot_cost, quantity * avg_cost) if quantity > 0 else Decimal("0"),
                 "weight_percent": (market_value / total_value * Decimal("100")) if total_value > 0 else Decimal("0"),
                 "as_of": now,
                 "raw": {
                     "balances": normalized_balances,
-                    "buy_quantity": str(buy_quantity),
-                    "buy_cost": str(buy_cost),
+                    "cost_basis_method": book.method,
+                    "lot_quantity": str(lot_quantity),
+                    "lot_cost": str(lot_cost),
+                    "realized_pnl": str(book.realized.get(asset, Decimal("0"))),
+                    "lots": book.lot_report(asset, price),
                 },
             },
         )
     HoldingSnapshot.objects.filter(account=account).exclude(security_id__in=active_security_ids).delete()
-
-    current_order_ids = set()
-    for trade_id, trade in trades.items():
-        if not isinstance(trade, dict):
-            continue
-        pair = str(trade.get("pair") or "").upper()
-        asset = next((candidate for candidate in KRAKEN_CRYPTO_ASSETS if candidate in pair or (candidate == "BTC" and "XBT" in pair)), "")
-        if not asset:
-            continue
-        provider_order_id = str(trade.get("ordertxid") or trade_id)
-        current_order_ids.add(provider_order_id)
-        OrderSnapshot.objects.update_or_create(
-            provider_order_id=provider_order_id,
-            defaults={
-                "account": account,
-                "symbol": KRAKEN_CRYPTO_ASSETS[asset]["symbol"],
-                "side": str(trade.get("type") or "").upper(),
-                "status": "EXECUTED",
-                "order_type": str(trade.get("ordertype") or "")[:64],
-                "quantity": _to_decimal(trade.get("vol")),
-                "filled_quantity": _to_decimal(trade.get("vol")),
-                "limit_price": _to_decimal(trade.get("price")),
-                "stop_price": Decimal("0"),
-                "average_filled_price": _to_decimal(trade.get("price")),
-                "placed_at": _parse_kraken_ts(trade.get("time")),
-                "executed_at": _parse_kraken_ts(trade.get("time")),
-                "raw": trade,
-            },
-        )
-    OrderSnapshot.objects.filter(account=account).exclude(provider_order_id__in=current_order_ids).delete()
-
-    for ledger_id, entry in ledger_entries.items():
-        if not isinstance(entry, dict):
-            continue
-        KrakenLedgerEntry.objects.update_or_create(
-            ledger_id=str(ledger_id),
-            defaults={
-                "user": user,
-                "ref_id": str(entry.get("refid") or ""),
-                "entry_type": str(entry.get("type") or "")[:64],
-                "subtype": str(entry.get("subtype") or "")[:64],
-                "asset": _kraken_asset_symbol(str(entry.get("asset") or ""))[:32],
-                "amount": _to_decimal(entry.get("amount")),
-                "fee": _to_decimal(entry.get("fee")),
-                "balance": _to_decimal(entry.get("balance")),
-                "timestamp": _parse_kraken_ts(entry.get("time")),
-                "raw": entry,
-            },
-        )
+    record_value_points(holding_value_points(account, holding_rows, total_value, now), [account.pk])
 
     holdings_count = sum(1 for quantity in crypto_quantities.values() if quantity > 0)
+    invalidate_portfolio_summary(user.id)
 
     return {
         "accounts": 1,
         "holdings": holdings_count,
-        "orders": len(current_order_ids),
-        "ledger_entries": len(ledger_entries),
+        "orders": OrderSnapshot.objects.filter(account=account).count(),
+        "new_orders": len(new_orders),
+        "ledger_entries": len(new_ledger_rows),
         "quantities": {asset: str(quantity) for asset, quantity in crypto_quantities.items()},
         "prices": {asset: str(price) for asset, price in prices.items()},
         "btc_quantity": str(crypto_quantities.get("BTC", Decimal("0"))),
         "btc_price": str(prices.get("BTC", Decimal("0"))),
         "portfolio_value": str(total_value),
+        "history_complete": bool(trades_state.get("complete") and ledger_state.get("complete")),
+        "unpriced_trades": len(unpriced),
         "connected": True,
     }
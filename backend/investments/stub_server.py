@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+@dataclass
+class StubResponse:
+    status: int = 200
+    body: Any = field(default_factory=dict)
+    delay: float = 0.0
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+class StubBrokerServer:
+    """
+    Local HTTP server for exercising the integration client offline. Each path
+    has a queue of scripted responses; once a queue runs out, the path's
+    default is returned (or a 404 if it has none). Received requests are
+    recorded per path.
+
+        with StubBrokerServer() as server:
+            server.script("/accounts", StubResponse(503), StubResponse(200, []))
+            client.request("GET", server.url("/accounts"))
+    """
+
+    def __init__(self, host: str = "127.0.0.1"):
+        self._scripts: dict[str, deque[StubResponse]] = defaultdict(deque)
+        self._defaults: dict[str, StubResponse] = {}
+        self._lock = threading.Lock()
+        self.requests: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        self._server = ThreadingHTTPServer((host, 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-broker", daemon=True)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                path = self.path.split("?", 1)[0]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                response = stub._next(path, self.command, dict(self.headers), body)
+                if response.delay:
+                    time.sleep(response.delay)
+                payload = json.dumps(response.body).encode("utf-8")
+                self.send_response(response.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in response.headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _next(self, path: str, method: str, headers: dict[str, str], body: bytes) -> StubResponse:
+        with self._lock:
+            self.requests[path].append({"method": method, "headers": headers, "body": body})
+            if self._scripts[path]:
+                return self._scripts[path].popleft()
+            return self._defaults.get(path) or StubResponse(404, {"error": "not scripted"})
+
+    def script(self, path: str, *responses: StubResponse) -> None:
+        with self._lock:
+            self._scripts[path].extend(responses)
+
+    def set_default(self, path: str, response: StubResponse) -> None:
+        with self._lock:
+            self._defaults[path] = response
+
+    def url(self, path: str = "") -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self) -> StubBrokerServer:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> StubBrokerServer:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
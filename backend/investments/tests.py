@@ -1,18 +1,40 @@
+import hashlib
+import hmac
+import json
+import queue
+import threading
+import time
+from io import StringIO
+from datetime import UTC, datetime, timedelta
 from decimal import Decimal
 from unittest.mock import patch
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection as connection_db
 from django.test import override_settings
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from rest_framework.test import APIClient
 
-from .models import HoldingSnapshot, InvestmentAccount, KrakenLedgerEntry, OrderSnapshot, Security, SnapTradeConnection
+from market_data.models import MarketDailyBar
+
+from . import webhooks
+from .cost_basis import METHOD_AVERAGE, METHOD_FIFO, METHOD_LIFO, LotBook, LotEvent
+from .history import compact_value_points, holding_value_points, portfolio_value_series, record_value_points
+from .http_client import CircuitOpenError, IntegrationClient, IntegrationError, MonotonicNonce, get_client, reset_clients
+from .models import CostBasisCheckpoint, HoldingSnapshot, PortfolioValuePoint, InvestmentAccount, KrakenLedgerEntry, OrderSnapshot, Security, SnapTradeConnection, SnapTradeWebhookEvent
 from .serializers import HoldingSnapshotSerializer, InvestmentAccountSerializer, OrderSnapshotSerializer, SnapTradeConnectionSerializer
 from .services import (
+    PORTFOLIO_SUMMARY_CACHE_TIMEOUT,
+    SNAPTRADE_MAX_WORKERS,
+    KrakenService,
     SnapTradeError,
     SnapTradeService,
     TastytradeService,
-    _derive_kraken_buy_costs_from_ledger,
+    _kraken_ledger_events,
     _mask_account_number,
     _stringify_display_name,
     _stringify_scalar,
@@ -21,9 +43,16 @@ from .services import (
     summarize_tastytrade_option_chain,
     summarize_tastytrade_quote_token,
     sync_connection_investments,
+    invalidate_portfolio_summary,
+    replay_kraken_cost_basis,
     sync_kraken_investments,
 )
-from .views import _cash_equivalent_value, _is_cash_equivalent_holding, _portfolio_totals
+from .stub_server import StubBrokerServer, StubResponse
+from .views import _cash_equivalent_value, _is_cash_equivalent_holding, _portfolio_totals, _summary_cache_timeout
+
+
+# Query-count assertions below should not count lookups in the shared DB cache
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
 
 
 class InvestmentNormalizationTests(TestCase):
@@ -47,44 +76,21 @@ class InvestmentNormalizationTests(TestCase):
         self.assertEqual(_mask_account_number("AB-1234-5678"), "5678")
         self.assertEqual(_mask_account_number({"id": "00009999"}), "9999")
 
-    def test_kraken_ledger_buy_costs_pair_receive_with_usd_spend(self):
-        ledger_entries = {
-            "receive-1": {
-                "refid": "trade-1",
-                "type": "receive",
-                "asset": "XXBT",
-                "amount": "0.00241308",
-                "fee": "0",
-            },
-            "spend-1": {
-                "refid": "trade-1",
-                "type": "spend",
-                "asset": "ZUSD",
-                "amount": "-147.78",
-                "fee": "2.22",
-            },
-            "receive-2": {
-                "refid": "trade-2",
-                "type": "receive",
-                "asset": "XXBT",
-                "amount": "0.00158436",
-                "fee": "0",
-            },
-            "spend-2": {
-                "refid": "trade-2",
-                "type": "spend",
-                "asset": "ZUSD",
-                "amount": "-102.97",
-                "fee": "1.03",
-            },
-        }
+    def test_kraken_ledger_events_pair_receive_with_usd_spend(self):
+        timestamp = timezone.now()
+        rows = [
+            {"ledger_id": "receive-1", "ref_id": "trade-1", "asset": "BTC", "amount": Decimal("0.00241308"), "fee": Decimal("0"), "timestamp": timestamp},
+            {"ledger_id": "spend-1", "ref_id": "trade-1", "asset": "USD", "amount": Decimal("-147.78"), "fee": Decimal("2.22"), "timestamp": timestamp},
+            {"ledger_id": "receive-2", "ref_id": "trade-2", "asset": "BTC", "amount": Decimal("0.00158436"), "fee": Decimal("0"), "timestamp": timestamp},
+            {"ledger_id": "spend-2", "ref_id": "trade-2", "asset": "USD", "amount": Decimal("-102.97"), "fee": Decimal("1.03"), "timestamp": timestamp},
+        ]
 
-        costs, quantities = _derive_kraken_buy_costs_from_ledger(ledger_entries)
+        book = LotBook(METHOD_FIFO)
+        book.apply_all(_kraken_ledger_events(rows))
 
-        self.assertEqual(costs["BTC"], Decimal("254.00"))
-        self.assertEqual(quantities["BTC"], Decimal("0.00399744"))
-        self.assertEqual(costs["ETH"], Decimal("0"))
-        self.assertEqual(quantities["SOL"], Decimal("0"))
+        self.assertEqual(book.position("BTC"), (Decimal("0.00399744"), Decimal("254.00")))
+        self.assertEqual(book.position("ETH"), (Decimal("0"), Decimal("0")))
+        self.assertEqual(book.position("SOL"), (Decimal("0"), Decimal("0")))
 
     @override_settings(
         TASTYTRADE_BASE_URL="https://api.tastyworks.com",
@@ -161,6 +167,74 @@ class InvestmentNormalizationTests(TestCase):
         self.assertEqual(dry_run["buying_power_effect"]["impact"], "101.12")
         self.assertEqual(dry_run["order_status"], "Received")
 
+    @override_settings(
+        TASTYTRADE_ACCESS_TOKEN="",
+        TASTYTRADE_CLIENT_SECRET="client-secret",
+        TASTYTRADE_REFRESH_TOKEN="refresh-token",
+    )
+    def test_tastytrade_token_and_option_chain_are_cached(self):
+        class Response:
+            status_code = 200
+            content = b"{}"
+            headers = {"content-type": "application/json"}
+
+            def __init__(self, payload):
+                self.payload = payload
+
+            def json(self):
+                return self.payload
+
+        def strikes(expiration, prices, root="SPY"):
+            return {
+                "expiration-date": expiration,
+                "days-to-expiration": 1 if expiration == "2026-06-30" else 2,
+                "strikes": [
+                    {"strike-price": str(price), "call": f"{root} C{price}", "put": f"{root} P{price}"}
+                    for price in prices
+                ],
+            }
+
+        chain_payload = {
+            "data": {
+                "items": [
+                    {"expirations": [strikes("2026-07-01", [410, 400]), strikes("2026-06-30", [400, 405, 420])]},
+                    {"expirations": [strikes("2026-07-01", [405], root="SPYW")]},
+                ]
+            }
+        }
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        urls = []
+
+        def respond(method, url, **kwargs):
+            urls.append(url)
+            if url.endswith("/oauth/token"):
+                return Response({"access_token": "token", "expires_in": 900})
+            return Response(chain_payload)
+
+        with patch.object(get_client("tastytrade").session, "request", side_effect=respond):
+            first = TastytradeService().cached_option_chain("spy")
+            second = TastytradeService().cached_option_chain("SPY")
+            TastytradeService().quote_token()
+
+        self.assertEqual(sum(url.endswith("/oauth/token") for url in urls), 1)
+        self.assertEqual(sum("/option-chains/" in url for url in urls), 1)
+        self.assertEqual(len(first), len(second))
+        self.assertEqual(
+            summarize_tastytrade_option_chain(second)["expirations"],
+            [
+                {"expiration_date": "2026-06-30", "days_to_expiration": 1, "strike_count": 3},
+                {"expiration_date": "2026-07-01", "days_to_expiration": 2, "strike_count": 3},
+            ],
+        )
+        filtered = second.filter(min_strike=400, max_strike=410, expirations=["2026-07-01"])
+        self.assertEqual(
+            [(row["strike"], row["call"]) for row in filtered.rows()],
+            [(400.0, "SPY C400"), (405.0, "SPYW C405"), (410.0, "SPY C410")],
+        )
+        self.assertEqual(len(second.filter(max_days=1).expirations), 1)
+
     def test_serializers_fall_back_to_raw_readable_fields(self):
         user = User.objects.create_user(username="investor", password="secret")
         connection = SnapTradeConnection.objects.create(
@@ -340,6 +414,46 @@ class InvestmentNormalizationTests(TestCase):
         self.assertEqual(totals["available_to_invest"], 736.18)
         self.assertEqual(totals["portfolio_value"], 811.12)
 
+        # The cached summary must expire when the buy ages out of the lookback window
+        OrderSnapshot.objects.filter(provider_order_id="qqqm-buy-1").update(
+            executed_at=timezone.now() - timedelta(days=7, minutes=-2)
+        )
+        totals = _portfolio_totals([account])
+        self.assertEqual(totals["portfolio_value"], 811.12)
+        self.assertTrue(60 < _summary_cache_timeout({"totals": totals}) <= 120)
+        self.assertEqual(_summary_cache_timeout({"totals": {"commitments_expire_at": None}}), PORTFOLIO_SUMMARY_CACHE_TIMEOUT)
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_portfolio_summary_is_cached_until_next_sync(self):
+        cache.clear()
+        user = User.objects.create_user(username="summary-cache-user", password="secret")
+        connection = SnapTradeConnection.objects.create(
+            user=user,
+            snaptrade_user_id="snap-user-summary-cache",
+            user_secret="secret",
+            status=SnapTradeConnection.STATUS_ACTIVE,
+        )
+        account = InvestmentAccount.objects.create(
+            connection=connection,
+            provider_account_id="acct-summary-cache",
+            account_name="Individual",
+            total_value="1000.00",
+        )
+        money_market = Security.objects.create(symbol="FDRXX", name="Fidelity Government Cash Reserves")
+        HoldingSnapshot.objects.create(account=account, security=money_market, market_value="250.00", as_of=timezone.now())
+        client = APIClient()
+        client.force_authenticate(user)
+
+        first = client.get("/investments/portfolio/summary/").json()
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get("/investments/portfolio/summary/").json(), first)
+        self.assertTrue(money_market.is_cash_equivalent)
+        self.assertEqual(first["totals"]["cash_equivalents"], 250.0)
+
+        InvestmentAccount.objects.filter(pk=account.pk).update(total_value="1200.00")
+        invalidate_portfolio_summary(user.id)
+        self.assertEqual(client.get("/investments/portfolio/summary/").json()["totals"]["portfolio_value"], 1200.0)
+
     def test_account_serializer_hides_raw_authorization_text(self):
         user = User.objects.create_user(username="account-brokerage-user", password="secret")
         connection = SnapTradeConnection.objects.create(
@@ -427,7 +541,7 @@ class InvestmentNormalizationTests(TestCase):
         service = SnapTradeService()
 
         with patch("investments.services.time.time", return_value=1780000000):
-            with patch("investments.services.requests.request", return_value=Response()) as request:
+            with patch.object(service.client.session, "request", return_value=Response()) as request:
                 service._request("GET", "/accounts/account-123/orders", params={"userId": "user", "userSecret": "secret"})
 
         _, _, kwargs = request.mock_calls[0]
@@ -436,6 +550,64 @@ class InvestmentNormalizationTests(TestCase):
         self.assertIn("Signature", kwargs["headers"])
         self.assertNotIn("consumerKey", kwargs["headers"])
 
+    @override_settings(SNAPTRADE_CLIENT_ID="client", SNAPTRADE_CONSUMER_KEY="consumer")
+    def test_snaptrade_services_share_a_pooled_client(self):
+        first = SnapTradeService()
+        second = SnapTradeService()
+
+        self.assertIs(first.client, second.client)
+        adapter = first.client.session.get_adapter("https://api.snaptrade.com/api/v1")
+        self.assertEqual(adapter._pool_maxsize, SNAPTRADE_MAX_WORKERS)
+
+    def test_sync_fetches_account_payloads_concurrently(self):
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0}
+
+        def provider_call(result):
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            time.sleep(0.05)
+            with lock:
+                state["in_flight"] -= 1
+            return result
+
+        class FakeSnapTradeService:
+            def ensure_user(self, connection):
+                return None
+
+            def list_brokerage_authorizations(self, connection):
+                return [{"id": "auth-1", "brokerage": {"name": "Fidelity"}}]
+
+            def list_accounts(self, connection, authorization_id):
+                return [{"id": f"account-{index}", "name": f"Account {index}"} for index in range(5)]
+
+            def get_account_balances(self, connection, account_id):
+                return provider_call({"total": "100.00"})
+
+            def get_account_holdings(self, connection, account_id):
+                return provider_call([])
+
+            def get_account_orders(self, connection, account_id):
+                return provider_call([])
+
+        user = User.objects.create_user(username="concurrent-sync-user", password="secret")
+        connection = SnapTradeConnection.objects.create(
+            user=user,
+            snaptrade_user_id="snap-user-concurrent",
+            user_secret="snap-secret",
+        )
+
+        with patch("investments.services.SnapTradeService", FakeSnapTradeService):
+            started = time.perf_counter()
+            result = sync_connection_investments(connection)
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(result["accounts"], 5)
+        self.assertEqual(result["portfolio_value"], "500.00")
+        self.assertGreater(state["peak"], 1)
+        self.assertLess(elapsed, 15 * 0.05)
+
     @override_settings(SNAPTRADE_CLIENT_ID="client", SNAPTRADE_CONSUMER_KEY="consumer")
     def test_snaptrade_register_treats_existing_user_as_success(self):
         user = User.objects.create_user(username="existing-snaptrade-user", password="secret")
@@ -564,9 +736,65 @@ class InvestmentNormalizationTests(TestCase):
         self.assertEqual(holding.symbol if hasattr(holding, "symbol") else holding.security.symbol, "SPAXX")
         self.assertEqual(holding.market_value, Decimal("810.90"))
         self.assertEqual(account.total_value, Decimal("810.90"))
+        self.assertTrue(holding.security.is_cash_equivalent)
+
+    def test_sync_diffs_large_accounts_with_bulk_writes(self):
+        class FakeSnapTradeService:
+            positions = [
+                {"symbol": f"SYM{index}", "units": "10", "price": "5.00", "average_purchase_price": "4.00"}
+                for index in range(300)
+            ]
+
+            def ensure_user(self, connection):
+                return None
+
+            def list_brokerage_authorizations(self, connection):
+                return [{"id": "auth-1", "brokerage": {"name": "Fidelity"}}]
+
+            def list_accounts(self, connection, authorization_id):
+                return [{"id": "account-bulk", "name": "Individual", "type": "brokerage", "currency": "USD"}]
+
+            def get_account_balances(self, connection, account_id):
+                return {"total": "0.00"}
+
+            def get_account_holdings(self, connection, account_id):
+                return self.positions
+
+            def get_account_orders(self, connection, account_id):
+                return []
+
+        user = User.objects.create_user(username="bulk-sync-user", password="secret")
+        connection = SnapTradeConnection.objects.create(
+            user=user,
+            snaptrade_user_id="snap-user-bulk",
+            user_secret="snap-secret",
+        )
+
+        with patch("investments.services.SnapTradeService", FakeSnapTradeService):
+            with CaptureQueriesContext(connection_db) as first_sync:
+                result = sync_connection_investments(connection)
+
+            FakeSnapTradeService.positions = FakeSnapTradeService.positions[1:]
+            FakeSnapTradeService.positions[0] = {**FakeSnapTradeService.positions[0], "price": "6.00"}
+            with CaptureQueriesContext(connection_db) as second_sync:
+                sync_connection_investments(connection)
+
+        self.assertEqual(result["holdings"], 300)
+        self.assertLess(len(first_sync), 25)
+        self.assertLess(len(second_sync), 25)
+
+        account = InvestmentAccount.objects.get(provider_account_id="account-bulk")
+        self.assertEqual(account.total_value, Decimal("14960.00"))
+        self.assertEqual(HoldingSnapshot.objects.filter(account=account).count(), 299)
+        self.assertFalse(HoldingSnapshot.objects.filter(security__symbol="SYM0").exists())
+        repriced = HoldingSnapshot.objects.get(security__symbol="SYM1")
+        self.assertEqual(repriced.market_value, Decimal("60.00"))
+        self.assertEqual(repriced.weight_percent, Decimal("0.4011"))
 
     def test_kraken_sync_returns_multi_asset_summary(self):
         class FakeKrakenService:
+            starts = []
+
             def balances(self):
                 return {
                     "XXBT": "0.1",
@@ -575,7 +803,10 @@ class InvestmentNormalizationTests(TestCase):
                     "ZUSD": "25.00",
                 }
 
-            def trades(self):
+            def trades(self, start=None):
+                FakeKrakenService.starts.append(("trades", start))
+                if start is not None:
+                    return {"trades": {}, "count": 0}
                 return {
                     "trades": {
                         "trade-btc": {
@@ -614,7 +845,10 @@ class InvestmentNormalizationTests(TestCase):
                     }
                 }
 
-            def ledger(self):
+            def ledger(self, start=None):
+                FakeKrakenService.starts.append(("ledger", start))
+                if start is not None:
+                    return {"ledger": {}, "count": 0}
                 return {
                     "ledger": {
                         "ledger-1": {
@@ -656,3 +890,506 @@ class InvestmentNormalizationTests(TestCase):
         self.assertEqual(HoldingSnapshot.objects.filter(account=account).count(), 3)
         self.assertEqual(OrderSnapshot.objects.filter(account=account).count(), 3)
         self.assertEqual(KrakenLedgerEntry.objects.filter(user=user).count(), 1)
+
+        with patch("investments.services.KrakenService", FakeKrakenService):
+            repeat = sync_kraken_investments(user)
+
+        self.assertEqual(FakeKrakenService.starts[:2], [("trades", None), ("ledger", None)])
+        self.assertEqual(FakeKrakenService.starts[2:], [("trades", 1780000001), ("ledger", 1779999999)])
+        self.assertEqual(repeat["new_orders"], 0)
+        self.assertEqual(repeat["ledger_entries"], 0)
+        self.assertEqual(repeat["orders"], 3)
+        btc = HoldingSnapshot.objects.get(account=account, security__symbol="BTC-USD")
+        self.assertEqual(btc.cost_basis, Decimal("6010.00"))
+        self.assertEqual(OrderSnapshot.objects.filter(account=account).count(), 3)
+
+    @override_settings(KRAKEN_API_KEY="key", KRAKEN_API_SECRET="c2VjcmV0")
+    def test_kraken_history_pages_with_offsets_from_watermark(self):
+        pages = {
+            0: {"ledger": {f"L{index}": {"time": index} for index in range(50)}, "count": 70},
+            50: {"ledger": {f"L{index}": {"time": index} for index in range(50, 70)}, "count": 70},
+        }
+        service = KrakenService()
+
+        with patch.object(service, "_private_request", side_effect=lambda path, data: pages[data["ofs"]]) as request:
+            result = service.ledger(start=1780000000)
+
+        self.assertEqual(result["count"], 70)
+        self.assertEqual(len(result["ledger"]), 70)
+        self.assertEqual([call.args[1]["ofs"] for call in request.mock_calls], [0, 50])
+        self.assertTrue(all(call.args[1]["start"] == 1780000000 for call in request.mock_calls))
+
+    @override_settings(KRAKEN_API_KEY="key", KRAKEN_API_SECRET="c2VjcmV0")
+    def test_kraken_history_walk_reports_truncation(self):
+        page = {"ledger": {f"L{index}": {"time": index} for index in range(50)}, "count": 500}
+        service = KrakenService()
+
+        with patch("investments.services.KRAKEN_MAX_PAGES", 2):
+            with patch.object(service, "_private_request", side_effect=lambda path, data: page):
+                result = service.ledger()
+
+        self.assertFalse(result["complete"])
+
+    def test_kraken_sync_backfills_history_older_than_stored_rows(self):
+        user = User.objects.create_user(username="kraken-backfill", password="secret")
+        connection = SnapTradeConnection.objects.create(user=user, snaptrade_user_id=f"kraken-{user.id}")
+        account = InvestmentAccount.objects.create(
+            connection=connection, provider_account_id=f"kraken-spot-{user.id}", account_name="Kraken Spot"
+        )
+        # An install that only ever stored the newest page
+        KrakenLedgerEntry.objects.create(
+            user=user, ledger_id="L-new", asset="BTC", amount=Decimal("0.1"),
+            timestamp=datetime.fromtimestamp(1780000000, tz=UTC),
+        )
+
+        class FakeKrakenService:
+            calls = []
+            backfill_pages = [False, True]
+
+            def balances(self):
+                return {}
+
+            def usd_prices(self):
+                return {}
+
+            def trades(self, start=None, end=None):
+                return {"trades": {}, "count": 0, "complete": True}
+
+            def ledger(self, start=None, end=None):
+                FakeKrakenService.calls.append((start, end))
+                if end is None:
+                    return {"ledger": {}, "count": 0, "complete": True}
+                complete = FakeKrakenService.backfill_pages.pop(0)
+                entry_time = end - 100
+                return {
+                    "ledger": {f"L-{entry_time}": {"asset": "XXBT", "amount": "0.1", "time": str(entry_time)}},
+                    "count": 1,
+                    "complete": complete,
+                }
+
+        with patch("investments.services.KrakenService", FakeKrakenService):
+            first = sync_kraken_investments(user)
+            second = sync_kraken_investments(user)
+            third = sync_kraken_investments(user)
+
+        # The cut-short backfill resumes below the oldest entry it reached
+        self.assertEqual(
+            FakeKrakenService.calls,
+            [(1779999999, None), (None, 1780000001), (1779999999, None), (None, 1779999902), (1779999999, None)],
+        )
+        self.assertEqual([first["history_complete"], second["history_complete"], third["history_complete"]], [False, True, True])
+        self.assertEqual(KrakenLedgerEntry.objects.filter(user=user).count(), 3)
+        account.refresh_from_db()
+        self.assertEqual(account.history_sync["ledger"], {"complete": True})
+
+    def test_kraken_sync_keeps_every_fill_of_a_multi_fill_order(self):
+        class FakeKrakenService:
+            def balances(self):
+                return {"XXBT": "0.15"}
+
+            def usd_prices(self):
+                return {"BTC": Decimal("62000")}
+
+            def trades(self, start=None, end=None):
+                fill = {"ordertxid": "order-1", "pair": "XXBTZUSD", "type": "buy", "ordertype": "limit"}
+                return {
+                    "trades": {
+                        "trade-1": {**fill, "vol": "0.1", "cost": "6000", "fee": "10", "price": "60000", "time": "1780000000"},
+                        "trade-2": {**fill, "vol": "0.05", "cost": "3100", "fee": "5", "price": "62000", "time": "1780000005"},
+                    },
+                    "count": 2,
+                    "complete": True,
+                }
+
+            def ledger(self, start=None, end=None):
+                return {"ledger": {}, "count": 0, "complete": True}
+
+        user = User.objects.create_user(username="kraken-fills", password="secret")
+        with patch("investments.services.KrakenService", FakeKrakenService):
+            sync_kraken_investments(user)
+
+        fills = OrderSnapshot.objects.filter(account__provider_account_id=f"kraken-spot-{user.id}").order_by("executed_at")
+        self.assertEqual([fill.provider_order_id for fill in fills], ["trade-1", "trade-2"])
+        self.assertEqual({fill.raw["ordertxid"] for fill in fills}, {"order-1"})
+        btc = HoldingSnapshot.objects.get(account=fills[0].account, security__symbol="BTC-USD")
+        self.assertEqual(btc.cost_basis, Decimal("9115.00"))
+
+    def test_lot_book_matches_disposals_per_method(self):
+        start = timezone.now()
+        events = [
+            LotEvent("buy-1", start, "BTC", Decimal("1"), Decimal("100")),
+            LotEvent("buy-2", start + timedelta(days=1), "BTC", Decimal("1"), Decimal("200")),
+            LotEvent("sell-1", start + timedelta(days=2), "BTC", Decimal("-1"), Decimal("300")),
+        ]
+        expected = {
+            METHOD_FIFO: (Decimal("200"), Decimal("200")),
+            METHOD_LIFO: (Decimal("100"), Decimal("100")),
+            METHOD_AVERAGE: (Decimal("150"), Decimal("150")),
+        }
+
+        for method, (realized, remaining_cost) in expected.items():
+            book = LotBook(method)
+            book.apply_all(events)
+            self.assertEqual(book.realized["BTC"], realized, method)
+            self.assertEqual(book.position("BTC"), (Decimal("1"), remaining_cost), method)
+            restored = LotBook.from_state(book.to_state(), method)
+            self.assertEqual(restored.position("BTC"), book.position("BTC"))
+            report = restored.lot_report("BTC", Decimal("250"))
+            self.assertEqual(Decimal(report[0]["unrealized"]), Decimal("250") - remaining_cost)
+
+    def test_kraken_cost_basis_resumes_from_checkpoint(self):
+        user = User.objects.create_user(username="lots-user", password="secret")
+        connection = SnapTradeConnection.objects.create(user=user, snaptrade_user_id=f"kraken-{user.id}")
+        account = InvestmentAccount.objects.create(
+            connection=connection, provider_account_id=f"kraken-spot-{user.id}", account_name="Kraken Spot"
+        )
+        start = timezone.now() - timedelta(days=10)
+
+        def trade(ref_id, day, btc, usd):
+            for leg, asset, amount in (("a", "BTC", btc), ("b", "USD", usd)):
+                KrakenLedgerEntry.objects.create(
+                    user=user,
+                    ledger_id=f"{ref_id}-{leg}",
+                    ref_id=ref_id,
+                    entry_type="trade",
+                    asset=asset,
+                    amount=Decimal(amount),
+                    timestamp=start + timedelta(days=day),
+                )
+
+        trade("T1", 0, "1", "-100")
+        trade("T2", 1, "1", "-200")
+        book = replay_kraken_cost_basis(user, account, METHOD_FIFO)
+        self.assertEqual(book.position("BTC"), (Decimal("2"), Decimal("300")))
+
+        trade("T3", 2, "-1.5", "450")
+        with self.assertNumQueries(6):
+            book = replay_kraken_cost_basis(user, account, METHOD_FIFO)
+        self.assertEqual(book.position("BTC"), (Decimal("0.5"), Decimal("100")))
+        self.assertEqual(book.realized["BTC"], Decimal("250"))
+
+        checkpoint = CostBasisCheckpoint.objects.get(account=account, method=METHOD_FIFO)
+        self.assertEqual(checkpoint.last_event_key, "T3")
+        self.assertEqual(checkpoint.rows_through, 6)
+
+        # History landing before the checkpoint forces a clean replay
+        trade("T0", -1, "1", "-50")
+        book = replay_kraken_cost_basis(user, account, METHOD_FIFO)
+        self.assertEqual(book.position("BTC"), (Decimal("1.5"), Decimal("250")))
+
+    def test_kraken_crypto_for_crypto_trades_move_lots_between_assets(self):
+        user = User.objects.create_user(username="swap-user", password="secret")
+        connection = SnapTradeConnection.objects.create(user=user, snaptrade_user_id=f"kraken-{user.id}")
+        account = InvestmentAccount.objects.create(
+            connection=connection, provider_account_id=f"kraken-spot-{user.id}", account_name="Kraken Spot"
+        )
+        start = timezone.now() - timedelta(days=10)
+
+        def legs(ref_id, day, **amounts):
+            for asset, amount in amounts.items():
+                KrakenLedgerEntry.objects.create(
+                    user=user,
+                    ledger_id=f"{ref_id}-{asset}",
+                    ref_id=ref_id,
+                    entry_type="trade",
+                    asset=asset,
+                    amount=Decimal(amount),
+                    timestamp=start + timedelta(days=day),
+                )
+
+        legs("T1", 0, BTC="1", USD="-100")
+        # ETH/XBT: half the BTC for 10 ETH, valued at the day's ETH close
+        legs("T2", 1, BTC="-0.5", ETH="10")
+        MarketDailyBar.objects.create(
+            symbol="ETH-USD", date=(start + timedelta(days=1)).astimezone(UTC).date(), close=Decimal("6")
+        )
+        book = replay_kraken_cost_basis(user, account, METHOD_FIFO)
+
+        self.assertEqual(book.position("BTC"), (Decimal("0.5"), Decimal("50")))
+        self.assertEqual(book.realized["BTC"], Decimal("10"))
+        self.assertEqual(book.position("ETH"), (Decimal("10"), Decimal("60")))
+
+        # No close for either side: the lots are untouched and the trade is reported
+        legs("T3", 2, BTC="-0.25", SOL="5")
+        book = replay_kraken_cost_basis(user, account, METHOD_FIFO)
+
+        self.assertEqual(book.position("BTC"), (Decimal("0.5"), Decimal("50")))
+        self.assertEqual(book.position("SOL"), (Decimal("0"), Decimal("0")))
+        checkpoint = CostBasisCheckpoint.objects.get(account=account, method=METHOD_FIFO)
+        self.assertEqual(checkpoint.state["unpriced_trades"], ["T3"])
+
+
+class PortfolioHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="history-user", password="secret")
+        self.connection = SnapTradeConnection.objects.create(user=self.user, snaptrade_user_id="snap-user-history")
+        self.account = InvestmentAccount.objects.create(
+            connection=self.connection, provider_account_id="acct-history", account_name="Individual"
+        )
+        self.voo = Security.objects.create(symbol="VOO", name="Vanguard S&P 500 ETF")
+        self.today = timezone.localdate()
+
+    def _sync_points(self, account, days_ago, hour, value):
+        recorded_at = timezone.now().replace(hour=hour, minute=0, second=0, microsecond=0) - timedelta(days=days_ago)
+        return holding_value_points(account, [(self.voo.id, Decimal("1"), Decimal(value))], Decimal(value), recorded_at)
+
+    def test_sync_points_are_compacted_to_daily_and_charted(self):
+        other = InvestmentAccount.objects.create(
+            connection=self.connection, provider_account_id="acct-history-2", account_name="Roth"
+        )
+        points = [
+            *self._sync_points(self.account, 10, 9, "100.00"),
+            *self._sync_points(self.account, 10, 15, "110.00"),
+            *self._sync_points(self.account, 2, 9, "120.00"),
+            *self._sync_points(other, 10, 12, "50.00"),
+        ]
+        record_value_points(points, [self.account.id, other.id], today=self.today)
+
+        old_totals = PortfolioValuePoint.objects.filter(
+            account=self.account, security__isnull=True, date=self.today - timedelta(days=10)
+        )
+        self.assertEqual([(p.market_value, p.is_daily) for p in old_totals], [(Decimal("110.00"), True)])
+        self.assertEqual(compact_value_points([self.account.id], today=self.today), 0)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        data = client.get("/investments/portfolio/history/", {"range": "1M"}).json()
+        self.assertEqual([point["value"] for point in data["points"]], [160.0, 170.0])
+        data = client.get("/investments/portfolio/history/", {"range": "1W", "symbol": "voo"}).json()
+        self.assertEqual(data["points"], [{"date": (self.today - timedelta(days=2)).isoformat(), "value": 120.0}])
+        self.assertEqual(client.get("/investments/portfolio/history/", {"range": "5Y"}).status_code, 400)
+
+    def test_backfill_unwinds_orders_and_values_at_daily_closes(self):
+        HoldingSnapshot.objects.create(account=self.account, security=self.voo, quantity="3", as_of=timezone.now())
+        OrderSnapshot.objects.create(
+            account=self.account,
+            provider_order_id="voo-buy",
+            symbol="VOO",
+            side="BUY",
+            status="EXECUTED",
+            filled_quantity="1",
+            executed_at=timezone.now() - timedelta(days=2),
+        )
+        for days_ago in (4, 3, 2):
+            MarketDailyBar.objects.create(
+                symbol="VOO", date=self.today - timedelta(days=days_ago), close=Decimal(500 + days_ago)
+            )
+
+        call_command("backfill_portfolio_history", "--days", "4", "--users", self.user.username, stdout=StringIO())
+
+        totals = dict(
+            PortfolioValuePoint.objects.filter(account=self.account, security__isnull=True)
+            .values_list("date", "market_value")
+        )
+        self.assertEqual(totals[self.today - timedelta(days=4)], Decimal("1008.00"))
+        self.assertEqual(totals[self.today - timedelta(days=3)], Decimal("1006.00"))
+        self.assertEqual(totals[self.today - timedelta(days=2)], Decimal("1506.00"))
+        # Weekend-style gap: the last close carries forward
+        self.assertEqual(totals[self.today], Decimal("1506.00"))
+
+
+    def test_backfilled_totals_include_cash_so_the_first_sync_does_not_step(self):
+        HoldingSnapshot.objects.create(account=self.account, security=self.voo, quantity="3", as_of=timezone.now())
+        for days_ago in (4, 3, 2):
+            MarketDailyBar.objects.create(symbol="VOO", date=self.today - timedelta(days=days_ago), close=Decimal("500"))
+        # First sync: 3 VOO at 500 plus 250.00 cash in the broker's equity
+        recorded_at = timezone.now() - timedelta(days=1)
+        record_value_points(
+            holding_value_points(self.account, [(self.voo.id, Decimal("3"), Decimal("1500.00"))], Decimal("1750.00"), recorded_at),
+            [self.account.id],
+            today=self.today,
+        )
+
+        call_command("backfill_portfolio_history", "--days", "4", "--users", self.user.username, stdout=StringIO())
+
+        series = portfolio_value_series([self.account], "1W", today=self.today)
+        self.assertEqual([point["value"] for point in series], [1750.0] * 4)
+
+@override_settings(SNAPTRADE_CONSUMER_KEY="webhook-secret")
+class SnapTradeWebhookTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="webhook-user", password="secret")
+        self.connection = SnapTradeConnection.objects.create(user=self.user, snaptrade_user_id="snap-user-webhook")
+        self.account = InvestmentAccount.objects.create(
+            connection=self.connection, provider_account_id="acct-webhook", account_name="Individual"
+        )
+        webhooks._pending.clear()
+        self.addCleanup(webhooks._pending.clear)
+        self.addCleanup(self._drain_queue)
+
+    def _drain_queue(self):
+        while not webhooks._resync_queue.empty():
+            webhooks._resync_queue.get_nowait()
+            webhooks._resync_queue.task_done()
+
+    def _post(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        signature = hmac.new(b"webhook-secret", body, hashlib.sha256).hexdigest()
+        return APIClient().post(
+            "/investments/snaptrade/webhook/", body, content_type="application/json", HTTP_SIGNATURE=signature
+        )
+
+    def test_webhook_burst_is_stored_and_coalesced_into_one_resync(self):
+        payload = {"userId": "snap-user-webhook", "eventType": "ACCOUNT_HOLDINGS_UPDATED", "accountId": "acct-webhook"}
+        # A private queue, so a worker left running by another test cannot drain it
+        resync_queue = queue.Queue()
+        with patch("investments.webhooks._ensure_worker"), patch("investments.webhooks._resync_queue", resync_queue):
+            with self.captureOnCommitCallbacks(execute=True):
+                for _ in range(20):
+                    self.assertEqual(self._post(payload).status_code, 200)
+
+        self.assertEqual(SnapTradeWebhookEvent.objects.filter(connection=self.connection).count(), 20)
+        self.assertEqual(resync_queue.qsize(), 1)
+        key, due_at = resync_queue.get_nowait()
+        self.assertEqual(key, (self.connection.id, "acct-webhook"))
+        self.assertLessEqual(due_at, time.monotonic() + webhooks.RESYNC_COALESCE_SECONDS)
+        self.connection.refresh_from_db()
+        self.assertNotIn("webhooks", self.connection.metadata)
+
+    def test_burst_across_accounts_waits_one_window_in_total(self):
+        done = threading.Event()
+        processed = []
+
+        def process(connection_id, account_id=""):
+            processed.append(account_id)
+            if len(processed) == 5:
+                done.set()
+
+        with patch("investments.webhooks.RESYNC_COALESCE_SECONDS", 0.2), patch(
+            "investments.webhooks.process_resync", side_effect=process
+        ):
+            started = time.monotonic()
+            with self.captureOnCommitCallbacks(execute=True):
+                for index in range(5):
+                    webhooks.enqueue_resync(self.connection.id, f"acct-{index}")
+            self.assertTrue(done.wait(5))
+            elapsed = time.monotonic() - started
+
+        self.assertEqual(processed, [f"acct-{index}" for index in range(5)])
+        self.assertLess(elapsed, 0.6)
+
+    def test_resync_is_scoped_to_the_account_and_marks_events_processed(self):
+        for _ in range(3):
+            SnapTradeWebhookEvent.objects.create(
+                connection=self.connection,
+                snaptrade_user_id="snap-user-webhook",
+                event_type="ACCOUNT_HOLDINGS_UPDATED",
+                provider_account_id="acct-webhook",
+            )
+        other = SnapTradeWebhookEvent.objects.create(
+            connection=self.connection,
+            snaptrade_user_id="snap-user-webhook",
+            event_type="ACCOUNT_HOLDINGS_UPDATED",
+            provider_account_id="acct-other",
+        )
+
+        with patch("investments.webhooks.sync_connection_investments", return_value={}) as sync:
+            webhooks.process_resync(self.connection.id, "acct-webhook")
+
+        sync.assert_called_once_with(self.connection, account_ids=["acct-webhook"])
+        self.assertFalse(
+            SnapTradeWebhookEvent.objects.filter(provider_account_id="acct-webhook", processed_at__isnull=True).exists()
+        )
+        other.refresh_from_db()
+        self.assertIsNone(other.processed_at)
+
+
+class IntegrationClientTests(TestCase):
+    def setUp(self):
+        self.server = StubBrokerServer().start()
+        self.addCleanup(self.server.stop)
+        self.client = IntegrationClient("stub", backoff_factor=0, failure_threshold=3, reset_timeout=60)
+        self.client.sleep = lambda seconds: None
+        self.addCleanup(self.client.session.close)
+
+    def test_retries_throttled_gets_and_records_metrics(self):
+        self.server.script(
+            "/accounts/acct-1/positions",
+            StubResponse(429, headers={"Retry-After": "0"}),
+            StubResponse(503),
+            StubResponse(200, {"ok": True}),
+        )
+
+        response = self.client.request("GET", self.server.url("/accounts/acct-1/positions"))
+
+        self.assertEqual(response.json(), {"ok": True})
+        self.assertEqual(len(self.server.requests["/accounts/acct-1/positions"]), 3)
+        metrics = self.client.metrics()["endpoints"]["GET /accounts/{id}/positions"]
+        self.assertEqual((metrics["count"], metrics["retries"], metrics["statuses"]), (1, 2, {"200": 1}))
+        self.assertEqual(sum(bucket["count"] for bucket in metrics["histogram_ms"]), 1)
+
+    def test_posts_are_not_retried_and_failures_open_the_circuit(self):
+        self.server.set_default("/orders", StubResponse(502))
+
+        for _ in range(3):
+            self.assertEqual(self.client.request("POST", self.server.url("/orders")).status_code, 502)
+
+        self.assertEqual(len(self.server.requests["/orders"]), 3)
+        self.assertEqual(self.client.breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            self.client.request("GET", self.server.url("/orders"))
+        self.assertEqual(len(self.server.requests["/orders"]), 3)
+
+    def test_half_open_probe_failing_outside_the_transport_still_settles(self):
+        now = [0.0]
+        self.client.breaker._clock = lambda: now[0]
+        self.server.set_default("/orders", StubResponse(502))
+        self.server.set_default("/health", StubResponse(200, {"ok": True}))
+        for _ in range(3):
+            self.client.request("POST", self.server.url("/orders"))
+        self.assertEqual(self.client.breaker.state, "open")
+
+        def failing_prepare():
+            raise RuntimeError("token fetch failed")
+
+        now[0] += 60
+        with self.assertRaises(RuntimeError):
+            self.client.request("GET", self.server.url("/health"), prepare=failing_prepare)
+        self.assertEqual(self.client.breaker.state, "open")
+
+        now[0] += 60
+        with self.assertRaises(IntegrationError):
+            self.client.request("GET", "http://")
+        self.assertEqual(self.client.breaker.state, "open")
+
+        now[0] += 60
+        self.assertEqual(self.client.request("GET", self.server.url("/health")).status_code, 200)
+        self.assertEqual(self.client.breaker.state, "closed")
+
+    @override_settings(KRAKEN_API_KEY="key", KRAKEN_API_SECRET="c2VjcmV0")
+    def test_kraken_retries_are_re_signed_with_fresh_nonces(self):
+        reset_clients()
+        self.addCleanup(reset_clients)
+        get_client("kraken").sleep = lambda seconds: None
+        self.server.script(
+            "/0/private/Balance",
+            StubResponse(503),
+            StubResponse(200, {"error": [], "result": {"ZUSD": "10.00"}}),
+        )
+        service = KrakenService()
+        service.base_url = self.server.url()
+
+        self.assertEqual(service.balances(), {"ZUSD": "10.00"})
+        bodies = [entry["body"].decode() for entry in self.server.requests["/0/private/Balance"]]
+        nonces = [body.split("nonce=")[1].split("&")[0] for body in bodies]
+        self.assertEqual(len(set(nonces)), 2)
+
+    def test_nonces_stay_unique_and_increasing_across_threads(self):
+        nonce = MonotonicNonce(clock=lambda: 1780000000.0)
+        values = []
+        lock = threading.Lock()
+
+        def take():
+            for _ in range(200):
+                value = int(nonce.next())
+                with lock:
+                    values.append(value)
+
+        threads = [threading.Thread(target=take) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(values)), 800)
+        self.assertGreater(int(nonce.next()), max(values))
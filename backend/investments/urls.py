@@ -12,6 +12,8 @@ urlpatterns = [
     path("kraken/ledger/", views.kraken_ledger, name="kraken_ledger"),
     path("tastytrade/status/", views.tastytrade_status, name="tastytrade_status"),
     path("tastytrade/snapshot/", views.tastytrade_snapshot, name="tastytrade_snapshot"),
+    path("tastytrade/option-chain/", views.tastytrade_option_chain, name="tastytrade_option_chain"),
     path("tastytrade/order-dry-run/", views.tastytrade_order_dry_run, name="tastytrade_order_dry_run"),
     path("portfolio/summary/", views.portfolio_summary, name="portfolio_summary"),
+    path("portfolio/history/", views.portfolio_history, name="portfolio_history"),
 ]
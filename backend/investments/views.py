@@ -1,24 +1,30 @@
 import json
+import math
 import uuid
 from datetime import timedelta
 from decimal import Decimal
 
 from django.conf import settings
+from django.core.cache import cache
 from django.http import JsonResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
-from .models import InvestmentAccount, KrakenLedgerEntry, SnapTradeConnection
+from .history import HISTORY_RANGES, portfolio_value_series
+from .models import CASH_EQUIVALENT_SYMBOLS, InvestmentAccount, KrakenLedgerEntry, Security, SnapTradeConnection
 from .serializers import InvestmentAccountSerializer, KrakenLedgerEntrySerializer, SnapTradeConnectionSerializer
 from .services import (
+    PORTFOLIO_SUMMARY_CACHE_TIMEOUT,
     KrakenError,
     SnapTradeError,
     SnapTradeService,
     TastytradeError,
     TastytradeService,
-    _stringify_scalar,
+    invalidate_portfolio_summary,
+    portfolio_summary_cache_key,
     summarize_tastytrade_accounts,
     summarize_tastytrade_balances,
     summarize_tastytrade_dry_run,
@@ -29,9 +35,9 @@ from .services import (
     sync_connection_investments,
     sync_kraken_investments,
 )
+from .webhooks import record_webhook_event
 
 
-CASH_EQUIVALENT_SYMBOLS = {"SPAXX", "FDRXX", "FZFXX", "FDLXX", "SPRXX", "FCASH", "CASH"}
 CENT = Decimal("0.01")
 
 
@@ -43,36 +49,20 @@ def _kraken_connection(user):
     return SnapTradeConnection.objects.filter(user=user, snaptrade_user_id=f"kraken-{user.id}").first()
 
 
-def _holding_symbol(holding):
-    return (
-        _stringify_scalar(holding.security.symbol, "")
-        or _stringify_scalar(holding.raw.get("symbol"), "")
-        or _stringify_scalar(holding.raw.get("ticker"), "")
-    ).upper()
-
-
 def _is_cash_equivalent_holding(holding):
-    symbol = _holding_symbol(holding)
-    if symbol in CASH_EQUIVALENT_SYMBOLS:
-        return True
+    # Classified once at sync time and stored on the security
+    return holding.security.is_cash_equivalent
+
 
-    asset_type = _stringify_scalar(holding.security.asset_type or holding.raw.get("type") or holding.raw.get("security_type"), "").lower()
-    name = (
-        _stringify_scalar(holding.security.name, "")
-        or _stringify_scalar(holding.raw.get("description"), "")
-        or _stringify_scalar(holding.raw.get("name"), "")
-        or _stringify_scalar(holding.raw.get("security_name"), "")
-    ).lower()
-    return "money market" in asset_type or "money market" in name
+def _account_cash_equivalents(account):
+    return sum(
+        (_to_decimal(holding.market_value) for holding in account.holdings.all() if _is_cash_equivalent_holding(holding)),
+        Decimal("0"),
+    )
 
 
 def _cash_equivalent_value(accounts):
-    total = Decimal("0")
-    for account in accounts:
-        for holding in account.holdings.all():
-            if _is_cash_equivalent_holding(holding):
-                total += _to_decimal(holding.market_value)
-    return total
+    return sum((_account_cash_equivalents(account) for account in accounts), Decimal("0"))
 
 
 def _to_decimal(value):
@@ -81,42 +71,57 @@ def _to_decimal(value):
     return value if isinstance(value, Decimal) else Decimal(str(value))
 
 
-def _recent_cash_equivalent_commitments(accounts, lookback_days=7):
-    cutoff = timezone.now() - timedelta(days=lookback_days)
+def _recent_cash_equivalent_commitments(account, cutoff):
+    """
+    Recent non-cash buys that a stale money market balance has not reflected
+    yet, and the time of the oldest one counted (None if there are none).
+    """
     total = Decimal("0")
-    for account in accounts:
-        if _to_decimal(account.cash_balance) or _to_decimal(account.buying_power):
+    oldest = None
+    for order in account.orders.all():
+        if (order.symbol or "").upper() in CASH_EQUIVALENT_SYMBOLS:
             continue
-
-        cash_equivalent_value = Decimal("0")
-        for holding in account.holdings.all():
-            if _is_cash_equivalent_holding(holding):
-                cash_equivalent_value += _to_decimal(holding.market_value)
-        if cash_equivalent_value <= 0:
+        if order.status.upper() != "EXECUTED" or order.side.upper() != "BUY":
+            continue
+        order_time = order.executed_at or order.placed_at
+        if not order_time or order_time < cutoff:
             continue
 
-        for order in account.orders.all():
-            symbol = _stringify_scalar(order.symbol, "").upper()
-            if symbol in CASH_EQUIVALENT_SYMBOLS:
-                continue
-            if order.status.upper() != "EXECUTED" or order.side.upper() != "BUY":
-                continue
-            order_time = order.executed_at or order.placed_at
-            if not order_time or order_time < cutoff:
-                continue
-
-            quantity = _to_decimal(order.filled_quantity or order.quantity)
-            total += quantity * _to_decimal(order.average_filled_price)
-    return total
-
-
-def _portfolio_totals(accounts):
-    total_cash = sum((_to_decimal(account.cash_balance) for account in accounts), Decimal("0"))
-    total_buying_power = sum((_to_decimal(account.buying_power) for account in accounts), Decimal("0"))
-    raw_cash_equivalents = _cash_equivalent_value(accounts)
-    recent_commitments = min(raw_cash_equivalents, _recent_cash_equivalent_commitments(accounts))
+        quantity = _to_decimal(order.filled_quantity or order.quantity)
+        total += quantity * _to_decimal(order.average_filled_price)
+        oldest = min(oldest, order_time) if oldest else order_time
+    return total, oldest
+
+
+def _portfolio_totals(accounts, lookback_days=7):
+    window = timedelta(days=lookback_days)
+    cutoff = timezone.now() - window
+    total_cash = Decimal("0")
+    total_buying_power = Decimal("0")
+    total_value = Decimal("0")
+    raw_cash_equivalents = Decimal("0")
+    commitments = Decimal("0")
+    oldest_commitment = None
+
+    # Single pass over the prefetched holdings and orders
+    for account in accounts:
+        cash_balance = _to_decimal(account.cash_balance)
+        buying_power = _to_decimal(account.buying_power)
+        total_cash += cash_balance
+        total_buying_power += buying_power
+        total_value += _to_decimal(account.total_value)
+
+        account_cash_equivalents = _account_cash_equivalents(account)
+        raw_cash_equivalents += account_cash_equivalents
+        if not cash_balance and not buying_power and account_cash_equivalents > 0:
+            account_commitments, account_oldest = _recent_cash_equivalent_commitments(account, cutoff)
+            commitments += account_commitments
+            if account_oldest and (oldest_commitment is None or account_oldest < oldest_commitment):
+                oldest_commitment = account_oldest
+
+    recent_commitments = min(raw_cash_equivalents, commitments)
     cash_equivalents = max(raw_cash_equivalents - recent_commitments, Decimal("0"))
-    total_value = sum((_to_decimal(account.total_value) for account in accounts), Decimal("0")) - recent_commitments
+    total_value -= recent_commitments
     available_to_invest = max(total_buying_power, total_cash + cash_equivalents)
 
     return {
@@ -125,9 +130,20 @@ def _portfolio_totals(accounts):
         "buying_power": float(total_buying_power.quantize(CENT)),
         "cash_equivalents": float(cash_equivalents.quantize(CENT)),
         "available_to_invest": float(available_to_invest.quantize(CENT)),
+        # When the oldest counted buy leaves the lookback window and the totals change
+        "commitments_expire_at": (oldest_commitment + window).isoformat() if oldest_commitment else None,
     }
 
 
+def _summary_cache_timeout(payload):
+    """Cache until the next sync, but no longer than the commitment window holds."""
+    expires_at = parse_datetime(payload["totals"].get("commitments_expire_at") or "")
+    if expires_at is None:
+        return PORTFOLIO_SUMMARY_CACHE_TIMEOUT
+    remaining = math.ceil((expires_at - timezone.now()).total_seconds())
+    return max(1, min(PORTFOLIO_SUMMARY_CACHE_TIMEOUT, remaining))
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def begin_snaptrade_connect(request):
@@ -149,6 +165,7 @@ def begin_snaptrade_connect(request):
             user=request.user,
             snaptrade_user_id=f"aetherdash-{request.user.id}",
         ).exclude(pk=connection.pk).delete()
+        invalidate_portfolio_summary(request.user.id)
 
         service = SnapTradeService()
         service.ensure_user(connection)
@@ -181,6 +198,7 @@ def complete_snaptrade_connect(request):
         connection.status = SnapTradeConnection.STATUS_BROKEN
         connection.disabled_reason = str(exc)
         connection.save(update_fields=["status", "disabled_reason", "updated_at"])
+        invalidate_portfolio_summary(request.user.id)
         return JsonResponse({"error": str(exc)}, status=500)
 
 
@@ -214,6 +232,7 @@ def refresh_snaptrade_data(request):
         connection.status = SnapTradeConnection.STATUS_BROKEN
         connection.disabled_reason = str(exc)
         connection.save(update_fields=["status", "disabled_reason", "updated_at"])
+        invalidate_portfolio_summary(request.user.id)
         return JsonResponse({"error": str(exc)}, status=500)
 
 
@@ -255,7 +274,7 @@ def tastytrade_snapshot(request):
             "balances": summarize_tastytrade_balances(service.balances()),
             "positions": summarize_tastytrade_positions(service.positions()),
             "live_orders": summarize_tastytrade_orders(service.live_orders()),
-            "option_chain": summarize_tastytrade_option_chain(service.option_chain(symbol)),
+            "option_chain": summarize_tastytrade_option_chain(service.cached_option_chain(symbol)),
             "quote_token": summarize_tastytrade_quote_token(service.quote_token()),
         })
     except TastytradeError as exc:
@@ -266,6 +285,42 @@ def tastytrade_snapshot(request):
         }, status=500)
 
 
+def _optional_float(value):
+    return float(value) if value not in (None, "") else None
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def tastytrade_option_chain(request):
+    symbol = request.query_params.get("symbol", "SPY")
+    expirations = [value for value in request.query_params.get("expirations", "").split(",") if value]
+    try:
+        min_strike = _optional_float(request.query_params.get("min_strike"))
+        max_strike = _optional_float(request.query_params.get("max_strike"))
+        max_days = int(request.query_params["max_days"]) if request.query_params.get("max_days") else None
+    except ValueError:
+        return JsonResponse({"error": "min_strike, max_strike and max_days must be numbers."}, status=400)
+
+    service = TastytradeService()
+    try:
+        chain = service.cached_option_chain(symbol, refresh=request.query_params.get("refresh") == "true")
+        chain = chain.filter(
+            min_strike=min_strike,
+            max_strike=max_strike,
+            expirations=expirations or None,
+            max_days=max_days,
+        )
+    except TastytradeError as exc:
+        return JsonResponse({"error": str(exc)}, status=500)
+    except ValueError:
+        return JsonResponse({"error": "expirations must be YYYY-MM-DD dates."}, status=400)
+    return JsonResponse({
+        "underlying": chain.underlying,
+        **chain.summary(max_expirations=len(chain.expirations)),
+        "strikes": chain.rows(),
+    })
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def tastytrade_order_dry_run(request):
@@ -287,16 +342,25 @@ def tastytrade_order_dry_run(request):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def portfolio_summary(request):
-    connections = SnapTradeConnection.objects.filter(user=request.user)
-    snaptrade_connection = _snaptrade_connections(request.user).first()
-    kraken_connection = _kraken_connection(request.user)
+    cache_key = portfolio_summary_cache_key(request.user.id)
+    payload = cache.get(cache_key)
+    if payload is None:
+        payload = _build_portfolio_summary(request.user)
+        cache.set(cache_key, payload, _summary_cache_timeout(payload))
+    return JsonResponse(payload)
+
+
+def _build_portfolio_summary(user):
+    connections = SnapTradeConnection.objects.filter(user=user)
+    snaptrade_connection = _snaptrade_connections(user).first()
+    kraken_connection = _kraken_connection(user)
     accounts = InvestmentAccount.objects.filter(connection__in=connections, is_active=True).prefetch_related("holdings__security", "orders")
 
     serialized_accounts = InvestmentAccountSerializer(accounts, many=True).data
     totals = _portfolio_totals(accounts)
     latest_sync = max((account.last_synced_at for account in accounts if account.last_synced_at), default=None)
 
-    return JsonResponse({
+    return {
         "connected": bool(snaptrade_connection and snaptrade_connection.status == SnapTradeConnection.STATUS_ACTIVE),
         "crypto_connected": bool(kraken_connection and kraken_connection.status == SnapTradeConnection.STATUS_ACTIVE),
         "connection": SnapTradeConnectionSerializer(snaptrade_connection).data if snaptrade_connection else None,
@@ -307,6 +371,28 @@ def portfolio_summary(request):
             "account_count": len(serialized_accounts),
         },
         "as_of": latest_sync.isoformat() if latest_sync else None,
+    }
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def portfolio_history(request):
+    range_key = request.query_params.get("range", "1M").upper()
+    if range_key not in HISTORY_RANGES:
+        return JsonResponse({"error": f"range must be one of {', '.join(HISTORY_RANGES)}."}, status=400)
+
+    security = None
+    symbol = request.query_params.get("symbol")
+    if symbol:
+        security = Security.objects.filter(symbol=symbol.upper()).first()
+        if security is None:
+            return JsonResponse({"range": range_key, "symbol": symbol.upper(), "points": []})
+
+    accounts = InvestmentAccount.objects.filter(connection__user=request.user, is_active=True)
+    return JsonResponse({
+        "range": range_key,
+        "symbol": security.symbol if security else None,
+        "points": portfolio_value_series(accounts, range_key, security=security),
     })
 
 
@@ -329,19 +415,5 @@ def snaptrade_webhook(request):
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON body."}, status=400)
 
-    user_id = payload.get("userId")
-    event_type = payload.get("eventType") or payload.get("type")
-    connection = SnapTradeConnection.objects.filter(snaptrade_user_id=user_id).first()
-    if connection:
-        metadata = connection.metadata or {}
-        metadata.setdefault("webhooks", []).append(payload)
-        metadata["webhooks"] = metadata["webhooks"][-20:]
-        if event_type == "CONNECTION_BROKEN":
-            connection.status = SnapTradeConnection.STATUS_BROKEN
-            connection.disabled_reason = payload.get("detail", "Connection broken")
-        elif event_type in {"CONNECTION_FIXED", "CONNECTION_ADDED"}:
-            connection.status = SnapTradeConnection.STATUS_ACTIVE
-            connection.disabled_reason = ""
-        connection.metadata = metadata
-        connection.save(update_fields=["status", "disabled_reason", "metadata", "updated_at"])
+    record_webhook_event(payload)
     return JsonResponse({"received": True})
@@ -0,0 +1,146 @@
+import queue
+import threading
+import time
+from typing import Any
+
+from django.db import close_old_connections, transaction as db_transaction
+from django.utils import timezone
+
+from .models import InvestmentAccount, SnapTradeConnection, SnapTradeWebhookEvent
+from .services import SnapTradeError, invalidate_portfolio_summary, sync_connection_investments
+
+
+# Events that only touch one account's data
+ACCOUNT_RESYNC_EVENTS = {
+    "ACCOUNT_HOLDINGS_UPDATED",
+    "ACCOUNT_TRANSACTIONS_INITIAL_UPDATE",
+    "ACCOUNT_TRANSACTIONS_UPDATED",
+}
+# Events that can add accounts, so the whole connection is listed again
+CONNECTION_RESYNC_EVENTS = {
+    "NEW_ACCOUNT_AVAILABLE",
+    "CONNECTION_ADDED",
+    "CONNECTION_FIXED",
+}
+
+# How long a queued resync waits so the rest of a webhook burst folds into it
+RESYNC_COALESCE_SECONDS = 2.0
+
+_resync_queue = queue.Queue()
+_pending = set()
+_pending_lock = threading.Lock()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def record_webhook_event(payload: dict[str, Any]) -> SnapTradeWebhookEvent:
+    """
+    Store a verified webhook, apply connection status changes and queue the
+    narrowest resync the event calls for.
+    """
+    user_id = str(payload.get("userId") or "")
+    event_type = str(payload.get("eventType") or payload.get("type") or "")
+    account_id = str(payload.get("accountId") or payload.get("account_id") or "")
+    connection = SnapTradeConnection.objects.filter(snaptrade_user_id=user_id).first() if user_id else None
+
+    event = SnapTradeWebhookEvent.objects.create(
+        connection=connection,
+        snaptrade_user_id=user_id,
+        event_type=event_type,
+        provider_account_id=account_id,
+        payload=payload,
+    )
+    if connection is None:
+        return event
+
+    if event_type == "CONNECTION_BROKEN":
+        connection.status = SnapTradeConnection.STATUS_BROKEN
+        connection.disabled_reason = payload.get("detail", "Connection broken")
+        connection.save(update_fields=["status", "disabled_reason", "updated_at"])
+        invalidate_portfolio_summary(connection.user_id)
+    elif event_type in {"CONNECTION_FIXED", "CONNECTION_ADDED"}:
+        connection.status = SnapTradeConnection.STATUS_ACTIVE
+        connection.disabled_reason = ""
+        connection.save(update_fields=["status", "disabled_reason", "updated_at"])
+        invalidate_portfolio_summary(connection.user_id)
+    elif event_type == "ACCOUNT_REMOVED" and account_id:
+        InvestmentAccount.objects.filter(connection=connection, provider_account_id=account_id).update(is_active=False)
+        invalidate_portfolio_summary(connection.user_id)
+
+    if event_type in ACCOUNT_RESYNC_EVENTS and account_id:
+        enqueue_resync(connection.id, account_id)
+    elif event_type in ACCOUNT_RESYNC_EVENTS or event_type in CONNECTION_RESYNC_EVENTS:
+        enqueue_resync(connection.id)
+    return event
+
+
+def process_resync(connection_id: int, account_id: str = "") -> dict[str, Any] | None:
+    """Run one coalesced resync and mark the events it covers as processed."""
+    connection = SnapTradeConnection.objects.filter(pk=connection_id).first()
+    if connection is None:
+        return None
+    events = SnapTradeWebhookEvent.objects.filter(connection=connection, processed_at__isnull=True)
+    if account_id:
+        events = events.filter(provider_account_id=account_id)
+    # Captured before syncing so events arriving mid-sync are handled by the next run
+    covered = list(events.values_list("id", flat=True))
+
+    try:
+        result = sync_connection_investments(connection, account_ids=[account_id] if account_id else None)
+    except SnapTradeError as exc:
+        connection.status = SnapTradeConnection.STATUS_BROKEN
+        connection.disabled_reason = str(exc)
+        connection.save(update_fields=["status", "disabled_reason", "updated_at"])
+        invalidate_portfolio_summary(connection.user_id)
+        SnapTradeWebhookEvent.objects.filter(id__in=covered).update(processed_at=timezone.now(), error=str(exc))
+        return None
+    SnapTradeWebhookEvent.objects.filter(id__in=covered).update(processed_at=timezone.now())
+    return result
+
+
+def _run_worker():
+    while True:
+        key, due_at = _resync_queue.get()
+        try:
+            # Keys are queued in due order, so a burst across many accounts
+            # waits one window in total rather than one window per key
+            time.sleep(max(0.0, due_at - time.monotonic()))
+            with _pending_lock:
+                _pending.discard(key)
+            close_old_connections()
+            process_resync(*key)
+        except Exception as e:
+            print(f"Investment resync failed for {key}: {e}")
+        finally:
+            close_old_connections()
+            _resync_queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="investment-resync", daemon=True)
+            _worker.start()
+
+
+def enqueue_resync(connection_id: int, account_id: str = "") -> None:
+    """
+    Queue a background resync once the current DB transaction commits. It
+    runs RESYNC_COALESCE_SECONDS after being queued; a resync already waiting
+    for the same account, or for the whole connection, absorbs the request.
+
+    Coalescing is per process: under several gunicorn workers, webhooks for
+    the same account that land on different workers each queue a resync.
+    """
+
+    def _publish():
+        key = (connection_id, account_id)
+        with _pending_lock:
+            if key in _pending or (connection_id, "") in _pending:
+                return
+            _pending.add(key)
+        _ensure_worker()
+        _resync_queue.put((key, time.monotonic() + RESYNC_COALESCE_SECONDS))
+
+    db_transaction.on_commit(_publish)
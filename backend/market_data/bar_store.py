@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+from django.conf import settings
+
+from .indicators import PriceSeries
+
+
+COLUMNS = ("date", "open", "high", "low", "close", "volume")
+META_FILE = "meta.json"
+
+
+@dataclass
+class BarColumns:
+    """Memory-mapped daily bar columns for one (symbol, provider), oldest first."""
+
+    symbol: str
+    provider: str
+    date: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.date)
+
+    def dates(self) -> list[date]:
+        return self.date.astype(object).tolist()
+
+    def price_series(self) -> PriceSeries:
+        valid = ~np.isnan(self.close)
+        close = np.asarray(self.close[valid])
+        high = np.asarray(self.high[valid])
+        low = np.asarray(self.low[valid])
+        return PriceSeries(
+            dates=self.date[valid].astype(object).tolist(),
+            open=np.asarray(self.open[valid]),
+            high=np.where(np.isnan(high), close, high),
+            low=np.where(np.isnan(low), close, low),
+            close=close,
+        )
+
+
+def store_root() -> Path | None:
+    root = getattr(settings, "MARKET_DATA_DIR", None)
+    return Path(root) if root else None
+
+
+def _symbol_dir(symbol: str, provider: str) -> Path | None:
+    root = store_root()
+    if root is None:
+        return None
+    safe_symbol = re.sub(r"[^A-Z0-9._-]", "_", symbol.upper())
+    safe_provider = re.sub(r"[^a-z0-9._-]", "_", (provider or "yfinance").lower())
+    return root / safe_provider / safe_symbol
+
+
+def _float_column(values: Iterable) -> np.ndarray:
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+
+
+def _atomic_save(path: Path, array: np.ndarray) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            np.save(handle, array, allow_pickle=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def write_bars(symbol: str, provider: str, rows: list[tuple]) -> bool:
+    """
+    Replace the stored columns for a symbol with (date, open, high, low,
+    close, volume) rows sorted by date. Returns False when no store is
+    configured or it cannot be written; the DB stays the source of truth.
+    """
+    directory = _symbol_dir(symbol, provider)
+    if directory is None:
+        return False
+    ordered = sorted(rows, key=lambda row: row[0])
+    arrays = {
+        "date": np.array([row[0] for row in ordered], dtype="datetime64[D]"),
+        "open": _float_column(row[1] for row in ordered),
+        "high": _float_column(row[2] for row in ordered),
+        "low": _float_column(row[3] for row in ordered),
+        "close": _float_column(row[4] for row in ordered),
+        "volume": _float_column(row[5] for row in ordered),
+    }
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        for column in COLUMNS:
+            _atomic_save(directory / f"{column}.npy", arrays[column])
+        # Written last: readers only trust columns whose length matches it
+        meta = {
+            "rows": len(ordered),
+            "last_date": ordered[-1][0].isoformat() if ordered else None,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as handle:
+            json.dump(meta, handle)
+        os.replace(tmp_path, directory / META_FILE)
+    except OSError:
+        return False
+    return True
+
+
+def load_bars(symbol: str, provider: str = "yfinance") -> BarColumns | None:
+    """Memory-map a symbol's columns, or return None if absent or mid-write."""
+    directory = _symbol_dir(symbol, provider)
+    if directory is None:
+        return None
+    try:
+        with open(directory / META_FILE) as handle:
+            expected_rows = json.load(handle)["rows"]
+        columns = {
+            column: np.load(directory / f"{column}.npy", mmap_mode="r", allow_pickle=False)
+            for column in COLUMNS
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+    if any(len(array) != expected_rows for array in columns.values()):
+        return None
+    return BarColumns(symbol=symbol.upper(), provider=provider, **columns)
+
+
+def _price_string(value: float) -> str | None:
+    return None if np.isnan(value) else f"{value:.6f}"
+
+
+def history_payload(columns: BarColumns, limit: int) -> list[dict]:
+    """Newest-first bars shaped like MarketDailyBarSerializer output."""
+    count = min(max(limit, 0), len(columns))
+    start = len(columns) - count
+    sliced = {column: getattr(columns, column)[start:][::-1] for column in COLUMNS}
+    return [
+        {
+            "symbol": columns.symbol,
+            "date": str(sliced["date"][index]),
+            "provider": columns.provider,
+            "open": _price_string(sliced["open"][index]),
+            "high": _price_string(sliced["high"][index]),
+            "low": _price_string(sliced["low"][index]),
+            "close": _price_string(sliced["close"][index]),
+            "volume": None if np.isnan(sliced["volume"][index]) else int(sliced["volume"][index]),
+        }
+        for index in range(count)
+    ]
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Iterable
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+@dataclass
+class PriceSeries:
+    """Daily OHLC columns for one symbol as float64 arrays, oldest first."""
+
+    dates: list[date]
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+
+def _column(values: Iterable[Any]) -> np.ndarray:
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+
+
+def price_series_from_rows(rows: Iterable[tuple]) -> PriceSeries:
+    """
+    Build a PriceSeries from (date, open, high, low, close) rows. Rows without
+    a close are dropped; missing highs/lows fall back to the close.
+    """
+    ordered = sorted((row for row in rows if row[4] is not None), key=lambda row: row[0])
+    close = _column(row[4] for row in ordered)
+    high = _column(row[2] for row in ordered)
+    low = _column(row[3] for row in ordered)
+    return PriceSeries(
+        dates=[row[0] for row in ordered],
+        open=_column(row[1] for row in ordered),
+        high=np.where(np.isnan(high), close, high),
+        low=np.where(np.isnan(low), close, low),
+        close=close,
+    )
+
+
+def pct_change(values: np.ndarray, periods: int) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    if len(values) > periods:
+        prior = values[:-periods]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[periods:] = np.where(prior != 0, (values[periods:] - prior) / prior * 100.0, np.nan)
+    return out
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        cumulative = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+    return out
+
+
+def _recursive_smooth(values: np.ndarray, alpha: float, window: int) -> np.ndarray:
+    # y[t] = y[t-1] + alpha * (x[t] - y[t-1]), seeded with the SMA of the first
+    # window. The recurrence is inherently sequential, so it is a single tight
+    # float pass rather than a numpy expression.
+    out = np.full(values.shape, np.nan)
+    if len(values) < window:
+        return out
+    previous = float(np.mean(values[:window]))
+    out[window - 1] = previous
+    for index in range(window, len(values)):
+        previous += alpha * (values[index] - previous)
+        out[index] = previous
+    return out
+
+
+def ema(values: np.ndarray, window: int) -> np.ndarray:
+    return _recursive_smooth(values, 2.0 / (window + 1), window)
+
+
+def wilder(values: np.ndarray, window: int) -> np.ndarray:
+    return _recursive_smooth(values, 1.0 / window, window)
+
+
+def rsi(close: np.ndarray, window: int = 14) -> np.ndarray:
+    """Wilder RSI; the first value lands on index `window`."""
+    out = np.full(close.shape, np.nan)
+    if len(close) <= window:
+        return out
+    changes = np.diff(close)
+    avg_gain = wilder(np.clip(changes, 0, None), window)
+    avg_loss = wilder(np.clip(-changes, 0, None), window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        values = 100.0 - 100.0 / (1.0 + rs)
+    values = np.where(avg_loss == 0, np.where(avg_gain > 0, 100.0, np.nan), values)
+    out[1:] = values
+    return out
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    out = np.full(close.shape, np.nan)
+    if len(close) <= window:
+        return out
+    previous_close = close[:-1]
+    true_range = np.maximum.reduce([
+        high[1:] - low[1:],
+        np.abs(high[1:] - previous_close),
+        np.abs(low[1:] - previous_close),
+    ])
+    out[1:] = wilder(true_range, window)
+    return out
+
+
+def drawdown(close: np.ndarray) -> np.ndarray:
+    """Percent below the running peak close (0 at a new high, negative otherwise)."""
+    if not len(close):
+        return close.copy()
+    peak = np.maximum.accumulate(close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(peak != 0, (close / peak - 1.0) * 100.0, np.nan)
+
+
+def rolling_volatility(close: np.ndarray, window: int = 20) -> np.ndarray:
+    """Annualized sample stdev of daily returns over the trailing window, in percent."""
+    out = np.full(close.shape, np.nan)
+    if len(close) <= window:
+        return out
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(close) / close[:-1]
+    windows = sliding_window_view(returns, window)
+    out[window:] = np.std(windows, axis=1, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR) * 100.0
+    return out
+
+
+def compute_indicators(series: PriceSeries) -> dict[str, np.ndarray]:
+    """Every indicator for every date of the series, aligned with series.dates."""
+    close = series.close
+    return {
+        "latest_close": close,
+        "return_1d_percent": pct_change(close, 1),
+        "return_5d_percent": pct_change(close, 5),
+        "return_1m_percent": pct_change(close, 21),
+        "volatility_20d_percent": rolling_volatility(close, 20),
+        "moving_average_20d": sma(close, 20),
+        "moving_average_50d": sma(close, 50),
+        "ema_20": ema(close, 20),
+        "rsi_14": rsi(close, 14),
+        "atr_14": atr(series.high, series.low, close, 14),
+        "drawdown_percent": drawdown(close),
+    }
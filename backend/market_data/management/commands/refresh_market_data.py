@@ -2,7 +2,13 @@ import json
 
 from django.core.management.base import BaseCommand, CommandError
 
-from market_data.services import DEFAULT_TRACKED_SYMBOLS, MarketDataError, refresh_market_data
+from market_data.services import (
+    DEFAULT_TRACKED_SYMBOLS,
+    MAX_FETCH_WORKERS,
+    MarketDataError,
+    backfill_metric_snapshots,
+    refresh_market_data,
+)
 
 
 class Command(BaseCommand):
@@ -15,13 +21,34 @@ class Command(BaseCommand):
             help="Comma-separated symbols to refresh.",
         )
         parser.add_argument("--provider", default="yfinance")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=MAX_FETCH_WORKERS,
+            help="Maximum number of symbols fetched concurrently.",
+        )
+        parser.add_argument(
+            "--backfill-metrics",
+            action="store_true",
+            help="Recompute metric snapshots for every stored bar date, not only the latest.",
+        )
 
     def handle(self, *args, **options):
         symbols = [symbol.strip().upper() for symbol in options["symbols"].split(",") if symbol.strip()]
         try:
-            result = refresh_market_data(symbols=symbols, provider=options["provider"])
+            result = refresh_market_data(
+                symbols=symbols,
+                provider=options["provider"],
+                max_workers=options["workers"],
+            )
         except MarketDataError as exc:
             raise CommandError(str(exc)) from exc
+        if options["backfill_metrics"]:
+            result["backfilled_snapshots"] = {
+                symbol: backfill_metric_snapshots(symbol, provider=options["provider"])
+                for symbol in symbols
+                if symbol not in result.get("errors", {})
+            }
         output = json.dumps(result, indent=2, sort_keys=True)
         if result.get("errors"):
             raise CommandError(output)
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-19 00:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_data', '0003_replace_qqqm_with_schg'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketmetricsnapshot',
+            name='atr_14',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=18, null=True),
+        ),
+        migrations.AddField(
+            model_name='marketmetricsnapshot',
+            name='drawdown_percent',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='marketmetricsnapshot',
+            name='ema_20',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=18, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+
+DEFAULT_TRACKED_SYMBOLS = {
+    "SCHG": Decimal("24.5455"),
+    "SCHD": Decimal("20.4545"),
+    "VXUS": Decimal("16.3636"),
+    "VB": Decimal("20.4545"),
+    "BTC-USD": Decimal("9.0909"),
+    "ETH-USD": Decimal("4.5455"),
+    "SOL-USD": Decimal("4.5455"),
+}
+
+
+def seed_default_symbols(apps, schema_editor):
+    # The summary endpoint no longer seeds on every GET, so seed once here.
+    TrackedSymbol = apps.get_model("market_data", "TrackedSymbol")
+    for symbol, weight in DEFAULT_TRACKED_SYMBOLS.items():
+        TrackedSymbol.objects.update_or_create(
+            symbol=symbol,
+            defaults={
+                "asset_type": "crypto" if symbol.endswith("-USD") else "etf",
+                "provider": "yfinance",
+                "target_weight_percent": weight,
+                "active": True,
+            },
+        )
+    TrackedSymbol.objects.filter(symbol="QQQM").update(active=False, target_weight_percent=None)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("market_data", "0004_metric_snapshot_indicators"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_default_symbols, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 01:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market_data', '0005_seed_default_symbols'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketnewsarticle',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -55,7 +55,10 @@ class MarketMetricSnapshot(models.Model):
     volatility_20d_percent = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
     moving_average_20d = models.DecimalField(max_digits=18, decimal_places=6, null=True, blank=True)
     moving_average_50d = models.DecimalField(max_digits=18, decimal_places=6, null=True, blank=True)
+    ema_20 = models.DecimalField(max_digits=18, decimal_places=6, null=True, blank=True)
     rsi_14 = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
+    atr_14 = models.DecimalField(max_digits=18, decimal_places=6, null=True, blank=True)
+    drawdown_percent = models.DecimalField(max_digits=12, decimal_places=6, null=True, blank=True)
     raw = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -82,6 +85,7 @@ class MarketNewsArticle(models.Model):
     thumbnail_url = models.URLField(max_length=1000, blank=True, default="")
     published_at = models.DateTimeField(null=True, blank=True)
     raw = models.JSONField(default=dict, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
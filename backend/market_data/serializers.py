@@ -47,7 +47,10 @@ class MarketMetricSnapshotSerializer(serializers.ModelSerializer):
             "volatility_20d_percent",
             "moving_average_20d",
             "moving_average_50d",
+            "ema_20",
             "rsi_14",
+            "atr_14",
+            "drawdown_percent",
             "updated_at",
         ]
 
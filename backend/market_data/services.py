@@ -1,15 +1,24 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import math
-import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from datetime import date, datetime, timezone
 from decimal import Decimal
 from typing import Any, Iterable
 
+from django.core.cache import cache
+from django.db.models import F, Max, Window
+from django.db.models.functions import RowNumber
 from django.utils.dateparse import parse_date, parse_datetime
 
+from .bar_store import load_bars, write_bars
+from .indicators import PriceSeries, compute_indicators, price_series_from_rows
 from .models import MarketDailyBar, MarketMetricSnapshot, MarketNewsArticle, TrackedSymbol
+from .serializers import MarketMetricSnapshotSerializer, MarketNewsArticleSerializer, TrackedSymbolSerializer
 
 
 DEFAULT_TRACKED_SYMBOLS = {
@@ -22,6 +31,18 @@ DEFAULT_TRACKED_SYMBOLS = {
     "SOL-USD": Decimal("4.5455"),
 }
 
+# Upper bound on concurrent provider requests during a refresh.
+MAX_FETCH_WORKERS = 8
+
+# Newest articles kept per (symbol, provider); older ones are pruned on refresh.
+NEWS_RETENTION_PER_SYMBOL = 50
+
+MARKET_SUMMARY_CACHE_KEY = "market_data:summary"
+# Refreshes invalidate the summary explicitly; the timeout bounds staleness
+# from any write that does not.
+MARKET_SUMMARY_CACHE_TIMEOUT = 15 * 60
+SUMMARY_NEWS_PER_SYMBOL = 3
+
 
 class MarketDataError(Exception):
     pass
@@ -168,6 +189,9 @@ class YFinanceMarketDataClient:
             kwargs = {"start": start_date, "interval": "1d", "auto_adjust": False}
         history = yf.Ticker(symbol).history(**kwargs)
         if getattr(history, "empty", False):
+            if start_date:
+                # Nothing new since the watermark (weekend, holiday, ...)
+                return []
             raise MarketDataError(f"No yfinance price history returned for {symbol}.")
         return normalize_daily_bars(symbol, history.reset_index().to_dict("records"))
 
@@ -252,69 +276,335 @@ def seed_default_symbols() -> list[TrackedSymbol]:
         )
         tracked.append(obj)
     TrackedSymbol.objects.filter(symbol="QQQM").update(active=False, target_weight_percent=None)
+    invalidate_market_summary()
     return tracked
 
 
-def _percent_change(latest: Decimal | None, prior: Decimal | None) -> Decimal | None:
-    if latest in (None, Decimal("0")) or prior in (None, Decimal("0")):
+def invalidate_market_summary() -> None:
+    cache.delete(MARKET_SUMMARY_CACHE_KEY)
+
+
+def build_market_summary() -> dict[str, Any]:
+    """
+    Latest metric snapshot and top news for every active symbol using two
+    window-function queries, independent of how many symbols are tracked.
+    """
+    tracked = list(TrackedSymbol.objects.filter(active=True).order_by("symbol"))
+    symbols = [tracked_symbol.symbol for tracked_symbol in tracked]
+
+    latest_metrics = MarketMetricSnapshot.objects.filter(symbol__in=symbols).annotate(
+        rank=Window(
+            expression=RowNumber(),
+            partition_by=[F("symbol"), F("provider")],
+            order_by=F("as_of").desc(),
+        )
+    ).filter(rank=1)
+    metrics_by_key = {(metric.symbol, metric.provider): metric for metric in latest_metrics}
+
+    top_news = MarketNewsArticle.objects.filter(symbol__in=symbols).annotate(
+        rank=Window(
+            expression=RowNumber(),
+            partition_by=[F("symbol"), F("provider")],
+            order_by=[F("published_at").desc(nulls_last=True), F("updated_at").desc()],
+        )
+    ).filter(rank__lte=SUMMARY_NEWS_PER_SYMBOL).order_by("symbol", "provider", "rank")
+    news_by_key: dict[tuple[str, str], list[MarketNewsArticle]] = {}
+    for article in top_news:
+        news_by_key.setdefault((article.symbol, article.provider), []).append(article)
+
+    symbols_data = []
+    for tracked_symbol in tracked:
+        key = (tracked_symbol.symbol, tracked_symbol.provider or "yfinance")
+        metric = metrics_by_key.get(key)
+        symbols_data.append({
+            "symbol": TrackedSymbolSerializer(tracked_symbol).data,
+            "metrics": MarketMetricSnapshotSerializer(metric).data if metric else None,
+            "news": MarketNewsArticleSerializer(news_by_key.get(key, []), many=True).data,
+        })
+    return {"symbols": symbols_data}
+
+
+def get_market_summary() -> dict[str, Any]:
+    """Cached market summary; invalidated by refreshes and symbol seeding."""
+    summary = cache.get(MARKET_SUMMARY_CACHE_KEY)
+    if summary is None:
+        summary = build_market_summary()
+        cache.set(MARKET_SUMMARY_CACHE_KEY, summary, MARKET_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+METRIC_FIELDS = [
+    "latest_close",
+    "return_1d_percent",
+    "return_5d_percent",
+    "return_1m_percent",
+    "volatility_20d_percent",
+    "moving_average_20d",
+    "moving_average_50d",
+    "ema_20",
+    "rsi_14",
+    "atr_14",
+    "drawdown_percent",
+]
+
+
+def _metric_decimal(value: float) -> Decimal | None:
+    if value is None or math.isnan(value) or math.isinf(value):
         return None
-    return ((latest - prior) / prior) * Decimal("100")
+    return Decimal(f"{value:.6f}")
 
 
-def _average(values: list[Decimal]) -> Decimal | None:
-    return sum(values) / Decimal(len(values)) if values else None
+def _metric_values(indicators: dict[str, Any], index: int) -> dict[str, Decimal | None]:
+    return {field: _metric_decimal(float(indicators[field][index])) for field in METRIC_FIELDS}
 
 
-def _rsi(closes: list[Decimal], periods: int = 14) -> Decimal | None:
-    if len(closes) <= periods:
-        return None
-    changes = [closes[i] - closes[i - 1] for i in range(1, len(closes))]
-    recent = changes[-periods:]
-    gains = [change for change in recent if change > 0]
-    losses = [-change for change in recent if change < 0]
-    avg_gain = _average(gains) or Decimal("0")
-    avg_loss = _average(losses) or Decimal("0")
-    if avg_loss == 0:
-        return Decimal("100") if avg_gain > 0 else None
-    rs = avg_gain / avg_loss
-    return Decimal("100") - (Decimal("100") / (Decimal("1") + rs))
-
-
-def compute_metric_snapshot(symbol: str, bars: list[MarketDailyBar], provider: str = "yfinance") -> MarketMetricSnapshot | None:
-    ordered = sorted([bar for bar in bars if bar.close is not None], key=lambda bar: bar.date)
-    if not ordered:
+def _bar_rows(bars: Iterable[MarketDailyBar]) -> list[tuple]:
+    return [(bar.date, bar.open, bar.high, bar.low, bar.close) for bar in bars]
+
+
+def _stored_bar_rows(symbol: str, provider: str) -> list[tuple]:
+    return list(
+        MarketDailyBar.objects.filter(symbol=symbol.upper(), provider=provider)
+        .order_by("date")
+        .values_list("date", "open", "high", "low", "close", "volume")
+    )
+
+
+def load_price_series(symbol: str, provider: str = "yfinance") -> PriceSeries:
+    """Price series from the columnar bar store, falling back to the DB."""
+    columns = load_bars(symbol, provider)
+    if columns is not None:
+        return columns.price_series()
+    return price_series_from_rows(_stored_bar_rows(symbol, provider))
+
+
+def compute_metric_snapshot(symbol: str, bars: list[MarketDailyBar] | list[tuple], provider: str = "yfinance") -> MarketMetricSnapshot | None:
+    rows = bars if bars and isinstance(bars[0], tuple) else _bar_rows(bars)
+    series = price_series_from_rows(rows)
+    if not len(series):
         return None
-    closes = [bar.close for bar in ordered if bar.close is not None]
-    latest = ordered[-1]
-    daily_returns = [
-        float((closes[i] - closes[i - 1]) / closes[i - 1])
-        for i in range(1, len(closes))
-        if closes[i - 1] not in (None, Decimal("0"))
-    ]
-    volatility = None
-    if len(daily_returns) >= 20:
-        volatility = Decimal(str(statistics.stdev(daily_returns[-20:]) * math.sqrt(252) * 100))
+    indicators = compute_indicators(series)
+    latest = len(series) - 1
 
     snapshot, _ = MarketMetricSnapshot.objects.update_or_create(
         symbol=symbol.upper(),
-        as_of=latest.date,
+        as_of=series.dates[latest],
         provider=provider,
         defaults={
-            "latest_close": latest.close,
-            "return_1d_percent": _percent_change(closes[-1], closes[-2] if len(closes) >= 2 else None),
-            "return_5d_percent": _percent_change(closes[-1], closes[-6] if len(closes) >= 6 else None),
-            "return_1m_percent": _percent_change(closes[-1], closes[-22] if len(closes) >= 22 else None),
-            "volatility_20d_percent": volatility,
-            "moving_average_20d": _average(closes[-20:]) if len(closes) >= 20 else None,
-            "moving_average_50d": _average(closes[-50:]) if len(closes) >= 50 else None,
-            "rsi_14": _rsi(closes),
-            "raw": {"bar_count": len(ordered)},
+            **_metric_values(indicators, latest),
+            "raw": {"bar_count": len(series)},
         },
     )
     return snapshot
 
 
-def refresh_market_data(symbols: list[str] | None = None, provider: str = "yfinance", client: YFinanceMarketDataClient | None = None) -> dict[str, Any]:
+def backfill_metric_snapshots(symbol: str, provider: str = "yfinance") -> int:
+    """
+    Compute and upsert a snapshot for every stored bar date of a symbol in
+    one pass over its price series.
+    """
+    series = load_price_series(symbol, provider)
+    if not len(series):
+        return 0
+    indicators = compute_indicators(series)
+    snapshots = [
+        MarketMetricSnapshot(
+            symbol=symbol.upper(),
+            as_of=series.dates[index],
+            provider=provider,
+            raw={"bar_count": index + 1},
+            **_metric_values(indicators, index),
+        )
+        for index in range(len(series))
+    ]
+    MarketMetricSnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=["symbol", "as_of", "provider"],
+        update_fields=[*METRIC_FIELDS, "raw", "updated_at"],
+        batch_size=500,
+    )
+    return len(snapshots)
+
+
+def latest_bar_dates(symbols: list[str], provider: str = "yfinance") -> dict[str, date]:
+    """Latest stored bar date per symbol, in one grouped query."""
+    return dict(
+        MarketDailyBar.objects.filter(symbol__in=[symbol.upper() for symbol in symbols], provider=provider)
+        .values("symbol")
+        .annotate(latest=Max("date"))
+        .values_list("symbol", "latest")
+    )
+
+
+def latest_bar_date(symbol: str, provider: str = "yfinance") -> date | None:
+    return latest_bar_dates([symbol], provider).get(symbol.upper())
+
+
+def _daily_bar_rows(symbol: str, bars: list[DailyBar], provider: str = "yfinance") -> list[MarketDailyBar]:
+    return [
+        MarketDailyBar(
+            symbol=symbol.upper(),
+            date=bar.date,
+            provider=provider,
+            open=bar.open,
+            high=bar.high,
+            low=bar.low,
+            close=bar.close,
+            volume=bar.volume,
+            raw=bar.raw or {},
+        )
+        for bar in bars
+    ]
+
+
+def _write_daily_bar_rows(rows: list[MarketDailyBar]) -> int:
+    if not rows:
+        return 0
+    MarketDailyBar.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["symbol", "date", "provider"],
+        update_fields=["open", "high", "low", "close", "volume", "raw", "updated_at"],
+        batch_size=500,
+    )
+    return len(rows)
+
+
+def upsert_daily_bars(symbol: str, bars: list[DailyBar], provider: str = "yfinance") -> int:
+    return _write_daily_bar_rows(_daily_bar_rows(symbol, bars, provider))
+
+
+NEWS_HASH_FIELDS = ("title", "publisher", "summary", "thumbnail_url", "published_at", "raw")
+
+
+def news_content_hash(article: NewsArticle) -> str:
+    payload = {
+        "title": article.title,
+        "publisher": article.publisher,
+        "summary": article.summary,
+        "thumbnail_url": article.thumbnail_url,
+        "published_at": article.published_at.isoformat() if article.published_at else None,
+        "raw": article.raw or {},
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def upsert_news_articles(symbol: str, articles: list[NewsArticle], provider: str = "yfinance") -> int:
+    """
+    Write new or changed articles in one bulk upsert. Articles whose content
+    hash matches the stored row are skipped. Returns the number written.
+    """
+    by_url: dict[str, tuple[NewsArticle, str]] = {}
+    for article in articles:
+        by_url[article.url] = (article, news_content_hash(article))
+    if not by_url:
+        return 0
+
+    stored_hashes = dict(
+        MarketNewsArticle.objects.filter(symbol=symbol, provider=provider, url__in=list(by_url))
+        .values_list("url", "content_hash")
+    )
+    rows = [
+        MarketNewsArticle(
+            symbol=symbol,
+            url=url,
+            provider=provider,
+            title=article.title,
+            publisher=article.publisher,
+            summary=article.summary,
+            thumbnail_url=article.thumbnail_url,
+            published_at=article.published_at,
+            raw=article.raw or {},
+            content_hash=content_hash,
+        )
+        for url, (article, content_hash) in by_url.items()
+        if stored_hashes.get(url) != content_hash
+    ]
+    if rows:
+        MarketNewsArticle.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["symbol", "url", "provider"],
+            update_fields=[*NEWS_HASH_FIELDS, "content_hash", "updated_at"],
+        )
+    return len(rows)
+
+
+def prune_news_articles(symbol: str, provider: str = "yfinance", keep: int = NEWS_RETENTION_PER_SYMBOL) -> int:
+    """Delete all but the newest `keep` articles for a symbol."""
+    stale_ids = list(
+        MarketNewsArticle.objects.filter(symbol=symbol, provider=provider)
+        .order_by(F("published_at").desc(nulls_last=True), "-updated_at", "-id")
+        .values_list("id", flat=True)[keep:]
+    )
+    if not stale_ids:
+        return 0
+    deleted, _ = MarketNewsArticle.objects.filter(id__in=stale_ids).delete()
+    return deleted
+
+
+@dataclass
+class SymbolFetch:
+    symbol: str
+    bars: list[DailyBar]
+    news: list[NewsArticle]
+    news_error: Exception | None
+    fetch_seconds: float
+
+
+def _fetch_symbol(market_client: YFinanceMarketDataClient, symbol: str, watermark: date | None) -> SymbolFetch:
+    """Network-only work for one symbol; runs on a pool thread and never touches the DB."""
+    started = time.perf_counter()
+    if watermark:
+        # Re-fetch from the last stored day so a partial bar gets finalized
+        bars = market_client.fetch_daily_history(symbol, start_date=watermark.isoformat())
+        bars = [bar for bar in bars if bar.date >= watermark]
+    else:
+        bars = market_client.fetch_daily_history(symbol)
+    news: list[NewsArticle] = []
+    news_error = None
+    try:
+        news = market_client.fetch_news(symbol)
+    except Exception as exc:
+        news_error = exc
+    return SymbolFetch(symbol, bars, news, news_error, time.perf_counter() - started)
+
+
+def _store_symbol(fetched: SymbolFetch, provider: str) -> dict[str, Any]:
+    symbol = fetched.symbol
+    started = time.perf_counter()
+    rows = _daily_bar_rows(symbol, fetched.bars, provider)
+    parsed = time.perf_counter()
+
+    _write_daily_bar_rows(rows)
+    stored_rows = _stored_bar_rows(symbol, provider)
+    write_bars(symbol, provider, stored_rows)
+    snapshot = compute_metric_snapshot(symbol, stored_rows, provider=provider)
+    news_written = upsert_news_articles(symbol, fetched.news, provider)
+    prune_news_articles(symbol, provider)
+    written = time.perf_counter()
+
+    return {
+        "bars": len(fetched.bars),
+        "news": len(fetched.news),
+        "news_written": news_written,
+        "as_of": snapshot.as_of.isoformat() if snapshot else None,
+        "timings": {
+            "fetch_seconds": round(fetched.fetch_seconds, 4),
+            "parse_seconds": round(parsed - started, 4),
+            "write_seconds": round(written - parsed, 4),
+        },
+    }
+
+
+def refresh_market_data(
+    symbols: list[str] | None = None,
+    provider: str = "yfinance",
+    client: YFinanceMarketDataClient | None = None,
+    max_workers: int = MAX_FETCH_WORKERS,
+) -> dict[str, Any]:
     if not symbols:
         seed_default_symbols()
         symbols = list(DEFAULT_TRACKED_SYMBOLS.keys())
@@ -322,46 +612,24 @@ def refresh_market_data(symbols: list[str] | None = None, provider: str = "yfina
     market_client = client or YFinanceMarketDataClient(provider=provider)
 
     refreshed: dict[str, Any] = {"symbols": {}, "errors": {}}
-    for symbol in normalized_symbols:
-        try:
-            bars = market_client.fetch_daily_history(symbol)
-            for bar in bars:
-                MarketDailyBar.objects.update_or_create(
-                    symbol=symbol,
-                    date=bar.date,
-                    provider=provider,
-                    defaults={
-                        "open": bar.open,
-                        "high": bar.high,
-                        "low": bar.low,
-                        "close": bar.close,
-                        "volume": bar.volume,
-                        "raw": bar.raw or {},
-                    },
-                )
-            stored_bars = list(MarketDailyBar.objects.filter(symbol=symbol, provider=provider).order_by("date"))
-            snapshot = compute_metric_snapshot(symbol, stored_bars, provider=provider)
-            news_count = 0
-            for article in market_client.fetch_news(symbol):
-                MarketNewsArticle.objects.update_or_create(
-                    symbol=symbol,
-                    url=article.url,
-                    provider=provider,
-                    defaults={
-                        "title": article.title,
-                        "publisher": article.publisher,
-                        "summary": article.summary,
-                        "thumbnail_url": article.thumbnail_url,
-                        "published_at": article.published_at,
-                        "raw": article.raw or {},
-                    },
-                )
-                news_count += 1
-            refreshed["symbols"][symbol] = {
-                "bars": len(bars),
-                "news": news_count,
-                "as_of": snapshot.as_of.isoformat() if snapshot else None,
-            }
-        except Exception as exc:
-            refreshed["errors"][symbol] = str(exc)
+    if not normalized_symbols:
+        return refreshed
+    watermarks = latest_bar_dates(normalized_symbols, provider)
+
+    # Provider calls run concurrently; DB writes stay on this thread as results arrive
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(normalized_symbols)))) as pool:
+        futures = {
+            pool.submit(_fetch_symbol, market_client, symbol, watermarks.get(symbol)): symbol
+            for symbol in normalized_symbols
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                fetched = future.result()
+                refreshed["symbols"][symbol] = _store_symbol(fetched, provider)
+                if fetched.news_error is not None:
+                    refreshed["errors"][symbol] = str(fetched.news_error)
+            except Exception as exc:
+                refreshed["errors"][symbol] = str(exc)
+    invalidate_market_summary()
     return refreshed
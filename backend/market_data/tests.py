@@ -1,18 +1,45 @@
+import statistics
+import tempfile
+import threading
+import time
 from datetime import date, timedelta
 from decimal import Decimal
 
-from django.test import TestCase
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
 from django.utils import timezone
 
 from .models import MarketDailyBar, MarketMetricSnapshot, MarketNewsArticle, TrackedSymbol
-from .services import DailyBar, NewsArticle, normalize_daily_bars, refresh_market_data, seed_default_symbols
+from .bar_store import load_bars
+from .indicators import atr, drawdown, ema, pct_change, rolling_volatility, rsi, sma
+from .services import (
+    DailyBar,
+    NewsArticle,
+    backfill_metric_snapshots,
+    normalize_daily_bars,
+    prune_news_articles,
+    refresh_market_data,
+    upsert_news_articles,
+    seed_default_symbols,
+)
+
+
+# Query-count assertions below should not count lookups in the shared DB cache
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
 
 
 class FakeMarketDataClient:
-    def fetch_daily_history(self, symbol):
+    def __init__(self, days=60):
+        self.days = days
+        self.history_calls = []
+
+    def fetch_daily_history(self, symbol, *, start_date=None):
+        self.history_calls.append((symbol, start_date))
         start = date(2026, 1, 1)
-        return [
+        bars = [
             DailyBar(
                 symbol=symbol,
                 date=start + timedelta(days=i),
@@ -22,8 +49,11 @@ class FakeMarketDataClient:
                 close=Decimal("100") + i,
                 volume=1000 + i,
             )
-            for i in range(60)
+            for i in range(self.days)
         ]
+        if start_date:
+            bars = [bar for bar in bars if bar.date.isoformat() >= start_date]
+        return bars
 
     def fetch_news(self, symbol):
         return [
@@ -39,6 +69,13 @@ class FakeMarketDataClient:
 
 
 class MarketDataTests(TestCase):
+    def setUp(self):
+        store = tempfile.TemporaryDirectory()
+        self.addCleanup(store.cleanup)
+        store_settings = override_settings(MARKET_DATA_DIR=store.name)
+        store_settings.enable()
+        self.addCleanup(store_settings.disable)
+
     def test_seed_default_symbols_creates_plan_symbols(self):
         TrackedSymbol.objects.create(symbol="QQQM", target_weight_percent=Decimal("27.0000"), active=True)
 
@@ -96,3 +133,148 @@ class MarketDataTests(TestCase):
         self.assertIsNotNone(metric.moving_average_20d)
         self.assertIsNotNone(metric.rsi_14)
         self.assertEqual(MarketNewsArticle.objects.filter(symbol="SCHG").count(), 1)
+
+    def test_refresh_market_data_fetches_only_bars_after_watermark(self):
+        refresh_market_data(symbols=["SCHG"], client=FakeMarketDataClient(days=60))
+
+        client = FakeMarketDataClient(days=63)
+        result = refresh_market_data(symbols=["SCHG"], client=client)
+
+        self.assertEqual(client.history_calls, [("SCHG", "2026-03-01")])
+        self.assertEqual(result["symbols"]["SCHG"]["bars"], 4)
+        self.assertEqual(MarketDailyBar.objects.filter(symbol="SCHG").count(), 63)
+        metric = MarketMetricSnapshot.objects.filter(symbol="SCHG").order_by("-as_of").first()
+        self.assertEqual(metric.as_of, date(2026, 3, 4))
+
+    def test_refresh_market_data_fetches_symbols_concurrently_and_isolates_errors(self):
+        class SlowClient(FakeMarketDataClient):
+            def __init__(self):
+                super().__init__(days=30)
+                self.active = 0
+                self.peak = 0
+                self.lock = threading.Lock()
+
+            def fetch_daily_history(self, symbol, *, start_date=None):
+                with self.lock:
+                    self.active += 1
+                    self.peak = max(self.peak, self.active)
+                time.sleep(0.05)
+                with self.lock:
+                    self.active -= 1
+                if symbol == "BAD":
+                    raise ValueError("provider down")
+                return super().fetch_daily_history(symbol, start_date=start_date)
+
+        client = SlowClient()
+        result = refresh_market_data(symbols=["SCHG", "SCHD", "VB", "BAD"], client=client, max_workers=4)
+
+        self.assertGreater(client.peak, 1)
+        self.assertEqual(result["errors"], {"BAD": "provider down"})
+        self.assertEqual(set(result["symbols"]), {"SCHG", "SCHD", "VB"})
+        self.assertEqual(
+            set(result["symbols"]["VB"]["timings"]),
+            {"fetch_seconds", "parse_seconds", "write_seconds"},
+        )
+        self.assertEqual(MarketDailyBar.objects.filter(symbol="SCHD").count(), 30)
+
+    def test_backfill_metric_snapshots_covers_every_bar_date(self):
+        refresh_market_data(symbols=["SCHG"], client=FakeMarketDataClient(days=60))
+
+        self.assertEqual(backfill_metric_snapshots("SCHG"), 60)
+
+        snapshots = MarketMetricSnapshot.objects.filter(symbol="SCHG").order_by("as_of")
+        self.assertEqual(snapshots.count(), 60)
+        self.assertIsNone(snapshots[0].return_1d_percent)
+        self.assertEqual(snapshots[19].moving_average_20d, Decimal("109.500000"))
+        self.assertIsNone(snapshots[18].moving_average_20d)
+        self.assertEqual(snapshots[59].drawdown_percent, Decimal("0.000000"))
+
+    def test_refresh_keeps_columnar_store_in_sync_with_history_endpoint(self):
+        refresh_market_data(symbols=["SCHG"], client=FakeMarketDataClient(days=60))
+        refresh_market_data(symbols=["SCHG"], client=FakeMarketDataClient(days=62))
+
+        columns = load_bars("SCHG")
+        self.assertEqual(len(columns), 62)
+        self.assertEqual(columns.close[-1], 161.0)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="markets", password="secret"))
+        from_store = client.get("/market/symbols/SCHG/history/", {"limit": 5}).json()["history"]
+        with override_settings(MARKET_DATA_DIR=""):
+            from_db = client.get("/market/symbols/SCHG/history/", {"limit": 5}).json()["history"]
+
+        self.assertEqual(from_store, from_db)
+        self.assertEqual(from_store[0]["date"], "2026-03-03")
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_summary_uses_constant_queries_and_is_cached_until_refresh(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username="summary", password="secret"))
+        refresh_market_data(symbols=["SCHG", "VB"], client=FakeMarketDataClient(days=30))
+
+        with self.assertNumQueries(3):
+            payload = client.get("/market/summary/").json()
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get("/market/summary/").json(), payload)
+
+        by_symbol = {row["symbol"]["symbol"]: row for row in payload["symbols"]}
+        self.assertEqual(by_symbol["SCHG"]["metrics"]["as_of"], "2026-01-30")
+        self.assertEqual(len(by_symbol["VB"]["news"]), 1)
+        self.assertIsNone(by_symbol["SCHD"]["metrics"])
+
+        refresh_market_data(symbols=["SCHG"], client=FakeMarketDataClient(days=31))
+        payload = client.get("/market/summary/").json()
+        by_symbol = {row["symbol"]["symbol"]: row for row in payload["symbols"]}
+        self.assertEqual(by_symbol["SCHG"]["metrics"]["as_of"], "2026-01-31")
+
+    def test_news_upsert_skips_unchanged_articles_and_prunes_old_ones(self):
+        published = timezone.now()
+
+        def article(index, summary="Market update."):
+            return NewsArticle(
+                symbol="SCHG",
+                title=f"Story {index}",
+                url=f"https://example.com/schg/{index}",
+                summary=summary,
+                published_at=published - timedelta(hours=index),
+            )
+
+        self.assertEqual(upsert_news_articles("SCHG", [article(0), article(1)]), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(upsert_news_articles("SCHG", [article(0), article(1)]), 0)
+        self.assertEqual(upsert_news_articles("SCHG", [article(0, "Revised."), article(1)]), 1)
+        self.assertEqual(MarketNewsArticle.objects.get(url__endswith="/0").summary, "Revised.")
+
+        upsert_news_articles("SCHG", [article(index) for index in range(2, 6)])
+        self.assertEqual(prune_news_articles("SCHG", keep=3), 3)
+        self.assertEqual(
+            sorted(MarketNewsArticle.objects.values_list("title", flat=True)),
+            ["Story 0", "Story 1", "Story 2"],
+        )
+
+
+class IndicatorTests(TestCase):
+    def setUp(self):
+        self.close = np.array([44.34, 44.09, 44.15, 43.61, 44.33, 44.83, 45.10, 45.42, 45.84, 46.08,
+                               45.89, 46.03, 45.61, 46.28, 46.28, 46.00, 46.03, 46.41, 46.22, 45.64,
+                               46.21, 46.25, 45.71, 46.45, 45.78, 45.35, 44.03, 44.18, 44.22, 44.57])
+
+    def test_moving_averages_and_returns_match_reference(self):
+        self.assertAlmostEqual(sma(self.close, 20)[-1], statistics.mean(self.close[-20:]))
+        self.assertTrue(np.isnan(sma(self.close, 20)[18]))
+        self.assertAlmostEqual(pct_change(self.close, 5)[-1], (44.57 / 45.78 - 1) * 100)
+        self.assertAlmostEqual(ema(self.close, 10)[9], statistics.mean(self.close[:10]))
+
+    def test_wilder_rsi_matches_textbook_value(self):
+        values = rsi(self.close, 14)
+        self.assertTrue(np.isnan(values[13]))
+        self.assertAlmostEqual(values[14], 70.46, places=1)
+        self.assertEqual(rsi(np.arange(1.0, 30.0), 14)[-1], 100.0)
+
+    def test_volatility_drawdown_and_atr(self):
+        returns = np.diff(self.close) / self.close[:-1]
+        expected = statistics.stdev(returns[-20:]) * (252 ** 0.5) * 100
+        self.assertAlmostEqual(rolling_volatility(self.close, 20)[-1], expected)
+        self.assertAlmostEqual(drawdown(self.close)[-1], (44.57 / 46.45 - 1) * 100)
+        flat = np.full(20, 10.0)
+        self.assertAlmostEqual(atr(flat + 1, flat - 1, flat, 14)[-1], 2.0)
@@ -2,6 +2,7 @@ from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 
+from .bar_store import history_payload, load_bars
 from .models import MarketDailyBar, MarketMetricSnapshot, MarketNewsArticle, TrackedSymbol
 from .serializers import (
     MarketDailyBarSerializer,
@@ -9,7 +10,7 @@ from .serializers import (
     MarketNewsArticleSerializer,
     TrackedSymbolSerializer,
 )
-from .services import refresh_market_data, seed_default_symbols
+from .services import get_market_summary, refresh_market_data, seed_default_symbols
 
 
 @api_view(["GET"])
@@ -26,6 +27,9 @@ def symbols(request):
 def symbol_history(request, symbol):
     limit = int(request.query_params.get("limit", "120"))
     provider = request.query_params.get("provider", "yfinance")
+    columns = load_bars(symbol, provider)
+    if columns is not None:
+        return JsonResponse({"history": history_payload(columns, limit)})
     queryset = MarketDailyBar.objects.filter(
         symbol=symbol.upper(),
         provider=provider,
@@ -59,24 +63,7 @@ def symbol_news(request, symbol):
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def summary(request):
-    seed_default_symbols()
-    tracked = TrackedSymbol.objects.filter(active=True).order_by("symbol")
-    symbols_data = []
-    for tracked_symbol in tracked:
-        metric = MarketMetricSnapshot.objects.filter(
-            symbol=tracked_symbol.symbol,
-            provider=tracked_symbol.provider or "yfinance",
-        ).order_by("-as_of").first()
-        news = MarketNewsArticle.objects.filter(
-            symbol=tracked_symbol.symbol,
-            provider=tracked_symbol.provider or "yfinance",
-        ).order_by("-published_at", "-updated_at")[:3]
-        symbols_data.append({
-            "symbol": TrackedSymbolSerializer(tracked_symbol).data,
-            "metrics": MarketMetricSnapshotSerializer(metric).data if metric else None,
-            "news": MarketNewsArticleSerializer(news, many=True).data,
-        })
-    return JsonResponse({"symbols": symbols_data})
+    return JsonResponse(get_market_summary())
 
 
 @api_view(["POST"])
@@ -3,6 +3,7 @@ from django.http import JsonResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from .models import PlaidConnection
+from reports.services import invalidate_user_reports
 import plaid
 from plaid.api import plaid_api
 from plaid.exceptions import ApiException
@@ -126,6 +127,7 @@ def exchange_public_token(request):
             stale_count = stale_connections.count()
             if stale_count:
                 stale_connections.delete()
+                invalidate_user_reports(request.user.id)
                 print(f"[Plaid] Removed {stale_count} stale connection(s) for institution_id={institution_id}")
 
         # Fetch and create accounts automatically
@@ -475,6 +477,8 @@ def sync_transactions(request):
             total_added += count_added
             total_modified += count_modified
             total_removed += count_removed
+            if count_removed:
+                invalidate_user_reports(user.id)
 
             cursors.append({
                 'item_id': connection.item_id,
@@ -10,6 +10,7 @@ from budgets.models import Budget
 from accounts.models import Account
 from alerts.models import Alert
 from categories.models import Category
+from reports.services import invalidate_user_reports
 
 # Initialize LLM
 llm = ChatOpenAI(model="gpt-4o", temperature=0, api_key=settings.OPENAI_API_KEY)
@@ -190,6 +191,7 @@ def delete_transaction(user_id: int, transaction_id: int):
         t.account.save()
 
         t.delete()
+        invalidate_user_reports(user_id)
         return f"Transaction {transaction_id} deleted."
     except Transaction.DoesNotExist:
         return "Transaction not found."
@@ -0,0 +1,72 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import ProcessedDocument
+from .utils import CategorizedItem, ReceiptMetadata
+
+METADATA_FIELDS = ("card_used", "subtotal", "tax", "tip", "discount", "fees")
+ITEM_FIELDS = (
+    "name",
+    "price",
+    "quantity",
+    "unit_price",
+    "clean_name",
+    "category",
+    "is_discount",
+    "is_tax",
+    "is_fee",
+)
+
+Extraction = Tuple[List[CategorizedItem], ReceiptMetadata, str, float, Optional[str]]
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_chunks(chunks: Iterable[bytes]) -> str:
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_document(digest: str) -> Optional[ProcessedDocument]:
+    if not digest:
+        return None
+    return ProcessedDocument.objects.filter(content_hash=digest).first()
+
+
+def store_document_text(digest: str, ocr_text: str, parser_used: str) -> None:
+    if digest and ocr_text.strip():
+        ProcessedDocument.objects.update_or_create(
+            content_hash=digest,
+            defaults={"ocr_text": ocr_text, "parser_used": parser_used},
+        )
+
+
+def store_receipt_extraction(digest: str, extraction: Extraction) -> None:
+    """Cache an OpenAI extraction. Empty results are not cached so they can be retried."""
+    items, metadata, merchant_name, total_amount, receipt_date_raw = extraction
+    if not digest or not items:
+        return
+    ProcessedDocument.objects.filter(content_hash=digest).update(
+        receipt_data={
+            "items": [{field: getattr(item, field) for field in ITEM_FIELDS} for item in items],
+            "metadata": {field: getattr(metadata, field) for field in METADATA_FIELDS},
+            "merchant_name": merchant_name,
+            "total_amount": total_amount,
+            "receipt_date": receipt_date_raw,
+        }
+    )
+
+
+def cached_receipt_extraction(document: Optional[ProcessedDocument]) -> Optional[Extraction]:
+    data: Optional[Dict] = document.receipt_data if document else None
+    if not data:
+        return None
+    metadata = ReceiptMetadata()
+    for field in METADATA_FIELDS:
+        setattr(metadata, field, data["metadata"].get(field))
+    items = [CategorizedItem(**{field: item.get(field) for field in ITEM_FIELDS if field in item}) for item in data["items"]]
+    return items, metadata, data["merchant_name"], data["total_amount"], data["receipt_date"]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-19 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0002_receiptitem_category_ref'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('ocr_text', models.TextField(blank=True, default='')),
+                ('parser_used', models.CharField(blank=True, default='', max_length=100)),
+                ('receipt_data', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
@@ -2,6 +2,16 @@ from django.db import models
 from django.contrib.auth.models import User
 
 
+class ReceiptBatch(models.Model):
+    """A group of receipts queued for processing together, for progress reporting."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="receipt_batches")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"ReceiptBatch {self.id} ({self.user.username})"
+
+
 class Receipt(models.Model):
     STATUS_PENDING = 0
     STATUS_PROCESSING = 1
@@ -17,6 +27,8 @@ class Receipt(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="receipts")
     image_path = models.CharField(max_length=512, null=True, blank=True)
+    # SHA-256 of the uploaded bytes; receipts with the same hash share one file
+    content_hash = models.CharField(max_length=64, blank=True, default="", db_index=True)
     ocr_text = models.TextField(null=True, blank=True)
     merchant_name = models.CharField(max_length=255, null=True, blank=True)
     total_amount = models.IntegerField(null=True, blank=True)  # cents
@@ -28,6 +40,13 @@ class Receipt(models.Model):
     processing_status = models.IntegerField(
         choices=STATUS_CHOICES, default=STATUS_PENDING
     )
+    batch = models.ForeignKey(
+        ReceiptBatch,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="receipts",
+    )
     transaction = models.OneToOneField(
         "transactions.Transaction",
         null=True,
@@ -60,3 +79,21 @@ class ReceiptItem(models.Model):
 
     def __str__(self) -> str:
         return f"{self.clean_name or self.name} ({self.receipt_id})"
+
+
+class ProcessedDocument(models.Model):
+    """
+    OCR text and extracted receipt structure for one exact file, keyed by the
+    SHA-256 of its bytes. Shared by receipts and transaction evidence, so a
+    re-uploaded file is not sent to OCR or OpenAI again.
+    """
+
+    content_hash = models.CharField(max_length=64, unique=True)
+    ocr_text = models.TextField(blank=True, default="")
+    parser_used = models.CharField(max_length=100, blank=True, default="")
+    receipt_data = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"ProcessedDocument {self.content_hash[:12]}"
@@ -0,0 +1,271 @@
+import os
+import re
+from abc import ABC, abstractmethod
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+from PIL import Image, ImageOps
+
+from .throttle import throttle
+
+# Pages rasterized and OCR'd at once. Each worker holds a single page image,
+# so this also bounds peak memory for long PDFs.
+PDF_MAX_WORKERS = 4
+
+# Adaptive DPI: aim for a legible short side without letting long receipts
+# exceed what the OCR service accepts on the long side.
+PDF_MIN_DPI = 150
+PDF_MAX_DPI = 300
+PDF_TARGET_SHORT_SIDE_PX = 2000
+PDF_MAX_LONG_SIDE_PX = 8000
+PDF_FALLBACK_DPI = 250
+
+JPEG_QUALITY = 85
+
+_PAGE_SIZE = re.compile(r"([\d.]+)\s*x\s*([\d.]+)\s*pts")
+
+
+def pdf_layout(file_bytes: bytes) -> Tuple[int, Optional[Tuple[float, float]]]:
+    """Page count and the first page's (width, height) in points, from pdfinfo."""
+    info = pdfinfo_from_bytes(file_bytes)
+    match = _PAGE_SIZE.search(str(info.get("Page size", "")))
+    size = (float(match.group(1)), float(match.group(2))) if match else None
+    return int(info.get("Pages") or 0), size
+
+
+def page_dpi(size: Optional[Tuple[float, float]]) -> int:
+    if not size or min(size) <= 0:
+        return PDF_FALLBACK_DPI
+    short_in, long_in = sorted(side / 72.0 for side in size)
+    dpi = min(PDF_TARGET_SHORT_SIDE_PX / short_in, PDF_MAX_LONG_SIDE_PX / long_in)
+    return int(max(PDF_MIN_DPI, min(PDF_MAX_DPI, dpi)))
+
+
+def encode_page(image: Image.Image) -> bytes:
+    """Greyscale JPEG: several times smaller than the RGB PNG pages used to be."""
+    buffer = BytesIO()
+    image.convert("L").save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def ocr_pdf_pages(file_bytes: bytes, ocr_image: Callable[[bytes], str]) -> List[str]:
+    """
+    Rasterize and OCR each page of a PDF concurrently, one page per
+    pdf2image call, and return the page texts in page order.
+    """
+    page_count, size = pdf_layout(file_bytes)
+    if page_count == 0:
+        raise ValueError("PDF conversion returned no images")
+    dpi = page_dpi(size)
+
+    def process(page_number: int) -> str:
+        pages = convert_from_bytes(
+            file_bytes,
+            dpi=dpi,
+            first_page=page_number,
+            last_page=page_number,
+            grayscale=True,
+        )
+        return "\n".join(ocr_image(encode_page(page)) for page in pages)
+
+    print(f"[OCR] PDF with {page_count} page(s) at {dpi} dpi")
+    with ThreadPoolExecutor(max_workers=min(PDF_MAX_WORKERS, page_count)) as executor:
+        return list(executor.map(process, range(1, page_count + 1)))
+
+
+def is_pdf(file_bytes: bytes, file_name: str = "") -> bool:
+    return file_name.lower().endswith(".pdf") or file_bytes[:4] == b"%PDF"
+
+
+# Local preprocessing: skew angles searched for deskew (degrees), and the
+# margin kept around content after cropping (pixels).
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+CROP_MARGIN = 12
+
+
+def _otsu_threshold(pixels: np.ndarray) -> int:
+    """Grey level t that best splits ink (<= t) from paper (> t)."""
+    histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    total = pixels.size
+    cumulative = np.cumsum(histogram)
+    cumulative_mean = np.cumsum(histogram * np.arange(256))
+    background = cumulative[:-1]
+    foreground = total - background
+    valid = (background > 0) & (foreground > 0)
+    mean_background = np.divide(cumulative_mean[:-1], background, out=np.zeros(255), where=valid)
+    mean_foreground = np.divide(cumulative_mean[-1] - cumulative_mean[:-1], foreground, out=np.zeros(255), where=valid)
+    between = np.where(valid, background * foreground * (mean_background - mean_foreground) ** 2, 0)
+    return int(np.argmax(between))
+
+
+def _skew_angle(ink: np.ndarray) -> float:
+    """Angle whose rotation gives the sharpest row profile (text lines horizontal)."""
+    image = Image.fromarray((ink * 255).astype(np.uint8))
+    # Searching on a downscaled copy keeps this cheap on large scans
+    image.thumbnail((800, 800))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP):
+        rows = np.asarray(image.rotate(float(angle), expand=False)).sum(axis=1, dtype=np.float64)
+        score = float(np.var(rows))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess_for_ocr(image: Image.Image) -> Image.Image:
+    """
+    Greyscale, binarize (Otsu), deskew and crop to the inked area. Photos of
+    receipts are usually slightly rotated with a lot of table around them;
+    Tesseract is much more accurate on a straight, tight, two-tone page.
+    """
+    grey = ImageOps.autocontrast(ImageOps.exif_transpose(image).convert("L"))
+    pixels = np.asarray(grey)
+    ink = pixels <= _otsu_threshold(pixels)
+    if not ink.any():
+        return grey
+
+    angle = _skew_angle(ink)
+    binary = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+    if angle:
+        binary = binary.rotate(angle, expand=True, fillcolor=255)
+
+    rows, cols = np.nonzero(np.asarray(binary) == 0)
+    top, bottom = max(rows.min() - CROP_MARGIN, 0), min(rows.max() + CROP_MARGIN + 1, binary.height)
+    left, right = max(cols.min() - CROP_MARGIN, 0), min(cols.max() + CROP_MARGIN + 1, binary.width)
+    return binary.crop((left, top, right, bottom))
+
+
+class OcrBackend(ABC):
+    """Turns one encoded page image into text. Subclasses set `name`."""
+
+    name = ""
+
+    @abstractmethod
+    def image_to_text(self, image_bytes: bytes) -> str:
+        ...
+
+
+class TextractBackend(OcrBackend):
+    name = "textract"
+
+    def __init__(self):
+        aws_access_key = os.getenv("AWS_ACCESS_KEY_ID")
+        aws_secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
+        if not aws_access_key or not aws_secret_key:
+            raise ValueError(
+                "AWS credentials not configured. Please set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY environment variables."
+            )
+        import boto3
+
+        # boto3 clients are thread-safe, so one client serves every page worker
+        self.client = boto3.client(
+            "textract",
+            region_name="us-east-1",
+            aws_access_key_id=aws_access_key,
+            aws_secret_access_key=aws_secret_key,
+        )
+
+    def image_to_text(self, image_bytes: bytes) -> str:
+        text_resp = self.client.detect_document_text(Document={"Bytes": image_bytes})
+        return "\n".join(
+            block.get("Text", "")
+            for block in text_resp.get("Blocks", [])
+            if block.get("BlockType") == "LINE"
+        )
+
+
+class TesseractBackend(OcrBackend):
+    name = "tesseract"
+
+    def image_to_text(self, image_bytes: bytes) -> str:
+        import pytesseract
+
+        image = preprocess_for_ocr(Image.open(BytesIO(image_bytes)))
+        # psm 4: a single column of variably sized text, i.e. a receipt
+        return pytesseract.image_to_string(image, config="--psm 4") or ""
+
+
+OCR_BACKENDS: Dict[str, type] = {
+    TextractBackend.name: TextractBackend,
+    TesseractBackend.name: TesseractBackend,
+}
+
+
+class _LatencyStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+
+_metrics: Dict[str, _LatencyStats] = {}
+_metrics_lock = threading.Lock()
+
+
+def _record(backend: str, elapsed_ms: float, failed: bool) -> None:
+    with _metrics_lock:
+        stats = _metrics.setdefault(backend, _LatencyStats())
+        stats.calls += 1
+        stats.errors += int(failed)
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+
+def ocr_metrics() -> Dict[str, Dict]:
+    """Per-backend page OCR latency since process start."""
+    with _metrics_lock:
+        return {
+            name: {
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "mean_ms": round(stats.total_ms / stats.calls, 2) if stats.calls else None,
+                "max_ms": round(stats.max_ms, 2),
+            }
+            for name, stats in sorted(_metrics.items())
+        }
+
+
+def _timed(backend: OcrBackend) -> Callable[[bytes], str]:
+    def run(image_bytes: bytes) -> str:
+        throttle(backend.name)
+        started = time.perf_counter()
+        failed = True
+        try:
+            text = backend.image_to_text(image_bytes)
+            failed = False
+            return text
+        finally:
+            _record(backend.name, (time.perf_counter() - started) * 1000, failed)
+
+    return run
+
+
+def get_ocr_backend(name: str) -> OcrBackend:
+    try:
+        return OCR_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown OCR backend: {name}. Choose one of {', '.join(sorted(OCR_BACKENDS))}.")
+
+
+def receipt_ocr_backend() -> OcrBackend:
+    return get_ocr_backend(getattr(settings, "RECEIPT_OCR_BACKEND", TextractBackend.name))
+
+
+def evidence_ocr_backend() -> OcrBackend:
+    return get_ocr_backend(getattr(settings, "EVIDENCE_OCR_BACKEND", TesseractBackend.name))
+
+
+def ocr_document(file_bytes: bytes, file_name: str, backend: OcrBackend) -> str:
+    """OCR an image or every page of a PDF with the given backend."""
+    ocr_image = _timed(backend)
+    if is_pdf(file_bytes, file_name):
+        return "".join(page + "\n" for page in ocr_pdf_pages(file_bytes, ocr_image))
+    return ocr_image(file_bytes)
@@ -0,0 +1,84 @@
+import queue
+import threading
+from datetime import timedelta
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import close_old_connections, transaction as db_transaction
+from django.utils import timezone
+
+from .models import Receipt
+
+# Receipts processed at once, per process: with several gunicorn workers the
+# total is this times the worker count. OCR and OpenAI calls are additionally
+# rate limited per provider (see throttle.py), so this mostly bounds memory
+# and DB connections rather than request rate.
+DEFAULT_WORKERS = 4
+
+# The queue lives in memory, so a restart or deploy loses whatever was
+# queued. A receipt left in processing without being touched for this long
+# is assumed lost and can be queued again.
+STALE_AFTER = timedelta(minutes=15)
+
+_receipt_queue = queue.Queue()
+_workers: List[threading.Thread] = []
+_workers_lock = threading.Lock()
+
+
+def worker_count() -> int:
+    return max(1, int(getattr(settings, "RECEIPT_PROCESSING_WORKERS", DEFAULT_WORKERS)))
+
+
+def _run_worker():
+    from . import views
+
+    while True:
+        receipt_id = _receipt_queue.get()
+        try:
+            close_old_connections()
+            views.process_stored_receipt(receipt_id)
+        except Exception as e:
+            print(f"[Receipts] Processing failed for receipt {receipt_id}: {e}")
+        finally:
+            close_old_connections()
+            _receipt_queue.task_done()
+
+
+def _ensure_workers():
+    with _workers_lock:
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        for index in range(len(_workers), worker_count()):
+            worker = threading.Thread(target=_run_worker, name=f"receipt-processing-{index}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def enqueue_receipt_processing(receipt_ids: Iterable[int]) -> None:
+    """
+    Queue receipts for OCR and extraction on the bounded worker pool. The
+    receipts are only published once the surrounding DB transaction commits.
+    """
+    receipt_ids = list(receipt_ids)
+
+    def _publish():
+        _ensure_workers()
+        for receipt_id in receipt_ids:
+            _receipt_queue.put(receipt_id)
+
+    db_transaction.on_commit(_publish)
+
+
+def stale_processing(receipts):
+    """Receipts stuck in processing, e.g. because their queue was lost."""
+    return receipts.filter(
+        processing_status=Receipt.STATUS_PROCESSING,
+        updated_at__lt=timezone.now() - STALE_AFTER,
+    )
+
+
+def requeue_stale_receipts(receipts) -> int:
+    ids = list(stale_processing(receipts).values_list("id", flat=True))
+    if ids:
+        Receipt.objects.filter(id__in=ids).update(updated_at=timezone.now())
+        enqueue_receipt_processing(ids)
+    return len(ids)
@@ -0,0 +1,306 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import BytesIO
+from unittest.mock import patch
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image, ImageDraw
+from rest_framework.test import APIClient
+
+from transactions.itemization_utils import extract_evidence_text
+
+from .ocr import (
+    PDF_MAX_DPI,
+    PDF_MIN_DPI,
+    OcrBackend,
+    TesseractBackend,
+    ocr_metrics,
+    ocr_pdf_pages,
+    page_dpi,
+    preprocess_for_ocr,
+    receipt_ocr_backend,
+)
+from . import processing
+from .models import ProcessedDocument, Receipt, ReceiptItem
+from .processing import enqueue_receipt_processing
+from .throttle import TokenBucket
+from .utils import CategorizedItem, ReceiptMetadata
+from .views import _process_receipt_bytes, process_stored_receipt
+
+
+class ReceiptOcrTests(TestCase):
+    def test_page_dpi_adapts_to_page_shape(self):
+        self.assertEqual(page_dpi((612, 792)), 235)
+        # Long thermal receipt: the long side caps the DPI
+        self.assertEqual(page_dpi((227, 2000)), 288)
+        self.assertEqual(page_dpi((4000, 4000)), PDF_MIN_DPI)
+        self.assertEqual(page_dpi((100, 100)), PDF_MAX_DPI)
+        self.assertEqual(page_dpi(None), 250)
+
+    def test_pdf_pages_are_rasterized_one_at_a_time_and_ocrd_concurrently(self):
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0}
+        calls = []
+
+        def convert(file_bytes, dpi, first_page, last_page, grayscale):
+            calls.append((first_page, last_page, dpi, grayscale))
+            return [Image.new("RGB", (40, 60), "white")]
+
+        def ocr(image_bytes):
+            self.assertEqual(image_bytes[:2], b"\xff\xd8")
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            time.sleep(0.05)
+            with lock:
+                state["in_flight"] -= 1
+            return "TOTAL 12.00"
+
+        with patch("receipts.ocr.pdfinfo_from_bytes", return_value={"Pages": 3, "Page size": "612 x 792 pts (letter)"}):
+            with patch("receipts.ocr.convert_from_bytes", side_effect=convert):
+                pages = ocr_pdf_pages(b"%PDF-1.4", ocr)
+
+        self.assertEqual(pages, ["TOTAL 12.00"] * 3)
+        self.assertGreater(state["peak"], 1)
+        self.assertEqual(sorted(calls), [(1, 1, 235, True), (2, 2, 235, True), (3, 3, 235, True)])
+
+    def _skewed_receipt(self):
+        page = Image.new("L", (300, 400), 200)
+        draw = ImageDraw.Draw(page)
+        for top in range(100, 300, 20):
+            draw.rectangle((80, top, 220, top + 6), fill=20)
+        return page.rotate(3, fillcolor=200, expand=False).convert("RGB")
+
+    def test_preprocessing_binarizes_deskews_and_crops_to_content(self):
+        processed = preprocess_for_ocr(self._skewed_receipt())
+        pixels = np.asarray(processed)
+
+        self.assertEqual(set(np.unique(pixels)), {0, 255})
+        self.assertLess(processed.width, 200)
+        self.assertLess(processed.height, 240)
+        # Straightened: each text bar covers nearly the full width of its rows
+        inked_rows = (pixels == 0).sum(axis=1)
+        self.assertGreater(inked_rows.max(), 0.8 * processed.width)
+
+    def test_incomplete_backend_fails_when_created(self):
+        class NamedOnly(OcrBackend):
+            name = "named-only"
+
+        with self.assertRaises(TypeError):
+            NamedOnly()
+
+    @override_settings(RECEIPT_OCR_BACKEND="tesseract")
+    def test_local_backend_processes_receipts_without_network(self):
+        buffer = BytesIO()
+        self._skewed_receipt().save(buffer, format="PNG")
+        calls = ocr_metrics().get("tesseract", {}).get("calls", 0)
+
+        self.assertIsInstance(receipt_ocr_backend(), TesseractBackend)
+        with patch("pytesseract.image_to_string", return_value="MILK 3.49\nTOTAL 3.49") as image_to_string:
+            with patch("receipts.views.extract_receipt_data_from_text", return_value=([], ReceiptMetadata(), "Store", 3.49, None)) as extract:
+                payload = _process_receipt_bytes(buffer.getvalue(), "receipt.png")
+
+        self.assertEqual(image_to_string.call_args.args[0].mode, "L")
+        extract.assert_called_once_with("MILK 3.49\nTOTAL 3.49")
+        self.assertTrue(payload["is_empty"])
+        self.assertEqual(ocr_metrics()["tesseract"]["calls"], calls + 1)
+
+    @override_settings(EVIDENCE_OCR_BACKEND="tesseract")
+    def test_evidence_images_use_the_shared_ocr_pipeline(self):
+        handle, path = tempfile.mkstemp(suffix=".jpg")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        self._skewed_receipt().save(path, format="JPEG")
+
+        with patch("pytesseract.image_to_string", return_value="COFFEE 4.50"):
+            text, parser_used = extract_evidence_text(path, "invoice.jpg")
+
+        self.assertEqual((text, parser_used), ("COFFEE 4.50", "tesseract"))
+
+
+@override_settings(RECEIPT_OCR_BACKEND="tesseract")
+class ReceiptDocumentCacheTests(TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base_dir.cleanup)
+        override = override_settings(BASE_DIR=self.base_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username="receipt-user", password="secret")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _extraction(self):
+        metadata = ReceiptMetadata()
+        metadata.tax = 25
+        items = [CategorizedItem("MILK 2%", 349, 1, clean_name="Milk", category="Groceries")]
+        return items, metadata, "Corner Market", 3.74, "2026-06-30"
+
+    def test_same_bytes_skip_ocr_and_extraction(self):
+        buffer = BytesIO()
+        Image.new("L", (20, 20), 255).save(buffer, format="PNG")
+        with patch("pytesseract.image_to_string", return_value="MILK 3.49") as image_to_string:
+            with patch("receipts.views.extract_receipt_data_from_text", return_value=self._extraction()) as extract:
+                first = _process_receipt_bytes(buffer.getvalue(), "a.png")
+                second = _process_receipt_bytes(buffer.getvalue(), "b.png")
+
+        self.assertEqual(image_to_string.call_count, 1)
+        self.assertEqual(extract.call_count, 1)
+        self.assertEqual(first["response_data"], second["response_data"])
+        self.assertEqual(second["categorized_items"][0].clean_name, "Milk")
+        self.assertEqual(second["metadata"].tax, 25)
+        self.assertEqual(ProcessedDocument.objects.get().parser_used, "tesseract")
+
+    def test_repeat_upload_shares_the_file_and_completes_from_cache(self):
+        buffer = BytesIO()
+        Image.new("L", (20, 20), 255).save(buffer, format="PNG")
+        data = buffer.getvalue()
+        with patch("pytesseract.image_to_string", return_value="MILK 3.49"):
+            with patch("receipts.views.extract_receipt_data_from_text", return_value=self._extraction()):
+                _process_receipt_bytes(data, "first.png")
+
+        first = self.client.post("/receipts/", {"receipt": SimpleUploadedFile("a.png", data, "image/png")})
+        second = self.client.post("/receipts/", {"receipt": SimpleUploadedFile("b.png", data, "image/png")})
+
+        self.assertEqual(first.status_code, 201)
+        receipts = list(Receipt.objects.order_by("id"))
+        self.assertEqual(receipts[0].image_path, receipts[1].image_path)
+        self.assertEqual(receipts[1].processing_status, Receipt.STATUS_COMPLETED)
+        self.assertEqual(receipts[1].items.get().clean_name, "Milk")
+        self.assertEqual(second.json()["merchant_name"], "Corner Market")
+
+        # The shared file survives deleting one of the receipts
+        self.client.delete(f"/receipts/{receipts[0].id}/")
+        self.assertTrue(os.path.exists(os.path.join(self.base_dir.name, receipts[1].image_path)))
+
+
+class ReceiptBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="batch-user", password="secret")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _receipt(self, **fields):
+        defaults = {"user": self.user, "image_path": "data/receipts/r.png", "content_hash": "abc"}
+        return Receipt.objects.create(**{**defaults, **fields})
+
+    def test_batch_queues_pending_receipts_and_reports_progress(self):
+        first, second, third = self._receipt(), self._receipt(), self._receipt()
+        self._receipt(is_processed=True, processing_status=Receipt.STATUS_COMPLETED)
+        queued = []
+
+        with patch("receipts.views.enqueue_receipt_processing", side_effect=queued.extend):
+            response = self.client.post("/receipts/batch/process/", {}, format="json")
+
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual(sorted(queued), [first.id, second.id, third.id])
+        self.assertEqual((body["total"], body["processing"], body["done"]), (3, 3, False))
+
+        payload = {
+            "response_data": {"merchant": {"name": "Corner Market"}},
+            "result": {"merchant_name": "Corner Market", "total_amount": 698},
+            "categorized_items": [
+                CategorizedItem("MILK", 349, 1, clean_name="Milk", category="Groceries"),
+                CategorizedItem("EGGS", 349, 1, clean_name="Eggs", category="Groceries"),
+            ],
+            "metadata": ReceiptMetadata(),
+            "extracted_text": "MILK 3.49\nEGGS 3.49",
+            "parsed_date": None,
+            "is_empty": False,
+        }
+        with patch("builtins.open", side_effect=lambda *args, **kwargs: BytesIO(b"image")):
+            with patch("receipts.views._process_receipt_bytes", return_value=payload):
+                with patch("receipts.views.ReceiptItemModel.objects.bulk_create", wraps=ReceiptItem.objects.bulk_create) as bulk_create:
+                    process_stored_receipt(first.id)
+            with patch("receipts.views._process_receipt_bytes", side_effect=RuntimeError("OCR down")):
+                process_stored_receipt(second.id)
+
+        bulk_create.assert_called_once()
+        self.assertEqual(list(first.items.order_by("id").values_list("clean_name", flat=True)), ["Milk", "Eggs"])
+        progress = self.client.get(f"/receipts/batch/{body['id']}/").json()
+        self.assertEqual(
+            {key: progress[key] for key in ("total", "processing", "completed", "failed", "percent", "done")},
+            {"total": 3, "processing": 1, "completed": 1, "failed": 1, "percent": 66.7, "done": False},
+        )
+
+    def test_batch_rejects_other_users_receipts(self):
+        other = User.objects.create_user(username="someone-else", password="secret")
+        receipt = self._receipt(user=other)
+
+        response = self.client.post("/receipts/batch/process/", {"receipt_ids": [receipt.id]}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(Receipt.objects.get(id=receipt.id).batch_id)
+
+    def test_receipts_stuck_in_processing_are_queued_again(self):
+        stale = self._receipt(processing_status=Receipt.STATUS_PROCESSING)
+        fresh = self._receipt(processing_status=Receipt.STATUS_PROCESSING)
+        Receipt.objects.filter(id=stale.id).update(
+            updated_at=timezone.now() - processing.STALE_AFTER - timedelta(minutes=1)
+        )
+        queued = []
+
+        with patch("receipts.views.enqueue_receipt_processing", side_effect=queued.extend):
+            response = self.client.post("/receipts/batch/process/", {}, format="json")
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(queued, [stale.id])
+
+        # A batch whose queue was lost by a restart picks its receipts up again
+        batch_id = response.json()["id"]
+        Receipt.objects.filter(id=stale.id).update(
+            updated_at=timezone.now() - processing.STALE_AFTER - timedelta(minutes=1)
+        )
+        with patch("receipts.processing.enqueue_receipt_processing", side_effect=queued.extend):
+            self.client.get(f"/receipts/batch/{batch_id}/")
+            self.client.get(f"/receipts/batch/{batch_id}/")
+
+        self.assertEqual(queued, [stale.id, stale.id])
+        self.assertIsNone(Receipt.objects.get(id=fresh.id).batch_id)
+
+    @override_settings(RECEIPT_PROCESSING_WORKERS=2)
+    def test_worker_pool_bounds_concurrency(self):
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0}
+        done = []
+
+        def process(receipt_id):
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            time.sleep(0.05)
+            with lock:
+                state["in_flight"] -= 1
+                done.append(receipt_id)
+
+        with patch("receipts.views.process_stored_receipt", side_effect=process):
+            with self.captureOnCommitCallbacks(execute=True):
+                enqueue_receipt_processing(range(6))
+            processing._receipt_queue.join()
+
+        self.assertEqual(sorted(done), list(range(6)))
+        self.assertEqual(state["peak"], 2)
+
+    def test_token_bucket_spaces_calls_to_the_rate(self):
+        clock = {"now": 0.0}
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock["now"] += seconds
+
+        bucket = TokenBucket(2.0, clock=lambda: clock["now"], sleep=sleep)
+        for _ in range(6):
+            bucket.acquire()
+
+        # Two calls from the initial burst, then one every half second
+        self.assertAlmostEqual(clock["now"], 2.0)
+        self.assertEqual(len(sleeps), 4)
@@ -0,0 +1,64 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+
+# Requests per second allowed per external provider, shared by every worker
+# thread in the process. The buckets are per process, so under several
+# gunicorn workers the combined rate is this times the worker count.
+# Providers not listed here are not throttled.
+DEFAULT_RATE_LIMITS = {
+    "textract": 5.0,
+    "openai": 5.0,
+}
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self._sleep(wait)
+
+
+_buckets: Dict[str, Optional[TokenBucket]] = {}
+_buckets_lock = threading.Lock()
+
+
+def _bucket(provider: str) -> Optional[TokenBucket]:
+    with _buckets_lock:
+        if provider not in _buckets:
+            limits = {**DEFAULT_RATE_LIMITS, **(getattr(settings, "RECEIPT_RATE_LIMITS", None) or {})}
+            rate = limits.get(provider)
+            _buckets[provider] = TokenBucket(float(rate)) if rate else None
+        return _buckets[provider]
+
+
+def throttle(provider: str) -> None:
+    """Block until a call to `provider` fits within its rate limit."""
+    bucket = _bucket(provider)
+    if bucket is not None:
+        bucket.acquire()
+
+
+def reset_throttles() -> None:
+    with _buckets_lock:
+        _buckets.clear()
@@ -5,6 +5,8 @@ urlpatterns = [
     path("process/", views.process_receipt, name="process_receipt"),
     path("", views.receipt_list_create, name="receipt_list_create"),
     path("save/", views.save_receipt, name="receipt_save"),
+    path("batch/process/", views.process_receipt_batch, name="receipt_batch_process"),
+    path("batch/<int:batch_id>/", views.receipt_batch_status, name="receipt_batch_status"),
     path("images/<str:filename>/", views.receipt_image, name="receipt_image"),
     path("<int:receipt_id>/", views.receipt_detail, name="receipt_detail"),
     path("<int:receipt_id>/process/", views.process_receipt_by_id, name="receipt_process"),
@@ -89,15 +89,15 @@ class ReceiptMetadata:
 
 def extract_receipt_data_from_text(
     raw_text: str,
-) -> Tuple[List[CategorizedItem], ReceiptMetadata, str, float]:
+) -> Tuple[List[CategorizedItem], ReceiptMetadata, str, float, Optional[str]]:
     """
     Use OpenAI to extract ALL receipt data (merchant, date, items, totals) from raw OCR text.
     Replaces Textract AnalyzeExpense.
-    Returns: (categorized_items, metadata, merchant_name, total_amount)
+    Returns: (categorized_items, metadata, merchant_name, total_amount, receipt_date)
     """
     default_metadata = ReceiptMetadata()
     if not raw_text or not openai_client:
-        return ([], default_metadata, "Unknown Merchant", 0.0)
+        return ([], default_metadata, "Unknown Merchant", 0.0, None)
 
     # ... (Rest of extract_receipt_data_from_text logic remains identical) ...
 
@@ -1,22 +1,30 @@
 import json
 import os
 import re
-import threading
 from datetime import datetime
-from io import BytesIO
 from typing import Dict, List, Optional, Tuple
 
-import boto3
 from django.conf import settings
-from django.db import close_old_connections, transaction as db_transaction
+from django.db import transaction as db_transaction
+from django.db.models import Count
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
-from pdf2image import convert_from_bytes
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 
-from .models import Receipt, ReceiptItem as ReceiptItemModel
+from .documents import (
+    cached_document,
+    cached_receipt_extraction,
+    content_hash,
+    hash_chunks,
+    store_document_text,
+    store_receipt_extraction,
+)
+from .models import Receipt, ReceiptBatch, ReceiptItem as ReceiptItemModel
+from .ocr import ocr_document, receipt_ocr_backend
+from .processing import enqueue_receipt_processing, requeue_stale_receipts, stale_processing
 from .serializers import ReceiptItemSerializer, ReceiptSerializer
+from .throttle import throttle
 from .utils import (
     ReceiptItem,
     CategorizedItem,
@@ -82,55 +90,30 @@ def _build_empty_response(merchant_name="Unknown", date=None) -> Dict:
 
 
 def _process_receipt_bytes(file_bytes: bytes, file_name: str) -> Dict:
-    aws_access_key = os.getenv("AWS_ACCESS_KEY_ID")
-    aws_secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
-    if not aws_access_key or not aws_secret_key:
-        raise ValueError(
-            "AWS credentials not configured. Please set AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY environment variables."
-        )
-
-    textract = boto3.client(
-        "textract",
-        region_name="us-east-1",
-        aws_access_key_id=aws_access_key,
-        aws_secret_access_key=aws_secret_key,
-    )
-
-    file_name = file_name.lower()
-    is_pdf = file_name.endswith(".pdf") or file_bytes[:4] == b"%PDF"
-
-    # Use detect_document_text ONLY (Cost Optimization)
-    extracted_text = ""
-    if is_pdf:
-        print("[Textract] PDF detected. Converting to images...")
-        images = convert_from_bytes(file_bytes, dpi=250)
-        print(f"[Textract] PDF converted: {len(images)} page(s)")
-        if len(images) == 0:
-            raise ValueError("PDF conversion returned no images")
-
-        for i, image in enumerate(images):
-            print(f"[Textract] Processing PDF page {i + 1}/{len(images)}...")
-            img_buffer = BytesIO()
-            image.save(img_buffer, format="PNG")
-            img_bytes = img_buffer.getvalue()
-
-            text_resp = textract.detect_document_text(Document={"Bytes": img_bytes})
-            extracted_text += "\n".join(
-                block.get("Text", "")
-                for block in text_resp.get("Blocks", [])
-                if block.get("BlockType") == "LINE"
-            ) + "\n"
+    digest = content_hash(file_bytes)
+    document = cached_document(digest)
+    extraction = cached_receipt_extraction(document)
+    if extraction is not None:
+        print(f"[Receipts] Reusing cached extraction for {digest[:12]}")
+        return _build_processing_payload(extraction, document.ocr_text, digest)
+
+    if document and document.ocr_text:
+        extracted_text = document.ocr_text
     else:
-        print("[Textract] Image detected. Processing directly...")
-        text_resp = textract.detect_document_text(Document={"Bytes": file_bytes})
-        extracted_text = "\n".join(
-            block.get("Text", "")
-            for block in text_resp.get("Blocks", [])
-            if block.get("BlockType") == "LINE"
-        )
+        backend = receipt_ocr_backend()
+        print(f"[OCR] Extracting receipt text with {backend.name}...")
+        extracted_text = ocr_document(file_bytes, file_name, backend)
+        store_document_text(digest, extracted_text, backend.name)
 
     # Use OpenAI to extract structure from raw text
-    categorized_items, metadata, merchant_name, total_amount, receipt_date_raw = extract_receipt_data_from_text(extracted_text)
+    throttle("openai")
+    extraction = extract_receipt_data_from_text(extracted_text)
+    store_receipt_extraction(digest, extraction)
+    return _build_processing_payload(extraction, extracted_text, digest)
+
+
+def _build_processing_payload(extraction, extracted_text: str, digest: str) -> Dict:
+    categorized_items, metadata, merchant_name, total_amount, receipt_date_raw = extraction
 
     parsed_date = _parse_receipt_date(receipt_date_raw)
     receipt_date_value = parsed_date.isoformat() if parsed_date else None
@@ -148,6 +131,7 @@ def _process_receipt_bytes(file_bytes: bytes, file_name: str) -> Dict:
         "tip": metadata.tip,
         "fees": metadata.fees,
         "payment_method": metadata.card_used,
+        "content_hash": digest,
     }
 
     if not categorized_items:
@@ -229,19 +213,23 @@ def _update_receipt_from_processing(
     response_data: Dict,
 ) -> None:
     ReceiptItemModel.objects.filter(receipt=receipt).delete()
-
-    for item in categorized_items:
-        ReceiptItemModel.objects.create(
-            receipt=receipt,
-            name=item.name,
-            clean_name=item.clean_name,
-            price=item.price,
-            quantity=item.quantity or 1,
-            unit_price=item.unit_price,
-            category_suggestion=item.category,
-        )
+    ReceiptItemModel.objects.bulk_create(
+        [
+            ReceiptItemModel(
+                receipt=receipt,
+                name=item.name,
+                clean_name=item.clean_name,
+                price=item.price,
+                quantity=item.quantity or 1,
+                unit_price=item.unit_price,
+                category_suggestion=item.category,
+            )
+            for item in categorized_items
+        ]
+    )
 
     receipt.ocr_text = extracted_text
+    receipt.content_hash = result.get("content_hash") or receipt.content_hash
     receipt.merchant_name = result.get("merchant_name")
     receipt.total_amount = result.get("total_amount")
     receipt.receipt_date = parsed_date
@@ -315,23 +303,53 @@ def receipt_list_create(request):
             status=400,
         )
 
-    receipts_dir = os.path.join(settings.BASE_DIR, "data", "receipts")
-    os.makedirs(receipts_dir, exist_ok=True)
+    digest = hash_chunks(uploaded_file.chunks())
+    # The same file uploaded again points at the stored copy instead of a new one
+    existing_path = (
+        Receipt.objects.filter(user=request.user, content_hash=digest)
+        .exclude(image_path__isnull=True)
+        .values_list("image_path", flat=True)
+        .first()
+    )
+    if existing_path and os.path.exists(os.path.join(settings.BASE_DIR, existing_path)):
+        image_path = existing_path
+    else:
+        receipts_dir = os.path.join(settings.BASE_DIR, "data", "receipts")
+        os.makedirs(receipts_dir, exist_ok=True)
 
-    ext = os.path.splitext(uploaded_file.name)[1].lower()
-    filename = f"receipt_{{timezone.now().strftime('%Y%m%d%H%M%S%f')}}{ext}"
-    filepath = os.path.join(receipts_dir, filename)
-    with open(filepath, "wb") as handle:
-        for chunk in uploaded_file.chunks():
-            handle.write(chunk)
+        ext = os.path.splitext(uploaded_file.name)[1].lower()
+        filename = f"receipt_{{timezone.now().strftime('%Y%m%d%H%M%S%f')}}{ext}"
+        filepath = os.path.join(receipts_dir, filename)
+        with open(filepath, "wb") as handle:
+            for chunk in uploaded_file.chunks():
+                handle.write(chunk)
+        image_path = f"data/receipts/{filename}"
 
     receipt = Receipt.objects.create(
         user=request.user,
-        image_path=f"data/receipts/{filename}",
+        image_path=image_path,
+        content_hash=digest,
         is_processed=False,
         processing_status=Receipt.STATUS_PENDING,
     )
 
+    # A file that was processed before completes immediately from the cache
+    document = cached_document(digest)
+    extraction = cached_receipt_extraction(document)
+    if extraction is not None:
+        payload = _build_processing_payload(extraction, document.ocr_text, digest)
+        if not payload["is_empty"]:
+            with db_transaction.atomic():
+                _update_receipt_from_processing(
+                    receipt=receipt,
+                    result=payload["result"],
+                    categorized_items=payload["categorized_items"],
+                    metadata=payload["metadata"],
+                    extracted_text=payload["extracted_text"],
+                    parsed_date=payload["parsed_date"],
+                    response_data=payload["response_data"],
+                )
+
     serializer = ReceiptSerializer(receipt)
     return JsonResponse(serializer.data, status=201)
 
@@ -367,18 +385,20 @@ def save_receipt(request):
     )
 
     items = parsed.get("items", []) or []
-    for item in items:
-        price = item.get("priceAfterDiscount", 0) or 0
-        quantity = item.get("quantity", 1) or 1
-        ReceiptItemModel.objects.create(
-            receipt=receipt,
-            name=item.get("name", "Item"),
-            clean_name=item.get("name", "Item"),
-            price=int(round(price * 100)),
-            quantity=quantity,
-            unit_price=None,
-            category_suggestion=None,
-        )
+    ReceiptItemModel.objects.bulk_create(
+        [
+            ReceiptItemModel(
+                receipt=receipt,
+                name=item.get("name", "Item"),
+                clean_name=item.get("name", "Item"),
+                price=int(round((item.get("priceAfterDiscount", 0) or 0) * 100)),
+                quantity=item.get("quantity", 1) or 1,
+                unit_price=None,
+                category_suggestion=None,
+            )
+            for item in items
+        ]
+    )
 
     receipt.parsed_data = {
         **parsed,
@@ -411,7 +431,8 @@ def receipt_detail(request, receipt_id: int):
             {"error": "Cannot delete receipt linked to a transaction."}, status=400
         )
 
-    if receipt.image_path:
+    shared = Receipt.objects.filter(image_path=receipt.image_path).exclude(id=receipt.id).exists()
+    if receipt.image_path and not shared:
         filepath = os.path.join(settings.BASE_DIR, receipt.image_path)
         if os.path.exists(filepath):
             try:
@@ -422,6 +443,39 @@ def receipt_detail(request, receipt_id: int):
     receipt.delete()
     return JsonResponse({"success": True})
 
+def process_stored_receipt(receipt_id: int) -> None:
+    """OCR and extract an uploaded receipt. Runs on the processing worker pool."""
+    receipt = Receipt.objects.filter(id=receipt_id).first()
+    if not receipt or not receipt.image_path or receipt.processing_status != Receipt.STATUS_PROCESSING:
+        return
+    # Touch it so the staleness check does not queue it again mid-run
+    Receipt.objects.filter(id=receipt.id).update(updated_at=timezone.now())
+    try:
+        filepath = os.path.join(settings.BASE_DIR, receipt.image_path)
+        with open(filepath, "rb") as handle:
+            payload = _process_receipt_bytes(handle.read(), filepath)
+        if payload["is_empty"]:
+            receipt.processing_status = Receipt.STATUS_FAILED
+            receipt.save(update_fields=["processing_status", "updated_at"])
+            return
+
+        with db_transaction.atomic():
+            _update_receipt_from_processing(
+                receipt=Receipt.objects.select_for_update().get(id=receipt.id),
+                result=payload["result"],
+                categorized_items=payload["categorized_items"],
+                metadata=payload["metadata"],
+                extracted_text=payload["extracted_text"],
+                parsed_date=payload["parsed_date"],
+                response_data=payload["response_data"],
+            )
+    except Exception as exc:
+        print(f"[Receipts] Background processing failed: {exc}")
+        Receipt.objects.filter(id=receipt.id).update(
+            processing_status=Receipt.STATUS_FAILED
+        )
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def process_receipt_by_id(request, receipt_id: int):
@@ -438,34 +492,7 @@ def process_receipt_by_id(request, receipt_id: int):
     receipt.processing_status = Receipt.STATUS_PROCESSING
     receipt.save(update_fields=["processing_status", "updated_at"])
 
-    def _run_background():
-        close_old_connections()
-        try:
-            filepath = os.path.join(settings.BASE_DIR, receipt.image_path)
-            with open(filepath, "rb") as handle:
-                payload = _process_receipt_bytes(handle.read(), filepath)
-            if payload["is_empty"]:
-                receipt.processing_status = Receipt.STATUS_FAILED
-                receipt.save(update_fields=["processing_status", "updated_at"])
-                return
-
-            with db_transaction.atomic():
-                _update_receipt_from_processing(
-                    receipt=Receipt.objects.select_for_update().get(id=receipt.id),
-                    result=payload["result"],
-                    categorized_items=payload["categorized_items"],
-                    metadata=payload["metadata"],
-                    extracted_text=payload["extracted_text"],
-                    parsed_date=payload["parsed_date"],
-                    response_data=payload["response_data"],
-                )
-        except Exception as exc:
-            print(f"[Receipts] Background processing failed: {exc}")
-            Receipt.objects.filter(id=receipt.id).update(
-                processing_status=Receipt.STATUS_FAILED
-            )
-
-    threading.Thread(target=_run_background, daemon=True).start()
+    enqueue_receipt_processing([receipt.id])
 
     return JsonResponse(
         {"id": receipt.id, "processing_status": "processing"}, status=202
@@ -510,6 +537,73 @@ def receipt_status(request, receipt_id: int):
     return JsonResponse(payload)
 
 
+def _batch_progress(batch: ReceiptBatch) -> Dict:
+    counts = {
+        status: count
+        for status, count in batch.receipts.values_list("processing_status").annotate(count=Count("id"))
+    }
+    total = sum(counts.values())
+    finished = counts.get(Receipt.STATUS_COMPLETED, 0) + counts.get(Receipt.STATUS_FAILED, 0)
+    return {
+        "id": batch.id,
+        "created_at": batch.created_at,
+        "total": total,
+        "pending": counts.get(Receipt.STATUS_PENDING, 0),
+        "processing": counts.get(Receipt.STATUS_PROCESSING, 0),
+        "completed": counts.get(Receipt.STATUS_COMPLETED, 0),
+        "failed": counts.get(Receipt.STATUS_FAILED, 0),
+        "percent": round(100 * finished / total, 1) if total else 100.0,
+        "done": finished == total,
+    }
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def process_receipt_batch(request):
+    """
+    Queue many uploaded receipts at once. Without `receipt_ids`, every
+    unprocessed receipt of the user is queued. Poll the returned batch for
+    progress.
+    """
+    receipts = Receipt.objects.filter(
+        user=request.user, is_processed=False, image_path__isnull=False
+    ).exclude(processing_status=Receipt.STATUS_COMPLETED)
+    # Receipts still processing are left alone unless their queue was lost
+    receipts = receipts.exclude(processing_status=Receipt.STATUS_PROCESSING) | stale_processing(receipts)
+
+    receipt_ids = request.data.get("receipt_ids")
+    if receipt_ids is not None:
+        if not isinstance(receipt_ids, list) or not all(isinstance(value, int) for value in receipt_ids):
+            return JsonResponse({"error": "receipt_ids must be a list of ids"}, status=400)
+        receipts = receipts.filter(id__in=receipt_ids)
+
+    ids = list(receipts.exclude(image_path="").values_list("id", flat=True))
+    if not ids:
+        return JsonResponse({"error": "No receipts to process"}, status=400)
+
+    with db_transaction.atomic():
+        batch = ReceiptBatch.objects.create(user=request.user)
+        Receipt.objects.filter(id__in=ids).update(
+            batch=batch,
+            processing_status=Receipt.STATUS_PROCESSING,
+            updated_at=timezone.now(),
+        )
+        enqueue_receipt_processing(ids)
+
+    return JsonResponse(_batch_progress(batch), status=202)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def receipt_batch_status(request, batch_id: int):
+    batch = ReceiptBatch.objects.filter(id=batch_id, user=request.user).first()
+    if not batch:
+        return JsonResponse({"error": "Batch not found"}, status=404)
+    # Receipts lost from the queue by a restart would otherwise never finish
+    requeue_stale_receipts(batch.receipts.all())
+    return JsonResponse(_batch_progress(batch))
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def receipt_items(request, receipt_id: int):
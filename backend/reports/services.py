@@ -0,0 +1,138 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q, Sum
+
+from accounts.models import Account
+from transactions.models import Transaction
+
+REPORT_CACHE_TIMEOUT = 60 * 60 * 24
+
+INCOME_NODE = "Income"
+SAVINGS_NODE = "Savings"
+INCOME_COLOR = "hsl(145, 60%, 45%)"
+SAVINGS_COLOR = "hsl(200, 60%, 45%)"
+
+
+# Bumped when a shared (system) category changes, since every user's reports
+# may name it
+GLOBAL_VERSION_KEY = "reports:version"
+
+
+def _version_key(user_id):
+    return f"reports:version:{user_id}"
+
+
+def _report_cache_key(name, user_id, *parts):
+    versions = [
+        cache.get_or_set(GLOBAL_VERSION_KEY, 1, timeout=None),
+        cache.get_or_set(_version_key(user_id), 1, timeout=None),
+    ]
+    return ":".join(["reports", name, *map(str, versions), str(user_id), *map(str, parts)])
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def invalidate_user_reports(user_id):
+    """Bump the user's report version so every cached period is recomputed."""
+    _bump(_version_key(user_id))
+
+
+def invalidate_all_reports():
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def user_id_for_account(account_id):
+    return Account.objects.filter(pk=account_id).values_list("user_id", flat=True).first()
+
+
+def cash_flow_sankey(user, start_date, end_date):
+    """
+    Cached Income Sources -> Income -> Category -> Subcategory flow for a period.
+    """
+    key = _report_cache_key("sankey", user.id, start_date, end_date)
+    data = cache.get(key)
+    if data is None:
+        data = build_cash_flow_sankey(user, start_date, end_date)
+        cache.set(key, data, REPORT_CACHE_TIMEOUT)
+    return data
+
+
+def build_cash_flow_sankey(user, start_date, end_date):
+    # One grouped query: income and expense totals per (category, parent)
+    rows = (
+        Transaction.objects.filter(
+            account__user=user,
+            date__gte=start_date,
+            date__lte=end_date,
+        )
+        .exclude(Q(is_transfer=True) | Q(category__iexact="Transfer"))
+        .values("category", "category_ref__name", "category_ref__parent__name")
+        .annotate(
+            income=Sum("amount", filter=Q(amount__gt=0)),
+            expense=Sum("amount", filter=Q(amount__lt=0)),
+        )
+        .order_by()
+    )
+
+    income_sources = {}
+    category_totals = {}
+    subcategory_links = {}
+    total_income = Decimal("0")
+    total_expenses = Decimal("0")
+
+    for row in rows:
+        name = row["category_ref__name"] or row["category"]
+        if row["income"]:
+            source = name if name and name != INCOME_NODE else "Other Income"
+            income_sources[source] = income_sources.get(source, Decimal("0")) + row["income"]
+            total_income += row["income"]
+        if row["expense"]:
+            amount = abs(row["expense"])
+            total_expenses += amount
+            subcategory = name or "Uncategorized"
+            category = row["category_ref__parent__name"] or subcategory
+            category_totals[category] = category_totals.get(category, Decimal("0")) + amount
+            if category != subcategory:
+                link = (category, subcategory)
+                subcategory_links[link] = subcategory_links.get(link, Decimal("0")) + amount
+
+    nodes = {INCOME_NODE: {"id": INCOME_NODE, "nodeColor": INCOME_COLOR}}
+    links = []
+
+    def add_node(node_id):
+        nodes.setdefault(node_id, {"id": node_id})
+
+    for category, amount in category_totals.items():
+        add_node(category)
+        links.append({"source": INCOME_NODE, "target": category, "value": float(amount)})
+    for (category, subcategory), amount in subcategory_links.items():
+        add_node(subcategory)
+        links.append({"source": category, "target": subcategory, "value": float(amount)})
+
+    for source, amount in income_sources.items():
+        # Keep income sources distinct from expense nodes so the graph stays acyclic
+        node_id = source if source not in nodes and source != SAVINGS_NODE else f"{source} (Income)"
+        add_node(node_id)
+        links.append({"source": node_id, "target": INCOME_NODE, "value": float(amount)})
+
+    savings = float(total_income) - float(total_expenses)
+    if savings > 0:
+        nodes[SAVINGS_NODE] = {"id": SAVINGS_NODE, "nodeColor": SAVINGS_COLOR}
+        links.append({"source": INCOME_NODE, "target": SAVINGS_NODE, "value": savings})
+
+    return {
+        "nodes": list(nodes.values()),
+        "links": links,
+        "meta": {
+            "total_income": total_income,
+            "total_expenses": total_expenses,
+            "savings": savings,
+            "period": f"{start_date} to {end_date}",
+        },
+    }
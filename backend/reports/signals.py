@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from categories.models import Category
+from transactions.models import Transaction
+
+from .services import invalidate_all_reports, invalidate_user_reports, user_id_for_account
+
+
+# Deletes are invalidated by the code that deletes: a post_delete receiver on
+# Transaction would turn off fast deletes and cost queries per deleted row
+@receiver(post_save, sender=Transaction)
+def invalidate_reports_on_transaction_change(sender, instance, **kwargs):
+    if Transaction.account.is_cached(instance):
+        user_id = instance.account.user_id
+    else:
+        user_id = user_id_for_account(instance.account_id)
+    if user_id:
+        invalidate_user_reports(user_id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_reports_on_category_change(sender, instance, **kwargs):
+    # Reports show category and parent names, so renames and moves matter too
+    if instance.user_id and not instance.is_system:
+        invalidate_user_reports(instance.user_id)
+    else:
+        invalidate_all_reports()
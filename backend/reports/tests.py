@@ -1,3 +1,110 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import Account
+from categories.models import Category
+from transactions.models import Transaction
+
+
+# Query-count assertions below should not count lookups in the shared DB cache
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CashFlowSankeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="sankey", password="secret")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.account = Account.objects.create(
+            user=self.user,
+            account_name="Checking",
+            account_type="bank",
+            balance=Decimal("0.00"),
+            currency="USD",
+        )
+        self.salary = Category.objects.create(name="Paycheck", is_system=True)
+        self.food = Category.objects.create(name="Food & Dining", is_system=True)
+        self.groceries = Category.objects.create(
+            name="Groceries", is_system=True, parent=self.food
+        )
+        self.restaurants = Category.objects.create(
+            name="Restaurants", is_system=True, parent=self.food
+        )
+        self.params = {"start_date": "2026-03-01", "end_date": "2026-03-31"}
+
+    def _txn(self, amount, category=None, **kwargs):
+        return Transaction.objects.create(
+            account=self.account,
+            amount=Decimal(amount),
+            name="Txn",
+            date=date(2026, 3, 5),
+            category_ref=category,
+            **kwargs,
+        )
+
+    def _flow(self):
+        return self.client.get("/reports/flow/", self.params).json()
+
+    def test_builds_income_category_and_subcategory_levels(self):
+        self._txn("1000.00", self.salary)
+        self._txn("-100.00", self.groceries)
+        self._txn("-50.00", self.restaurants)
+        self._txn("-25.00")
+        self._txn("-500.00", is_transfer=True)
+
+        data = self._flow()
+
+        links = {(l["source"], l["target"]): l["value"] for l in data["links"]}
+        self.assertEqual(links[("Paycheck", "Income")], 1000.0)
+        self.assertEqual(links[("Income", "Food & Dining")], 150.0)
+        self.assertEqual(links[("Food & Dining", "Groceries")], 100.0)
+        self.assertEqual(links[("Food & Dining", "Restaurants")], 50.0)
+        self.assertEqual(links[("Income", "Uncategorized")], 25.0)
+        self.assertEqual(links[("Income", "Savings")], 825.0)
+        node_ids = [n["id"] for n in data["nodes"]]
+        self.assertEqual(len(node_ids), len(set(node_ids)))
+        self.assertEqual(data["meta"]["savings"], 825.0)
+
+    def test_cached_until_transactions_change(self):
+        self._txn("-10.00", self.groceries)
+        first = self._flow()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._flow(), first)
+
+        self._txn("-5.00", self.groceries)
+        links = {(l["source"], l["target"]): l["value"] for l in self._flow()["links"]}
+        self.assertEqual(links[("Food & Dining", "Groceries")], 15.0)
+
+    def test_deletes_invalidate_without_per_row_signals(self):
+        # A post_delete receiver would make Django load every deleted row
+        self.assertFalse(post_delete.has_listeners(Transaction))
+        txn = self._txn("-10.00", self.groceries)
+        self._txn("-5.00", self.groceries)
+        self._flow()
+
+        self.assertEqual(self.client.delete(f"/transactions/{txn.id}/").status_code, 204)
+        links = {(l["source"], l["target"]): l["value"] for l in self._flow()["links"]}
+        self.assertEqual(links[("Food & Dining", "Groceries")], 5.0)
+
+        self.client.post("/transactions/delete_all/")
+        self.assertEqual(self._flow()["links"], [])
+
+    def test_category_rename_invalidates_cached_reports(self):
+        self._txn("-10.00", self.groceries)
+        self._flow()
+
+        self.groceries.name = "Supermarket"
+        self.groceries.save()
+
+        targets = {l["target"] for l in self._flow()["links"]}
+        self.assertIn("Supermarket", targets)
+        self.assertNotIn("Groceries", targets)
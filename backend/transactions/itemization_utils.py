@@ -1,7 +1,6 @@
 import os
 import re
 from decimal import Decimal, InvalidOperation
-from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 
 from pdfminer.high_level import extract_text
@@ -15,22 +14,27 @@ def extract_evidence_text(file_path: str, original_name: str = "") -> Tuple[str,
     ext = (os.path.splitext(original_name or file_path)[1] or "").lower()
 
     # Reuse existing repo utility for PDFs first.
+    pdf_text = None
     if ext == ".pdf":
         try:
-            return extract_text(file_path) or "", "pdfminer.extract_text"
+            pdf_text = extract_text(file_path) or ""
+            if pdf_text.strip():
+                return pdf_text, "pdfminer.extract_text"
         except Exception:
             pass
 
-    # Optional OCR for image files.
-    if ext in {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"}:
+    # OCR for images, and for scanned PDFs without a text layer. Uses the same
+    # backend interface and preprocessing as receipt processing.
+    if ext in {".pdf", ".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff"}:
         try:
-            import pytesseract
-            from PIL import Image
+            from receipts.ocr import evidence_ocr_backend, ocr_document
 
-            image = Image.open(file_path)
-            return pytesseract.image_to_string(image) or "", "pytesseract"
+            backend = evidence_ocr_backend()
+            with open(file_path, "rb") as handle:
+                return ocr_document(handle.read(), original_name or file_path, backend), backend.name
         except Exception:
-            pass
+            if pdf_text is not None:
+                return pdf_text, "pdfminer.extract_text"
 
     # Last fallback: binary decode (works for some text-heavy docs)
     try:
@@ -53,158 +57,152 @@ def _safe_decimal(value: str) -> Optional[Decimal]:
         return None
 
 
-def _safe_date(value: str):
-    raw = (value or "").strip()
-    if not raw:
-        return None
-    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d"):
-        try:
-            return datetime.strptime(raw, fmt).date()
-        except ValueError:
-            continue
-    return None
+# Substrings marking totals, taxes and fees rather than purchased items
+_SUMMARY_LINE = re.compile(r"subtotal|total|tax|tip|fee|delivery|service|discount|savings|balance")
+
+_AMOUNT = r"\d+[\.,]\d{2}"
+_QTY = r"\d+(?:\.\d+)?"
+_QTY_ONLY = re.compile(rf"{_QTY}\s*[xX×]")
+_WHITESPACE = re.compile(r"\s+")
 
 
 def _is_summary_line(line: str) -> bool:
-    n = line.lower().strip()
-    summary_tokens = [
-        "subtotal",
-        "total",
-        "tax",
-        "tip",
-        "fee",
-        "delivery",
-        "service",
-        "discount",
-        "savings",
-        "balance",
-        "order total",
-    ]
-    return any(token in n for token in summary_tokens)
-
-
-def _extract_item_line_generic(line: str) -> Optional[Dict]:
-    # Matches "Some Item Name .... $12.34"
-    m = re.search(r"^(?P<name>.+?)\s+\$?(?P<amount>-?\d+[\.,]\d{2})\s*$", line)
-    if not m:
-        return None
+    return _SUMMARY_LINE.search(line.lower()) is not None
 
-    name = m.group("name").strip(" -:\t")
-    amount = _safe_decimal(m.group("amount"))
-    if not name or amount is None:
-        return None
 
-    # Avoid noise rows like just "3 x" / "2x" without product name
-    if re.fullmatch(r"\d+(?:\.\d+)?\s*x", name.lower().replace("×", "x").strip()):
-        return None
+def _item_line_pattern(**alternatives: str) -> re.Pattern:
+    """
+    Combine per-line item patterns into one regex, tried in keyword order.
+    Each alternative is wrapped in a group named after it, so `lastgroup`
+    says which one matched.
+    """
+    return re.compile("|".join(f"(?P<{kind}>^{pattern}$)" for kind, pattern in alternatives.items()))
 
-    if _is_summary_line(name):
-        return None
 
+# "Some Item Name .... $12.34"
+_GENERIC = rf"(?P<g_name>.+?)\s+\$?(?P<g_amount>-?{_AMOUNT})\s*"
+
+_ITEM_LINE_PATTERNS = {
+    "generic": _item_line_pattern(generic=_GENERIC),
+    "instacart": _item_line_pattern(
+        # "Bananas 2 x $0.59 $1.18" or "Bread 1 x 4.99"
+        instacart=rf"(?P<i_name>.+?)\s+(?P<i_qty>{_QTY})\s*[xX]\s*\$?(?P<i_unit>{_AMOUNT})(?:\s+\$?(?P<i_total>{_AMOUNT}))?",
+        # OCR variant: "3 x $2.89" where the product name is on the previous line
+        instacart_next_line=rf"(?P<n_qty>{_QTY})\s*[xX]\s*\$?(?P<n_unit>{_AMOUNT})(?:\s+\$?(?P<n_total>{_AMOUNT}))?",
+        generic=_GENERIC,
+    ),
+    "amazon": _item_line_pattern(
+        # "Qty: 2 USB-C Cable $9.99"
+        amazon_qty=rf"(?i:qty\s*[:x]?\s*)(?P<q_qty>{_QTY})\s+(?P<q_name>.+?)\s+\$?(?P<q_amount>{_AMOUNT})",
+        generic=_GENERIC,
+    ),
+}
+
+_GENERIC_CONFIDENCE = {"generic": 0.65, "instacart": 0.65, "amazon": 0.72}
+
+
+def detect_item_format(merchant_name: str) -> str:
+    """Which line format a merchant's receipts and invoices use."""
+    merchant = (merchant_name or "").lower()
+    if "amazon" in merchant or "amzn" in merchant:
+        return "amazon"
+    if "instacart" in merchant:
+        return "instacart"
+    return "generic"
+
+
+def _item(name: str, qty: Decimal, unit: Decimal, total: Decimal, raw_line: str, confidence: float) -> Dict:
     return {
         "name": name[:255],
-        "quantity": Decimal("1.00"),
-        "unit_price": amount,
-        "line_total": amount,
-        "raw_line": line,
-        "confidence": 0.65,
+        "quantity": qty,
+        "unit_price": unit,
+        "line_total": total,
+        "raw_line": raw_line,
+        "confidence": confidence,
         "item_date": None,
     }
 
 
-def _extract_item_line_instacart(line: str, prev_line: str = "") -> Optional[Dict]:
-    # Matches patterns like "Bananas 2 x $0.59 $1.18" or "Bread 1 x 4.99"
-    m = re.search(
-        r"^(?P<name>.+?)\s+(?P<qty>\d+(?:\.\d+)?)\s*x\s*\$?(?P<unit>\d+[\.,]\d{2})(?:\s+\$?(?P<total>\d+[\.,]\d{2}))?$",
-        line,
-        re.IGNORECASE,
-    )
+def _generic_item(name: str, amount_text: str, line: str, confidence: float) -> Optional[Dict]:
+    name = name.strip(" -:\t")
+    amount = _safe_decimal(amount_text)
+    if not name or amount is None:
+        return None
 
-    # OCR variant: "3 x $2.89" where product name may be on the previous line
-    if not m:
-        m2 = re.search(
-            r"^(?P<qty>\d+(?:\.\d+)?)\s*x\s*\$?(?P<unit>\d+[\.,]\d{2})(?:\s+\$?(?P<total>\d+[\.,]\d{2}))?$",
-            line,
-            re.IGNORECASE,
-        )
-        if not m2:
-            return None
+    # Avoid noise rows like just "3 x" / "2x" without product name
+    if _QTY_ONLY.fullmatch(name.strip()) or _is_summary_line(name):
+        return None
 
-        inferred_name = (prev_line or "").strip(" -:\t")
-        if not inferred_name or _is_summary_line(inferred_name):
-            return None
+    return _item(name, Decimal("1.00"), amount, amount, line, confidence)
 
-        qty = _safe_decimal(m2.group("qty")) or Decimal("1.00")
-        unit = _safe_decimal(m2.group("unit"))
-        total = _safe_decimal(m2.group("total")) if m2.group("total") else None
-        if unit is None:
-            return None
-        if total is None:
-            total = (qty * unit).quantize(Decimal("0.01"))
-
-        return {
-            "name": inferred_name[:255],
-            "quantity": qty,
-            "unit_price": unit,
-            "line_total": total,
-            "raw_line": f"{inferred_name} | {line}",
-            "confidence": 0.78,
-            "item_date": None,
-        }
-
-    name = m.group("name").strip(" -:\t")
-    qty = _safe_decimal(m.group("qty")) or Decimal("1.00")
-    unit = _safe_decimal(m.group("unit"))
-    total = _safe_decimal(m.group("total")) if m.group("total") else None
-    if not name or unit is None:
-        return None
 
-    if _is_summary_line(name):
+def _quantity_item(
+    name: str, qty_text: str, unit_text: str, total_text: Optional[str], raw_line: str, confidence: float
+) -> Optional[Dict]:
+    qty = _safe_decimal(qty_text) or Decimal("1.00")
+    unit = _safe_decimal(unit_text)
+    total = _safe_decimal(total_text) if total_text else None
+    if not name or unit is None or _is_summary_line(name):
         return None
-
     if total is None:
         total = (qty * unit).quantize(Decimal("0.01"))
+    return _item(name, qty, unit, total, raw_line, confidence)
 
-    return {
-        "name": name[:255],
-        "quantity": qty,
-        "unit_price": unit,
-        "line_total": total,
-        "raw_line": line,
-        "confidence": 0.8,
-        "item_date": None,
-    }
 
+def _match_item_line(item_format: str, line: str, prev_line: str = "") -> Optional[Dict]:
+    m = _ITEM_LINE_PATTERNS[item_format].match(line)
+    if not m:
+        return None
+
+    kind = m.lastgroup
+    if kind == "generic":
+        return _generic_item(m["g_name"], m["g_amount"], line, _GENERIC_CONFIDENCE[item_format])
 
-def _extract_item_line_amazon(line: str) -> Optional[Dict]:
-    # Handles common Amazon invoice style:
-    # "USB-C Cable ... $9.99" OR "Qty: 2 USB-C Cable $9.99"
-    m_qty_prefix = re.search(
-        r"^qty\s*[:x]?\s*(?P<qty>\d+(?:\.\d+)?)\s+(?P<name>.+?)\s+\$?(?P<amount>\d+[\.,]\d{2})$",
-        line,
-        re.IGNORECASE,
-    )
-    if m_qty_prefix:
-        qty = _safe_decimal(m_qty_prefix.group("qty")) or Decimal("1.00")
-        total = _safe_decimal(m_qty_prefix.group("amount"))
-        name = m_qty_prefix.group("name").strip(" -:\t")
+    if kind == "amazon_qty":
+        qty = _safe_decimal(m["q_qty"]) or Decimal("1.00")
+        total = _safe_decimal(m["q_amount"])
+        name = m["q_name"].strip(" -:\t")
         if total is None or not name or _is_summary_line(name):
             return None
         unit = (total / qty).quantize(Decimal("0.01")) if qty else total
-        return {
-            "name": name[:255],
-            "quantity": qty,
-            "unit_price": unit,
-            "line_total": total,
-            "raw_line": line,
-            "confidence": 0.82,
-            "item_date": None,
-        }
-
-    generic = _extract_item_line_generic(line)
-    if generic:
-        generic["confidence"] = 0.72
-    return generic
+        return _item(name, qty, unit, total, line, 0.82)
+
+    if kind == "instacart":
+        candidate = _quantity_item(
+            m["i_name"].strip(" -:\t"), m["i_qty"], m["i_unit"], m["i_total"], line, 0.8
+        )
+    else:
+        name = (prev_line or "").strip(" -:\t")
+        candidate = _quantity_item(
+            name, m["n_qty"], m["n_unit"], m["n_total"], f"{name} | {line}", 0.78
+        )
+    if candidate:
+        return candidate
+
+    # A quantity line that did not yield an item may still be a plain priced line
+    generic = _ITEM_LINE_PATTERNS["generic"].match(line)
+    return _generic_item(generic["g_name"], generic["g_amount"], line, _GENERIC_CONFIDENCE["generic"]) if generic else None
+
+
+_AMAZON_NOISE_TOKENS = [
+    "order summary", "order placed", "payment method", "ship to", "view related transactions",
+    "item(s) subtotal", "shipping & handling", "total before tax", "estimated tax", "grand total",
+    "your package was left", "return or replace", "eligible through", "sold by", "back to top",
+    "conditions of use", "privacy notice", "consumer health data", "ads privacy", "amazon.com",
+    "order details", "https://",
+]
+_AMAZON_NOISE = re.compile(
+    "|".join(map(re.escape, _AMAZON_NOISE_TOKENS))
+    + r"|^order|^\d+/\d+/\d{2,4}"
+    + r"|\b(?:morrisville|united states|discover ending|durants neck|nc\s*\d{5})\b"
+)
+# "$12.99" alone, or "$21.98 White Aisle Runner ..." where the amount belongs to the previous item
+_AMAZON_AMOUNT_LINE = re.compile(rf"^\$?(?P<amount>{_AMOUNT})(?:\s+(?P<rest>.+))?$")
+
+
+def _is_amazon_noise(line: str) -> bool:
+    low = line.lower().strip()
+    return not low or _AMAZON_NOISE.search(low) is not None
 
 
 def _parse_amazon_block_lines(lines: List[str], transaction_date=None) -> List[Dict]:
@@ -213,89 +211,48 @@ def _parse_amazon_block_lines(lines: List[str], transaction_date=None) -> List[D
     name_buf: List[str] = []
     in_item_section = False
 
-    noise_tokens = [
-        "order summary", "order placed", "payment method", "ship to", "view related transactions",
-        "item(s) subtotal", "shipping & handling", "total before tax", "estimated tax", "grand total",
-        "your package was left", "return or replace", "eligible through", "sold by", "back to top",
-        "conditions of use", "privacy notice", "consumer health data", "ads privacy", "amazon.com",
-        "order details", "https://",
-    ]
-
-    def is_noise_line(s: str) -> bool:
-        low = s.lower().strip()
-        if not low:
-            return True
-        if any(t in low for t in noise_tokens):
-            return True
-        if re.fullmatch(r"order\s*#?.*", low):
-            return True
-        if re.fullmatch(r"\d+/\d+/\d{2,4}.*", low):
-            return True
-        if re.search(r"\b(morrisville|united states|discover ending|durants neck|nc\s*\d{5})\b", low):
-            return True
-        return False
-
     def flush_with_amount(amount_text: str):
-        nonlocal name_buf, out
+        nonlocal name_buf
         amount = _safe_decimal(amount_text)
         if amount is None:
             return
-        name = " ".join([p.strip() for p in name_buf if p.strip()])
-        name = re.sub(r"\s+", " ", name).strip(" -:\t")
-        if not name or len(name) < 5:
-            name_buf = []
-            return
-        if _is_summary_line(name) or is_noise_line(name):
-            name_buf = []
-            return
-        out.append({
-            "name": name[:255],
-            "quantity": Decimal("1.00"),
-            "unit_price": amount,
-            "line_total": amount,
-            "raw_line": f"{name} | ${amount}",
-            "confidence": 0.88,
-            "item_date": transaction_date,
-        })
+        name = _WHITESPACE.sub(" ", " ".join(p.strip() for p in name_buf if p.strip())).strip(" -:\t")
         name_buf = []
+        if len(name) < 5 or _is_summary_line(name) or _is_amazon_noise(name):
+            return
+        item = _item(name, Decimal("1.00"), amount, amount, f"{name} | ${amount}", 0.88)
+        item["item_date"] = transaction_date
+        out.append(item)
 
     for ln in lines:
         line = (ln or "").strip()
         if not line:
             continue
 
-        low = line.lower()
-
         # Amazon invoices usually begin item blocks after delivery section
-        if "delivered" in low:
+        if "delivered" in line.lower():
             in_item_section = True
             name_buf = []
             continue
 
-        if not in_item_section:
-            continue
-
-        if is_noise_line(line):
+        if not in_item_section or _is_amazon_noise(line):
             continue
 
-        # Pattern: "$21.98 White Aisle Runner ..." where amount belongs to previous item
-        m_amt_then_title = re.match(r"^\$?(\d+[\.,]\d{2})\s+(.+)$", line)
-        if m_amt_then_title:
-            amt, trailing = m_amt_then_title.group(1), m_amt_then_title.group(2).strip()
+        m_amt = _AMAZON_AMOUNT_LINE.match(line)
+        if m_amt and m_amt["rest"]:
+            trailing = m_amt["rest"].strip()
             if name_buf:
-                flush_with_amount(amt)
-            if trailing and not is_noise_line(trailing) and not _is_summary_line(trailing):
+                flush_with_amount(m_amt["amount"])
+            if trailing and not _is_amazon_noise(trailing) and not _is_summary_line(trailing):
                 name_buf = [trailing]
             continue
 
-        # Amount-only (or amount + noise suffix)
-        m_amt = re.match(r"^\$?(\d+[\.,]\d{2})(?:\s+.*)?$", line)
         if m_amt and name_buf:
-            flush_with_amount(m_amt.group(1))
+            flush_with_amount(m_amt["amount"])
             continue
 
         # Inline fallback
-        inline = _extract_item_line_amazon(line)
+        inline = _match_item_line("amazon", line)
         if inline:
             out.append(inline)
             name_buf = []
@@ -307,58 +264,33 @@ def _parse_amazon_block_lines(lines: List[str], transaction_date=None) -> List[D
 
     return out
 
+
 def parse_itemized_text(
     text: str, merchant_name: str = "", transaction_date=None
 ) -> List[Dict]:
+    """
+    Extract purchased items from receipt or invoice text. The merchant's line
+    format is detected once per document; each line is then matched against
+    that format's single compiled pattern.
+    """
     lines = [ln.strip() for ln in (text or "").splitlines() if ln and ln.strip()]
     if not lines:
         return []
 
-    merchant = (merchant_name or "").lower()
-    parsed: List[Dict] = []
-
-    if "amazon" in merchant or "amzn" in merchant:
+    item_format = detect_item_format(merchant_name)
+    if item_format == "amazon":
         parsed = _parse_amazon_block_lines(lines, transaction_date=transaction_date)
-        # fallback generic pass if block parser found nothing
-        if not parsed:
-            for line in lines:
-                c = _extract_item_line_amazon(line)
-                if c:
-                    c["item_date"] = c.get("item_date") or transaction_date
-                    parsed.append(c)
-        return parsed
+        # fallback per-line pass if block parser found nothing
+        if parsed:
+            return parsed
 
+    parsed: List[Dict] = []
     prev_line = ""
     for line in lines:
-        candidate = None
-        if "instacart" in merchant:
-            candidate = _extract_item_line_instacart(line, prev_line=prev_line) or _extract_item_line_generic(line)
-        else:
-            candidate = _extract_item_line_generic(line)
-
-        if not candidate:
-            # Date sniffing fallback if line starts with a date and has amount at end
-            dm = re.search(
-                r"^(?P<date>\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{2,4})\s+(?P<name>.+?)\s+\$?(?P<amount>\d+[\.,]\d{2})$",
-                line,
-            )
-            if dm and not _is_summary_line(dm.group("name")):
-                amount = _safe_decimal(dm.group("amount"))
-                if amount is not None:
-                    candidate = {
-                        "name": dm.group("name")[:255],
-                        "quantity": Decimal("1.00"),
-                        "unit_price": amount,
-                        "line_total": amount,
-                        "raw_line": line,
-                        "confidence": 0.6,
-                        "item_date": _safe_date(dm.group("date")) or transaction_date,
-                    }
-
+        candidate = _match_item_line(item_format, line, prev_line)
         if candidate:
             candidate["item_date"] = candidate.get("item_date") or transaction_date
             parsed.append(candidate)
-
         prev_line = line
 
     return parsed
@@ -0,0 +1,84 @@
+import json
+import os
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.itemization_utils import detect_item_format, parse_itemized_text
+
+DEFAULT_CORPUS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    "benchmark_data",
+    "itemization_corpus.json",
+)
+
+
+def _item_key(item) -> tuple:
+    return (item["name"], Decimal(str(item["quantity"])).normalize(), Decimal(str(item["line_total"])))
+
+
+class Command(BaseCommand):
+    help = "Benchmark itemized-text parsing throughput and accuracy on a corpus of sample OCR texts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON list of {name, merchant_name, lines, expected}.")
+        parser.add_argument("--iterations", type=int, default=200, help="Passes over the corpus for timing.")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        if iterations <= 0:
+            raise CommandError("--iterations must be positive.")
+        try:
+            with open(options["corpus"], encoding="utf-8") as handle:
+                corpus = json.load(handle)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read corpus: {exc}")
+
+        documents = [("\n".join(doc["lines"]), doc.get("merchant_name", "")) for doc in corpus]
+
+        # Accuracy: an item counts when name, quantity and line total all match
+        matched = extracted_count = expected_count = 0
+        per_document = []
+        for doc, (text, merchant_name) in zip(corpus, documents):
+            extracted = Counter(_item_key(item) for item in parse_itemized_text(text, merchant_name))
+            expected = Counter(_item_key(item) for item in doc["expected"])
+            hits = sum((extracted & expected).values())
+            matched += hits
+            extracted_count += sum(extracted.values())
+            expected_count += sum(expected.values())
+            per_document.append(
+                {
+                    "name": doc.get("name", ""),
+                    "format": detect_item_format(merchant_name),
+                    "expected": sum(expected.values()),
+                    "matched": hits,
+                    "missed": sorted(key[0] for key in (expected - extracted).elements()),
+                    "unexpected": sorted(key[0] for key in (extracted - expected).elements()),
+                }
+            )
+
+        precision = matched / extracted_count if extracted_count else 0.0
+        recall = matched / expected_count if expected_count else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+        line_count = sum(len(doc["lines"]) for doc in corpus)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            for text, merchant_name in documents:
+                parse_itemized_text(text, merchant_name)
+        elapsed = time.perf_counter() - started
+
+        result = {
+            "documents": len(corpus),
+            "iterations": iterations,
+            "elapsed_seconds": round(elapsed, 3),
+            "documents_per_second": round(len(corpus) * iterations / elapsed, 1) if elapsed else None,
+            "lines_per_second": round(line_count * iterations / elapsed, 1) if elapsed else None,
+            "precision": round(precision, 3),
+            "recall": round(recall, 3),
+            "f1": round(f1, 3),
+            "per_document": per_document,
+        }
+        self.stdout.write(self.style.SUCCESS(json.dumps(result, indent=2, sort_keys=True)))
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0017_merchantcategorymemory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionevidence',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
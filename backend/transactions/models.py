@@ -224,6 +224,8 @@ class TransactionEvidence(models.Model):
     file = models.FileField(upload_to="transaction_evidence/%Y/%m/%d/")
     original_filename = models.CharField(max_length=255, blank=True, null=True)
     content_type = models.CharField(max_length=100, blank=True, null=True)
+    # SHA-256 of the file; evidence with the same hash shares one stored file
+    content_hash = models.CharField(max_length=64, blank=True, default="", db_index=True)
     evidence_type = models.CharField(
         max_length=20, choices=EVIDENCE_TYPE_CHOICES, default=EVIDENCE_OTHER
     )
@@ -1,6 +1,7 @@
 from datetime import timedelta
 from decimal import Decimal
 from .models import Transaction
+from reports.services import invalidate_user_reports
 import re
 
 # Patterns for same-account debit+credit pairs (e.g. Bilt rent: charge card → ACH credit back).
@@ -168,6 +169,8 @@ class TransferService:
             category__iexact="Transfer",
         )
         explicit_marked = explicit_transfer_qs.update(is_transfer=True)
+        if explicit_marked:
+            invalidate_user_reports(user.id)
 
         # Get potential transfer candidates (not yet marked)
         candidates = (
@@ -604,6 +607,7 @@ class TransferService:
         # system had overwritten it with "Transfer"
         qs.filter(category__iexact="Transfer").update(category="Uncategorized")
         qs.update(is_transfer=False)
+        invalidate_user_reports(user.id)
         return count
 
     def detect_refunds(self, user):
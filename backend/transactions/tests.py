@@ -1,7 +1,15 @@
+import json
+import tempfile
+from datetime import date
 from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 
 from accounts.models import Account
 from categories.models import Category
@@ -9,7 +17,8 @@ from transactions.categorization_utils import (
     get_allowed_category_map,
     normalize_to_allowed_category,
 )
-from transactions.models import Transaction
+from transactions.itemization_utils import detect_item_format, parse_itemized_text
+from transactions.models import Transaction, TransactionEvidence
 
 
 class CategoryNormalizationTests(TestCase):
@@ -92,3 +101,115 @@ class CategoryNormalizationTests(TestCase):
 
         self.assertEqual(transaction.category, "Restaurants")
         self.assertEqual(transaction.category_ref_id, self.restaurants.id)
+
+
+class TransactionEvidenceCacheTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username="evidence-user", password="secret")
+        account = Account.objects.create(
+            user=self.user,
+            account_name="Checking",
+            account_type="bank",
+            balance=Decimal("0.00"),
+            currency="USD",
+        )
+        self.transaction = Transaction.objects.create(
+            account=account, amount=Decimal("-8.50"), name="Cafe", date="2026-04-14"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self):
+        upload = SimpleUploadedFile("invoice.png", b"same invoice bytes", content_type="image/png")
+        response = self.client.post(f"/transactions/{self.transaction.id}/upload_evidence/", {"file": upload})
+        self.assertEqual(response.status_code, 201)
+        return TransactionEvidence.objects.get(id=response.json()["evidence"]["id"])
+
+    def test_repeat_evidence_shares_the_file_and_reuses_ocr_text(self):
+        first = self._upload()
+        second = self._upload()
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.content_hash, second.content_hash)
+
+        with patch(
+            "transactions.views.extract_evidence_text",
+            return_value=("Latte 1 4.25 4.25\nCroissant 1 4.25 4.25", "tesseract"),
+        ) as extract:
+            for evidence in (first, second):
+                response = self.client.post(
+                    f"/transactions/{self.transaction.id}/extract_items/", {"evidence_id": evidence.id}
+                )
+                self.assertEqual(response.status_code, 200)
+
+        extract.assert_called_once()
+        second.refresh_from_db()
+        self.assertEqual(second.parser_used, "tesseract")
+        self.assertIn("Latte", second.ocr_text)
+
+
+class ItemizedTextParserTests(TestCase):
+    def test_merchant_format_is_detected_once_per_document(self):
+        self.assertEqual(detect_item_format("AMZN Mktp US"), "amazon")
+        self.assertEqual(detect_item_format("INSTACART*COSTCO"), "instacart")
+        self.assertEqual(detect_item_format(""), "generic")
+
+        with patch("transactions.itemization_utils.detect_item_format", wraps=detect_item_format) as detect:
+            items = parse_itemized_text("MILK 3.49\nEGGS 4.29\nBREAD 2.99\nTOTAL 10.77", merchant_name="Corner Market")
+
+        self.assertEqual(len(items), 3)
+        detect.assert_called_once_with("Corner Market")
+
+    def test_generic_lines_skip_summaries_and_bare_quantities(self):
+        items = parse_itemized_text(
+            "MILK 2% GAL $3.49\n2 x 5.98\nSUBTOTAL 3.49\nTax 0.21",
+            merchant_name="Corner Market",
+            transaction_date=date(2026, 6, 30),
+        )
+
+        self.assertEqual([(item["name"], item["line_total"]) for item in items], [("MILK 2% GAL", Decimal("3.49"))])
+        self.assertEqual(items[0]["item_date"], date(2026, 6, 30))
+
+    def test_instacart_quantity_lines_use_the_previous_line_as_name(self):
+        items = parse_itemized_text(
+            "Bananas 6 x $0.29 $1.74\nOrganic Strawberries\n2 X $6.49\nService fee $3.99",
+            merchant_name="Instacart",
+        )
+
+        self.assertEqual(
+            [(item["name"], item["quantity"], item["line_total"], item["confidence"]) for item in items],
+            [
+                ("Bananas", Decimal("6"), Decimal("1.74"), 0.8),
+                ("Organic Strawberries", Decimal("2"), Decimal("12.98"), 0.78),
+            ],
+        )
+
+    def test_amazon_titles_spanning_lines_are_joined_with_their_price(self):
+        items = parse_itemized_text(
+            "Grand Total: $34.97\nDelivered June 4\nAnker USB-C Cable\n2 Pack\n"
+            "Sold by: AnkerDirect\n$12.99 White Aisle Runner\n$21.98",
+            merchant_name="Amazon.com",
+        )
+
+        self.assertEqual(
+            [(item["name"], item["line_total"]) for item in items],
+            [("Anker USB-C Cable 2 Pack", Decimal("12.99")), ("White Aisle Runner", Decimal("21.98"))],
+        )
+
+    def test_amazon_falls_back_to_inline_quantity_lines(self):
+        items = parse_itemized_text("Qty: 2 AAA Batteries $29.98", merchant_name="Amazon")
+
+        self.assertEqual((items[0]["name"], items[0]["unit_price"]), ("AAA Batteries", Decimal("14.99")))
+
+    def test_benchmark_reports_throughput_and_accuracy(self):
+        out = StringIO()
+        call_command("benchmark_itemization", "--iterations", "1", stdout=out)
+        result = json.loads(out.getvalue())
+
+        self.assertEqual(result["documents"], len(result["per_document"]))
+        self.assertGreater(result["lines_per_second"], 0)
+        self.assertGreaterEqual(result["recall"], 0.9)
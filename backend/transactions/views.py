@@ -35,6 +35,15 @@ from calendar import monthrange
 import openai
 from dotenv import load_dotenv
 from .services import TransferService, SubscriptionService
+from alerts.services import (
+    EVENT_ACCOUNT,
+    EVENT_TRANSACTION,
+    EVENT_TRANSACTION_DELETED,
+    EVENT_TRANSACTION_EDITED,
+    enqueue_alert_event,
+)
+from reports.services import invalidate_user_reports
+from receipts.documents import cached_document, hash_chunks, store_document_text
 from .categorization_utils import (
     apply_transaction_category,
     format_transaction_for_categorization_prompt,
@@ -196,13 +205,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
                     transaction=transaction_obj, is_processed=True
                 )
 
-            # Check alerts
-            try:
-                from alerts.services import AlertService
-
-                AlertService().check_all_conditions(request.user)
-            except Exception as e:
-                print(f"Alert check failed: {e}")
+            # Evaluate affected alerts in the background once committed
+            enqueue_alert_event(EVENT_TRANSACTION, transaction_obj.id)
 
         return Response(serializer.data, status=201)
 
@@ -219,6 +223,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
         with db_transaction.atomic():
             old_account = instance.account
             old_amount = instance.amount
+            old_date = instance.date
             updated = serializer.save()
             new_account = updated.account
             new_amount = updated.amount
@@ -241,6 +246,14 @@ class TransactionViewSet(viewsets.ModelViewSet):
                     updated.category_ref if updated.category_ref_id else updated.category,
                 )
 
+            # Don't re-announce a large transaction for edits like a rename
+            unchanged = new_amount == old_amount and updated.date == old_date
+            enqueue_alert_event(
+                EVENT_TRANSACTION_EDITED if unchanged else EVENT_TRANSACTION, updated.id
+            )
+            if old_account.id != new_account.id:
+                enqueue_alert_event(EVENT_ACCOUNT, old_account.id)
+
         return Response(serializer.data)
 
     def destroy(self, request, *args, **kwargs):
@@ -251,6 +264,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
             instance.delete()
             account.balance = (account.balance or Decimal("0")) - amount
             account.save()
+            enqueue_alert_event(EVENT_TRANSACTION_DELETED, account.user_id)
+        invalidate_user_reports(request.user.id)
         return Response(status=204)
 
     @action(detail=False, methods=["post"])
@@ -264,6 +279,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
             queryset.delete()
             # Zero out all account balances since all transactions are gone
             user_accounts.update(balance=Decimal("0"))
+            enqueue_alert_event(EVENT_TRANSACTION_DELETED, user.id)
+        invalidate_user_reports(user.id)
         return Response({"deleted": count})
 
     @action(detail=False, methods=["post"])
@@ -294,7 +311,11 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 account.balance = (account.balance or Decimal("0")) - amount
                 account.save()
                 count += 1
+            if count:
+                enqueue_alert_event(EVENT_TRANSACTION_DELETED, user.id)
 
+        if count:
+            invalidate_user_reports(user.id)
         return Response({"deleted": count})
 
     @action(detail=False, methods=["get"])
@@ -1230,10 +1251,22 @@ The "results" array must have exactly {n_llm} strings, same order as the transac
         if evidence_type not in allowed_types:
             evidence_type = TransactionEvidence.EVIDENCE_OTHER
 
+        digest = hash_chunks(uploaded_file.chunks())
+        # Re-uploads of the same file point at the already stored copy
+        existing = (
+            TransactionEvidence.objects.filter(user=request.user, content_hash=digest)
+            .exclude(file="")
+            .first()
+        )
+        stored_file = uploaded_file
+        if existing and existing.file.storage.exists(existing.file.name):
+            stored_file = existing.file.name
+
         evidence = TransactionEvidence.objects.create(
             transaction=transaction_obj,
             user=request.user,
-            file=uploaded_file,
+            file=stored_file,
+            content_hash=digest,
             original_filename=getattr(uploaded_file, "name", None),
             content_type=getattr(uploaded_file, "content_type", None),
             evidence_type=evidence_type,
@@ -1274,9 +1307,19 @@ The "results" array must have exactly {n_llm} strings, same order as the transac
             evidence.save(update_fields=["status", "metadata", "updated_at"])
             return Response({"error": "Evidence file not found"}, status=400)
 
-        extracted_text, parser_used = extract_evidence_text(
-            file_path, evidence.original_filename or evidence.file.name
-        )
+        if not evidence.content_hash:
+            with open(file_path, "rb") as handle:
+                evidence.content_hash = hash_chunks(iter(lambda: handle.read(1024 * 1024), b""))
+        document = cached_document(evidence.content_hash)
+        if document and document.ocr_text:
+            extracted_text, parser_used = document.ocr_text, document.parser_used
+        else:
+            extracted_text, parser_used = extract_evidence_text(
+                file_path, evidence.original_filename or evidence.file.name
+            )
+            # The binary-decode fallback is not worth caching
+            if parser_used not in {"utf8_fallback", "none"}:
+                store_document_text(evidence.content_hash, extracted_text, parser_used)
         evidence.ocr_text = extracted_text
         evidence.parser_used = parser_used
 
@@ -1321,6 +1364,7 @@ The "results" array must have exactly {n_llm} strings, same order as the transac
                 update_fields=[
                     "ocr_text",
                     "parser_used",
+                    "content_hash",
                     "status",
                     "metadata",
                     "updated_at",